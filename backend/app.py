@@ -1,41 +1,95 @@
 # app.py
 import os
+import time
+import uuid
 import shutil
+import hashlib
+import threading
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from sqlalchemy import select, delete
 
-from db.db import get_db, Base, engine
-from db.models import Document, SearchLog
-from loader import load_text
-from indexer import rebuild_index, chroma
+from db.db import get_db, SessionLocal
+from db import fulltext
+from db.models import Document, Chunk, SearchLog
+from db.migrate import upgrade
+from loader import load_text, SUPPORTED_EXT
+from indexer import rebuild_index, index_files, chroma
+from jobs import job_manager
+from cache import TTLCache, normalize_query
+from inference import MicroBatcher, inference_executor
+from projection import ProjectionStore, GALAXY_MAX_POINTS
+import metrics
+import rerank
+from rerank import RerankConfig, default_config, rerank_candidates, reciprocal_rank_fusion
 
 import numpy as np
 from sklearn.decomposition import PCA
 from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import CrossEncoder
 
 # ================================
 # 초기 세팅
 # ================================
 UPLOAD_DIR = "./data"
-ALLOWED_EXT = {"txt", "pdf", "md", "docx", "pptx", "jpg", "jpeg", "png", "bmp", "tiff"}
+ALLOWED_EXT = SUPPORTED_EXT
+# 벡터 검색 + 전문(lexical) 검색 결과를 RRF로 합쳐 후보를 만듦
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+# 업로드 파일을 디스크에 쓸 때 한 번에 읽는 크기 (bytes)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+# 시작 시 백그라운드로 모델 미리 로드 (false면 첫 요청 때 로드)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+# 검색 결과 캐시 (query, session_id, index version) → /search 응답
+search_cache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "300")),
+)
+
+# /galaxy 3D 좌표 캐시 (세션별 PCA 기저 + 청크 좌표)
+projections = ProjectionStore(chroma)
+
+# 모델 warm-up 상태 (/ready에서 사용)
+warmup_state = {"status": "cold", "error": None}
+_warmup_lock = threading.Lock()
+
+
+def warm_up():
+    with _warmup_lock:
+        if warmup_state["status"] in ("warming", "warm"):
+            return
+        warmup_state["status"] = "warming"
+    try:
+        chroma.warm_up()
+        rerank.predict([["warm up", "warm up"]])
+        warmup_state["status"] = "warm"
+        print("[APP] Models warmed up.")
+    except Exception as e:
+        warmup_state.update(status="error", error=str(e))
+        print(f"[APP] Warm-up failed: {e}")
+
 
-app = FastAPI(title="FoundByMe API (Chroma + PostgreSQL)")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # DB 테이블 자동 생성 (+ 누락된 컬럼 보강)
+    upgrade()
+    if WARMUP_ON_STARTUP:
+        # 모델 로딩은 추론 전용 executor에서 (이벤트 루프/헬스 체크를 막지 않음)
+        inference_executor.submit(warm_up)
+    yield
 
-# DB 테이블 자동 생성
-Base.metadata.create_all(bind=engine)
 
-# 🚀 Re-ranker 모델 로드 (정확도 향상용)
-# Cross-Encoder는 속도는 느리지만 정확도가 매우 높음
-print("[APP] Loading Re-ranker model...")
-# 다국어 지원 모델 사용 (BAAI/bge-reranker-v2-m3: 성능이 우수한 다국어 리랭커)
-reranker = CrossEncoder("BAAI/bge-reranker-v2-m3")
-print("[APP] Re-ranker loaded.")
+app = FastAPI(title="FoundByMe API (Chroma + PostgreSQL)", lifespan=lifespan)
+
+# 동시 요청들을 모아서 한 번에 추론 (전용 inference executor에서 실행)
+# 모델은 처음 호출될 때 로드됨 (warm-up을 끈 경우)
+embed_batcher = MicroBatcher(chroma.embed)
+rerank_batcher = MicroBatcher(rerank.predict)
 
 # CORS
 app.add_middleware(
@@ -45,6 +99,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+async def timing_middleware(request: Request, call_next):
+    # 요청별 단계 시간(span) → Server-Timing 헤더, 요청 전체 시간 → /metrics 히스토그램
+    spans = metrics.begin_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    # 경로 대신 route 템플릿으로 집계 (/jobs/{job_id} 등, label 수가 늘어나지 않도록)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.http_request_seconds.observe(elapsed, request.method, route, str(response.status_code))
+    if metrics.SERVER_TIMING:
+        response.headers["Server-Timing"] = metrics.server_timing(spans, elapsed)
+    return response
+
+
+# METRICS_ENABLED=false면 미들웨어 자체를 등록하지 않음 (요청마다 감싸는 비용도 없음)
+if metrics.METRICS_ENABLED:
+    app.middleware("http")(timing_middleware)
+
+
 class ChatRequest(BaseModel):
     query: str
     session_id: str = "default"
@@ -53,65 +128,144 @@ class ChatRequest(BaseModel):
 # 🔍 /search - 유사문서 top5 + PCA 3D
 # ======================================================
 @app.get("/search")
-def search(q: str, session_id: str = "default"):
+async def search(
+    q: str,
+    session_id: str = "default",
+    candidate_k: Optional[int] = None,
+    top_k: Optional[int] = None,
+    rerank: Optional[bool] = None,
+    budget_ms: Optional[float] = None,
+):
 
     if not q:
         raise HTTPException(status_code=400, detail="query required")
 
-    # session_id 필터 적용
-    where_filter = {"session_id": session_id} if session_id != "default" else None
-    
-    # 1. 1차 검색 (Vector Search) - 후보군을 넉넉하게(15~20개) 가져옴
-    q_emb = chroma.embed([q])[0]
-    candidate_k = 15
-    result = chroma.collection.query(
-        query_embeddings=[q_emb],
-        n_results=candidate_k,
-        where=where_filter
+    # 요청별 리랭킹 설정 (지정하지 않은 값은 배포 설정값 사용)
+    config = default_config.override(
+        candidate_k=candidate_k, top_k=top_k, enabled=rerank, budget_ms=budget_ms
     )
 
+    # 같은 질문 + 같은 세션 + 같은 설정 + 같은 인덱스 버전이면 캐시된 결과 반환
+    # (reindex/삭제로 컬렉션이 바뀌면 버전이 달라져 자동으로 무효화됨)
+    cache_key = (normalize_query(q), session_id, config, chroma.index_version())
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        metrics.event("search_cache_hit")
+        return cached
+    metrics.event("search_cache_miss")
+
+    response = await run_search(q, session_id, config)
+    # 예산 초과로 벡터 순서가 된 결과는 캐시하지 않음 (다음 요청에서 다시 리랭킹 시도)
+    if response.get("rerank", {}).get("reason") == "budget_exceeded":
+        return response
+    search_cache.set(cache_key, response)
+    return response
+
+
+async def embed_query(q: str) -> np.ndarray:
+    # 캐시에 없을 때만 배처를 통해 인코딩 (동시 요청들과 한 번에 encode)
+    key = chroma.query_key(q)
+    vec = chroma.query_cache.get(key)
+    if vec is None:
+        # 배처 대기 시간 포함 (동시 요청이 많을 때 실제로 기다린 시간)
+        with metrics.span("search.embed"):
+            vec = (await embed_batcher.submit([key[1]]))[0]
+        chroma.query_cache.set(key, vec)
+    return vec
+
+
+async def run_search(q: str, session_id: str = "default", config: RerankConfig = default_config):
+    # 1. 1차 검색 (Vector Search) - 후보군을 넉넉하게(candidate_k개) 가져옴
+    # session_id 범위는 ChromaEngine이 적용 (메타데이터 필터 또는 세션 shard)
+    q_emb = await embed_query(q)
+    with metrics.span("search.vector"):
+        result = await run_in_threadpool(
+            chroma.query,
+            session_id,
+            query_embeddings=[q_emb],
+            n_results=config.candidate_k,
+            include=["documents", "metadatas", "distances"],
+        )
+
     ids = result["ids"][0]
     docs = result["documents"][0] if result["documents"] else []
     metas = result["metadatas"][0] if result["metadatas"] else []
-    
-    real_k = len(ids)
+    distances = result["distances"][0] if result["distances"] else []
+
+    # cosine distance → 유사도
+    vector_hits = {
+        ids[i]: {"id": ids[i], "doc": docs[i], "meta": metas[i], "vector_score": 1.0 - float(distances[i])}
+        for i in range(len(ids))
+    }
 
-    if real_k == 0:
+    if HYBRID_SEARCH:
+        # 1-1. 전문 검색 후보 (정확한 단어/식별자 매칭) → RRF로 벡터 순위와 합침
+        with metrics.span("search.lexical"):
+            lexical_ids = await run_in_threadpool(lexical_search, q, session_id, config.candidate_k)
+        fused = reciprocal_rank_fusion([ids, lexical_ids])[:config.candidate_k]
+        with metrics.span("search.fill_candidates"):
+            candidates = await run_in_threadpool(fill_candidates, fused, vector_hits, session_id)
+    else:
+        candidates = [dict(hit, score=hit["vector_score"]) for hit in vector_hits.values()]
+
+    if len(candidates) == 0:
         return {
             "query": q,
             "query_vector_3d": [0, 0, 0],
             "results": []
         }
 
-    # 2. 2차 검색 (Re-ranking) - CrossEncoder로 정확도 순 정렬
-    # (질문, 문서내용) 쌍을 만들어 점수 계산
-    pairs = [[q, doc_text] for doc_text in docs]
-    scores = reranker.predict(pairs)
-
-    # 점수와 인덱스를 묶어서 정렬 (점수 높은 순)
-    scored_results = []
-    for i in range(real_k):
-        scored_results.append({
-            "index": i,
-            "score": float(scores[i]),
-            "id": ids[i],
-            "doc": docs[i],
-            "meta": metas[i]
-        })
-    
-    # 점수 내림차순 정렬
-    scored_results.sort(key=lambda x: x["score"], reverse=True)
+    # 2. 2차 검색 (Re-ranking) - CrossEncoder로 정확도 순 정렬 후 상위 top_k개
+    # 동시 요청들의 (질문, 문서) 쌍과 합쳐서 한 번에 predict
+    with metrics.span("search.rerank"):
+        final_results, rerank_info = await rerank_candidates(q, candidates, config, rerank_batcher.submit)
+    metrics.event(f"rerank_{rerank_info['reason']}")
 
-    # 상위 5개만 선택
-    top_k = 5
-    final_results = scored_results[:top_k]
-    
+    response = await run_in_threadpool(build_search_response, q, session_id, q_emb, final_results)
+    response["rerank"] = rerank_info
+    return response
+
+
+def lexical_search(q: str, session_id: str, limit: int) -> List[str]:
+    db = SessionLocal()
+    try:
+        return fulltext.search(db, q, session_id if session_id != "default" else None, limit=limit)
+    except Exception as e:
+        # 전문 검색이 실패해도 벡터 검색 결과로 응답
+        print(f"[SEARCH] Full-text search failed: {e}")
+        return []
+    finally:
+        db.close()
+
+
+def fill_candidates(fused: list, vector_hits: dict, session_id: str = "default") -> list:
+    # 전문 검색에서만 나온 청크는 본문/메타데이터를 Chroma에서 가져옴
+    missing = [cid for cid, _ in fused if cid not in vector_hits]
+    extra = {}
+    if missing:
+        res = chroma.get(session_id, ids=missing, include=["documents", "metadatas"])
+        for cid, doc, meta in zip(res["ids"], res["documents"], res["metadatas"]):
+            extra[cid] = {"id": cid, "doc": doc, "meta": meta, "vector_score": None}
+
+    candidates = []
+    for cid, score in fused:
+        hit = vector_hits.get(cid) or extra.get(cid)
+        if hit is not None:
+            candidates.append(dict(hit, score=score))
+    return candidates
+
+
+def build_search_response(q: str, session_id: str, q_emb, final_results: list):
     # 3D 시각화를 위해 선택된 문서들의 Vector만 다시 가져오기 (최적화)
     final_ids = [res["id"] for res in final_results]
     
-    # Embedding 가져오기
-    doc_vecs = chroma.collection.get(ids=final_ids, include=["embeddings"])["embeddings"]
-    query_vec = np.array(q_emb, dtype=np.float32)
+    # Embedding 가져오기 (get은 id 순서를 보장하지 않으므로 id로 다시 정렬)
+    with metrics.span("search.fetch_embeddings"):
+        fetched = chroma.get(session_id, ids=final_ids, include=["embeddings"])
+    vec_by_id = dict(zip(fetched["ids"], fetched["embeddings"]))
+    doc_vecs = [vec_by_id[i] for i in final_ids if i in vec_by_id]
+    # 압축 저장이면 문서 벡터와 같은 공간으로 투영
+    query_vec = chroma.to_stored([q_emb])[0]
     doc_vecs = np.array(doc_vecs, dtype=np.float32)
 
     # PCA
@@ -122,10 +276,11 @@ def search(q: str, session_id: str = "default"):
         
     if len(X) < 3:
          query_3d = [0, 0, 0]
-         doc_3d = [[0,0,0]] * len(doc_vecs)
+         doc_3d = np.zeros((len(doc_vecs), 3))
     else:
-        pca = PCA(n_components=min(3, len(X)))
-        X_3d = pca.fit_transform(X)
+        with metrics.span("search.pca"):
+            pca = PCA(n_components=min(3, len(X)))
+            X_3d = pca.fit_transform(X)
         if X_3d.shape[1] < 3:
             X_3d = np.pad(X_3d, ((0,0), (0, 3-X_3d.shape[1])), 'constant')
             
@@ -145,9 +300,6 @@ def search(q: str, session_id: str = "default"):
             "preview": (res["doc"][:200] if res["doc"] else "").replace("\n", " "),
             "url": f"/api/files/{session_id}/{meta.get('title')}.{meta.get('ext')}"
         }) 
-        
-    # 사용자 요청: query_3d의 첫 번째 값에서 3을 뺌 
-   
     
     return {
         "query": q,
@@ -158,11 +310,7 @@ def search(q: str, session_id: str = "default"):
 # =====================================
 # 💬 /chat (RAG Mock)
 # =====================================
-@app.post("/chat")
-def chat_endpoint(req: ChatRequest, db: Session = Depends(get_db)):
-    search_results = search(req.query, session_id=req.session_id)
-    
-    # Save query log
+def save_search_log(db: Session, req: ChatRequest, results_count: int):
     try:
         # 이전 질문 기록 삭제 (한 번에 하나의 질문만 유지)
         db.execute(delete(SearchLog).where(SearchLog.session_id == req.session_id))
@@ -170,13 +318,24 @@ def chat_endpoint(req: ChatRequest, db: Session = Depends(get_db)):
         log = SearchLog(
             query=req.query, 
             session_id=req.session_id, 
-            top_k=5, 
-            results_count=len(search_results.get("results", []))
+            top_k=default_config.top_k, 
+            results_count=results_count
         )
         db.add(log)
         db.commit()
     except Exception as e:
         print(f"Error saving search log: {e}")
+
+
+@app.post("/chat")
+async def chat_endpoint(req: ChatRequest, db: Session = Depends(get_db)):
+    search_results = await search(req.query, session_id=req.session_id)
+    
+    # Save query log (DB 작업은 이벤트 루프를 막지 않도록 threadpool에서)
+    with metrics.span("chat.search_log"):
+        await run_in_threadpool(
+            save_search_log, db, req, len(search_results.get("results", []))
+        )
     
     sources = []
     context = ""
@@ -209,36 +368,126 @@ def chat_endpoint(req: ChatRequest, db: Session = Depends(get_db)):
 # 📤 /upload - 파일 업로드
 # ======================================================
 @app.post("/upload")
-def upload_file(
+async def upload_file(
     files: List[UploadFile] = File(...),
     session_id: str = Form("default")
 ):
+    # 파일을 조각 단위로 디스크에 쓰면서 sha256 계산 (요청 처리 중 이벤트 루프를 막지 않음)
+    # 같은 세션에 내용이 같은 파일이 이미 있으면 저장/인덱싱 생략
+    # 저장한 파일만 백그라운드로 인덱싱 → /jobs/{id}로 진행 상황 확인
     saved_files = []
+    skipped = []
     errors = []
+    hashes = {}
 
     session_dir = os.path.join(UPLOAD_DIR, session_id)
     os.makedirs(session_dir, exist_ok=True)
 
     for file in files:
-        ext = file.filename.split(".")[-1].lower()
+        filename = os.path.basename(file.filename or "")
+        ext = filename.split(".")[-1].lower()
         if ext not in ALLOWED_EXT:
             errors.append(f"❌ {file.filename}: 지원하지 않는 파일 형식 ({ext})")
             continue
 
-        save_path = f"{session_dir}/{file.filename}"
-        with open(save_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-        
-        saved_files.append(file.filename)
+        save_path = os.path.join(session_dir, filename)
+        # 다 받은 뒤에 교체 (업로드가 끊겨도 기존 파일/인덱싱 중인 파일이 깨지지 않음)
+        tmp_path = f"{save_path}.{uuid.uuid4().hex[:8]}.part"
+        digest = hashlib.sha256()
+        try:
+            with open(tmp_path, "wb") as f:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    await run_in_threadpool(f.write, chunk)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            errors.append(f"❌ {file.filename}: 저장 실패 ({e})")
+            continue
+
+        content_hash = digest.hexdigest()
+        # 이번 요청/아직 인덱싱 중인 업로드에서 먼저 받은 파일 → 이미 인덱싱된 문서 순으로 확인
+        duplicate = reserve_upload(session_id, content_hash, save_path)
+        if duplicate is None:
+            duplicate = await run_in_threadpool(find_duplicate, session_id, content_hash)
+            if duplicate is not None:
+                release_uploads(session_id, [content_hash])
+        if duplicate is not None:
+            os.remove(tmp_path)
+            skipped.append({"filename": filename, "duplicate_of": os.path.basename(duplicate)})
+            continue
+
+        os.replace(tmp_path, save_path)
+        hashes[save_path] = content_hash
+        saved_files.append(filename)
+
+    job = None
+    if hashes:
+        paths = list(hashes)
+
+        def run(job):
+            try:
+                result = index_files(paths, hashes, job=job)
+            finally:
+                release_uploads(session_id, hashes.values())
+            search_cache.clear()
+            return result
+
+        # 업로드마다 대상 파일이 다르므로 합치지 않고 각각 작업으로 (실행은 인덱싱 lock으로 순서대로)
+        try:
+            job, _ = job_manager.submit(
+                "index_files", f"upload:{session_id}", run,
+                single_flight=False, session_id=session_id, files=saved_files,
+            )
+        except Exception:
+            release_uploads(session_id, hashes.values())
+            raise
 
     return {
         "status": "completed",
         "saved": saved_files,
+        "skipped": skipped,
         "errors": errors,
         "session_id": session_id,
-        "info": "📌 파일 저장완료 → /reindex 호출 시 인덱싱 수행"
+        "job": job.to_dict() if job else None,
+        "info": "📌 저장한 파일만 백그라운드로 인덱싱 → /jobs/{id}로 진행 확인"
     }
 
+
+# 저장은 했지만 아직 인덱싱이 끝나지 않은 업로드: (session_id, sha256) → 경로
+# DB에 content_hash가 들어가기 전에 같은 내용을 다시 올려도 중복으로 처리 (이 프로세스 안에서만)
+_pending_uploads: dict = {}
+_pending_lock = threading.Lock()
+
+
+def reserve_upload(session_id: str, content_hash: str, path: str) -> Optional[str]:
+    # 이미 받은 같은 내용의 파일 경로 (없으면 이 파일로 예약하고 None)
+    key = (session_id, content_hash)
+    with _pending_lock:
+        if key in _pending_uploads:
+            return _pending_uploads[key]
+        _pending_uploads[key] = path
+        return None
+
+
+def release_uploads(session_id: str, content_hashes):
+    with _pending_lock:
+        for content_hash in content_hashes:
+            _pending_uploads.pop((session_id, content_hash), None)
+
+
+def find_duplicate(session_id: str, content_hash: str) -> Optional[str]:
+    # 같은 세션에 이미 인덱싱된, 내용(sha256)이 같은 문서의 경로
+    db = SessionLocal()
+    try:
+        return db.execute(
+            select(Document.path)
+            .where(Document.session_id == session_id, Document.content_hash == content_hash)
+            .limit(1)
+        ).scalar()
+    finally:
+        db.close()
+
 # =====================================
 # 📂 파일 다운로드/열기
 # =====================================
@@ -254,11 +503,43 @@ def get_file(session_id: str, filename: str):
 # 🔄 /reindex - 전체 재인덱싱
 # ======================================================
 @app.get("/reindex")
-def reindex(session_id: str = "default"):
-    rebuild_index()
-    # global chroma
-    # chroma = ChromaEngine()  # reload - No need, using shared instance
-    return {"status": "Success"}
+def reindex(session_id: str = "default", full: bool = False):
+    # 기본은 증분 인덱싱 (변경된 파일만), full=true면 전체 재구축
+    # 백그라운드 작업으로 실행하고 바로 job을 돌려줌 → /jobs/{id}로 진행 상황 확인
+    # 같은 종류(증분/전체)의 요청은 대기/실행 중인 작업 하나로 합침
+    # 증분 작업 중에 full=true가 와도 버려지지 않도록 scope를 나누고, 실행 순서는 인덱싱 lock으로
+    def run(job):
+        result = rebuild_index(full=full, job=job)
+        search_cache.clear()
+        return result
+
+    scope = "index:full" if full else "index"
+    job, created = job_manager.submit("reindex", scope, run, full=full, session_id=session_id)
+    return {"status": job.status, "created": created, "job": job.to_dict()}
+
+
+# ======================================================
+# ⏳ /jobs - 백그라운드 작업 상태
+# ======================================================
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": [job.to_dict() for job in job_manager.list()]}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 
 # ======================================================
@@ -268,19 +549,16 @@ def reindex(session_id: str = "default"):
 def list_documents(session_id: str = "default", limit: int = 100, db: Session = Depends(get_db)):
     try:
         # SQL DB에서 파일 목록 조회 (중복 없이 파일 단위로)
-        stmt = select(Document).where(
-            (Document.path.like(f"%/{session_id}/%")) | 
-            (Document.path.like(f"%\\{session_id}\\%"))
-        )
+        stmt = select(Document).where(Document.session_id == session_id)
         docs = db.execute(stmt).scalars().all()
         
         result = []
         for doc in docs:
-            ext = doc.path.split(".")[-1]
+            ext = doc.ext
             result.append({
                 "id": str(doc.id),
                 "filename": f"{doc.title}.{ext}", # 확장자 포함
-                "preview": doc.content[:50] if doc.content else "",
+                "preview": doc.preview[:50] if doc.preview else "",
                 "type": ext
             })
         return {"count": len(result), "documents": result}
@@ -292,13 +570,40 @@ def list_documents(session_id: str = "default", limit: int = 100, db: Session =
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ======================================================
+# 🩺 /ready, /metrics - 준비 상태 / 운영 지표
+# ======================================================
+@app.get("/ready")
+def ready():
+    # 모델이 모두 로드되어야 ready (로드 중/실패면 503)
+    # warm-up을 끈 경우에는 첫 요청에서 로드하므로 항상 ready
+    models = {**chroma.status(), "reranker": rerank.reranker_loaded()}
+    is_ready = all(models.values()) or not WARMUP_ON_STARTUP
+    body = {
+        "ready": is_ready,
+        "state": "warm" if all(models.values()) else warmup_state["status"],
+        "models": models,
+        "error": warmup_state["error"],
+    }
+    return JSONResponse(body, status_code=200 if is_ready else 503)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    # Prometheus scrape용 (단계별 히스토그램, 요청 지연, 이벤트 카운터)
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # ======================================================
 # 📊 /stats - 확장자별 통계
 # ======================================================
 @app.get("/stats")
 def stats():
-    rows = chroma.collection.get(include=["metadatas"])
-    metas = rows["metadatas"]
+    metas = []
+    for rows in chroma.iter_pages(["metadatas"]):
+        metas.extend(rows["metadatas"])
 
     stat = {}
     for meta in metas:
@@ -307,130 +612,161 @@ def stats():
 
     return {
         "total_docs": len(metas),
-        "by_extension": stat
+        "by_extension": stat,
+        # 압축 저장 세대면 차원/설명된 분산 비율/재정렬 여부
+        "compact": chroma.compact_info(),
     }
 
 # =====================================
 # 🌌 /galaxy (3D 시각화)
 # =====================================
+def point_color(ext: str, is_query: bool) -> str:
+    if is_query:
+        return "#FDE047"
+    if ext in ["pdf"]:
+        return "#F43F5E"
+    if ext in ["txt", "md"]:
+        return "#06B6D4"
+    if ext in ["pptx", "ppt"]:
+        return "#F97316"
+    return "#8B5CF6"
+
+
 @app.get("/galaxy")
-def galaxy_view(session_id: str = "default", query: Optional[str] = None, db: Session = Depends(get_db)):
+def galaxy_view(
+    session_id: str = "default",
+    query: Optional[str] = None,
+    lod: str = "auto",
+    cluster: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    lod=auto    : 청크가 GALAXY_MAX_POINTS보다 많으면 클러스터 중심점만, 아니면 모든 청크
+    lod=points  : 항상 모든 청크
+    lod=clusters: 클러스터가 계산되어 있으면 항상 중심점
+    cluster=N   : N번 클러스터를 펼친 청크들만 (최대 GALAXY_MAX_POINTS개, 질문 점 제외)
+    """
     try:
-        where_filter = {"session_id": session_id} if session_id != "default" else None
-        
-        results = chroma.collection.get(
-            where=where_filter,
-            include=["metadatas", "embeddings"]
-        )
+        # 청크 좌표는 세션별로 캐시된 PCA 기저/좌표를 사용 (컬렉션이 바뀐 경우에만 갱신)
+        with metrics.span("galaxy.projection"):
+            proj = projections.get(session_id)
         
-        ids = results["ids"]
-        metas = results["metadatas"]
-        embeddings = results["embeddings"]
-        
-        if not ids:
+        if not proj.ids:
             return []
 
-        vectors = []
-        metadata_list = []
-        
-        for i, vec in enumerate(embeddings):
-            vectors.append(vec)
-            metadata_list.append({
-                "id": ids[i],
-                "label": metas[i].get("title", "unknown"),
-                "type": metas[i].get("ext", "txt"),
-                "page": metas[i].get("page", 1),
-                "filename": metas[i].get("title", "unknown"),
-                "isQuery": False
-            })
-            
-        # Fetch all queries for this session from DB
-        try:
-            logs = db.execute(select(SearchLog).where(SearchLog.session_id == session_id)).scalars().all()
-            queries = [log.query for log in logs]
-            
-            # Add current query if provided and not in logs
-            if query and query not in queries:
-                queries.append(query)
+        q_texts = []
+        q_vectors = []
             
-            # Deduplicate
-            unique_queries = list(set(queries))
-            
-            if unique_queries:
-                q_embeddings = chroma.embed(unique_queries)
-                for q_text, q_vec in zip(unique_queries, q_embeddings):
-                     vectors.append(q_vec)
-                     metadata_list.append({
-                        "id": f"query_{hash(q_text)}",
-                        "label": f"Question: {q_text}",
-                        "type": "query",
-                        "isQuery": True
-                    })
-        except Exception as e:
-            print(f"Error fetching queries: {e}")
-            # Fallback to just the current query if DB fails
-            if query:
-                qvec = chroma.embed([query])[0]
-                vectors.append(qvec)
-                metadata_list.append({
-                    "id": "query",
-                    "label": f"Question: {query}",
-                    "type": "query",
-                    "isQuery": True
-                })
-
-        X = np.array(vectors)
-        
-        if len(X) < 3:
+        # Fetch all queries for this session from DB (클러스터를 펼칠 때는 생략)
+        if cluster is None:
+            try:
+                logs = db.execute(select(SearchLog).where(SearchLog.session_id == session_id)).scalars().all()
+                queries = [log.query for log in logs]
+                
+                # Add current query if provided and not in logs
+                if query and query not in queries:
+                    queries.append(query)
+                
+                # Deduplicate
+                q_texts = list(set(queries))
+                
+                if q_texts:
+                    with metrics.span("galaxy.embed_queries"):
+                        q_vectors = list(chroma.embed_queries(q_texts))
+            except Exception as e:
+                print(f"Error fetching queries: {e}")
+                # Fallback to just the current query if DB fails
+                if query:
+                    q_texts = [query]
+                    q_vectors = [chroma.embed_query(query)]
+
+        query_points = [
+            {
+                "id": f"query_{hash(q_text)}",
+                "label": f"Question: {q_text}",
+                "color": point_color("query", True),
+                "isQuery": True,
+            }
+            for q_text in q_texts
+        ]
+
+        if not proj.fitted:
              points = []
-             for i, meta in enumerate(metadata_list):
+             for i, cid in enumerate(proj.ids):
                 points.append({
-                    "id": meta["id"],
-                    "position": [np.random.uniform(-5, 5), np.random.uniform(-5, 5), np.random.uniform(-5, 5)],
-                    "color": "#FDE047" if meta["isQuery"] else "#8B5CF6",
-                    "label": meta["label"],
-                    "page": meta.get("page", 1),
-                    "isQuery": meta["isQuery"]
+                    "id": cid,
+                    "color": "#8B5CF6",
+                    "label": proj.titles[i],
+                    "page": proj.pages[i],
+                    "isQuery": False
                 })
+             points.extend(query_points)
+             for point in points:
+                point["position"] = [np.random.uniform(-5, 5), np.random.uniform(-5, 5), np.random.uniform(-5, 5)]
              return points
 
-        # 1. PCA 수행 (전체 데이터의 구조 파악)
-        pca = PCA(n_components=3)
-        X_3d = pca.fit_transform(X)
-        
-        # 중심점 맞추기 (평균을 0으로)
-        X_3d = X_3d - np.mean(X_3d, axis=0)
-        
-        # 스케일링 (화면에 꽉 차게)
-        max_val = np.max(np.abs(X_3d))
-        if max_val > 0:
-            X_3d = (X_3d / max_val) * 60
+        # 1. 저장된 PCA 기저로 질문 벡터만 새로 투영 (refit 없음)
+        # 중심/스케일은 문서 점(proj.coords)만으로 정함 → 클러스터 중심점과 펼친 청크가 질문 유무와 상관없이 같은 좌표계
+        center = np.mean(proj.coords, axis=0)
+        max_val = np.max(np.abs(proj.coords - center))
+        scale = 60 / max_val if max_val > 0 else 1.0
 
-        points = []
-        for i, coord in enumerate(X_3d):
-            meta = metadata_list[i]
-            
-            color = "#8B5CF6"
-            if meta["isQuery"]:
-                color = "#FDE047"
-            elif meta["type"] in ["pdf"]:
-                color = "#F43F5E"
-            elif meta["type"] in ["txt", "md"]:
-                color = "#06B6D4"
-            elif meta["type"] in ["pptx", "ppt"]:
-                color = "#F97316"
+        doc_3d = (proj.coords - center) * scale
+        query_3d = (proj.transform(chroma.to_stored(q_vectors)) - center) * scale
+
+        for point, coord in zip(query_points, query_3d):
+            point["position"] = coord.tolist()
+
+        use_clusters = proj.clustered and cluster is None and (
+            lod == "clusters" or (lod == "auto" and len(proj.ids) > GALAXY_MAX_POINTS)
+        )
+
+        if use_clusters:
+            # 2-a. 클러스터 중심점 + 개수 (청크 수와 무관하게 최대 GALAXY_CLUSTERS개)
+            points = []
+            for k in np.unique(proj.labels):
+                members = np.flatnonzero(proj.labels == k)
+                exts = [proj.exts[i] for i in members]
+                titles = [proj.titles[i] for i in members]
+                top_ext = max(set(exts), key=exts.count)
+                top_title = max(set(titles), key=titles.count)
+
+                points.append({
+                    "id": f"cluster_{k}",
+                    "cluster": int(k),
+                    "count": int(len(members)),
+                    "position": doc_3d[members].mean(axis=0).tolist(),
+                    "color": point_color(top_ext, False),
+                    "label": f"{top_title} (+{len(members) - 1})" if len(members) > 1 else top_title,
+                    "isQuery": False,
+                    "isCluster": True,
+                })
+            return points + query_points
+
+        # 2-b. 개별 청크 (전체 또는 펼친 클러스터)
+        if cluster is not None:
+            if not proj.clustered:
+                return []
+            indices = np.flatnonzero(proj.labels == cluster)
+            if len(indices) > GALAXY_MAX_POINTS:
+                # 응답 크기를 제한하기 위해 고르게 샘플링
+                indices = indices[np.linspace(0, len(indices) - 1, GALAXY_MAX_POINTS).astype(int)]
+        else:
+            indices = range(len(proj.ids))
 
+        points = []
+        for i in indices:
             points.append({
-                "id": meta["id"],
-                "position": coord.tolist(),
-                "color": color,
-                "label": meta["label"],
-                "page": meta.get("page", 1),
-                "isQuery": meta["isQuery"],
-                "url": f"/api/files/{session_id}/{meta.get('filename')}.{meta.get('type')}#page={meta.get('page', 1)}" if not meta["isQuery"] else None
+                "id": proj.ids[i],
+                "position": doc_3d[i].tolist(),
+                "color": point_color(proj.exts[i], False),
+                "label": proj.titles[i],
+                "page": proj.pages[i],
+                "isQuery": False,
+                "url": f"/api/files/{session_id}/{proj.titles[i]}.{proj.exts[i]}#page={proj.pages[i]}"
             })
             
-        return points
+        return points + query_points
 
     except Exception as e:
         print(f"Galaxy View Error: {e}")
@@ -443,24 +779,15 @@ def galaxy_view(session_id: str = "default", query: Optional[str] = None, db: Se
 def delete_session(session_id: str, db: Session = Depends(get_db)):
     print(f"Request to delete session: {session_id}")
     
-    # 1. SQL DB 삭제 (Python에서 경로 검사로 확실하게 처리)
+    # 1. SQL DB 삭제 (session_id 인덱스로 해당 세션 문서만)
     try:
-        # 모든 문서 조회 (ID와 Path만)
-        docs = db.execute(select(Document.id, Document.path)).all()
-        ids_to_delete = []
-        
-        for doc_id, path in docs:
-            # 경로 정규화 (모든 구분자를 /로 변경)
-            norm_path = path.replace("\\", "/")
-            # session_id가 경로의 일부인지 확인 (예: data/session_id/file.pdf)
-            parts = norm_path.split("/")
-            if session_id in parts:
-                ids_to_delete.append(doc_id)
-        
-        if ids_to_delete:
-            db.execute(delete(Document).where(Document.id.in_(ids_to_delete)))
-            db.commit()
-            print(f"Deleted {len(ids_to_delete)} documents from SQL DB.")
+        session_docs = select(Document.id).where(Document.session_id == session_id)
+        db.execute(delete(Chunk).where(Chunk.document_id.in_(session_docs)))
+        deleted = db.execute(delete(Document).where(Document.session_id == session_id)).rowcount
+        fulltext.delete_session(db, session_id)
+        db.commit()
+        if deleted:
+            print(f"Deleted {deleted} documents from SQL DB.")
         else:
             print("No documents found in SQL DB for this session.")
             
@@ -470,7 +797,8 @@ def delete_session(session_id: str, db: Session = Depends(get_db)):
 
     # 2. ChromaDB 삭제
     try:
-        chroma.collection.delete(where={"session_id": session_id})
+        chroma.delete_session(session_id)
+        projections.drop(session_id)
         print(f"Deleted vectors for session {session_id} from ChromaDB.")
     except Exception as e:
         print(f"Error deleting from ChromaDB: {e}")
@@ -502,8 +830,10 @@ def delete_all_sessions(db: Session = Depends(get_db)):
     
     # 1. SQL DB 삭제 (모든 문서 및 로그 삭제)
     try:
+        db.execute(delete(Chunk))
         db.execute(delete(Document))
         db.execute(delete(SearchLog))
+        fulltext.delete_all(db)
         db.commit()
         print("Deleted all documents and logs from SQL DB.")
     except Exception as e:
@@ -512,11 +842,9 @@ def delete_all_sessions(db: Session = Depends(get_db)):
 
     # 2. ChromaDB 삭제 (전체 삭제)
     try:
-        # 모든 데이터 삭제를 위해 get()으로 ID를 가져와서 삭제하거나 reset() 사용
-        # 여기서는 collection의 모든 데이터를 삭제
-        ids = chroma.collection.get()['ids']
-        if ids:
-            chroma.collection.delete(ids=ids)
+        # collection의 모든 데이터를 삭제
+        chroma.clear_all()
+        projections.drop()
         print("Deleted all vectors from ChromaDB.")
     except Exception as e:
         print(f"Error deleting all from ChromaDB: {e}")
@@ -0,0 +1,2 @@
+# bench/__init__.py
+# 인덱싱/검색 단계별 벤치마크 (실행: backend 폴더에서 python -m bench.run --help)
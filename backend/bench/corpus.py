@@ -0,0 +1,161 @@
+# bench/corpus.py
+# 벤치마크용 합성 코퍼스 생성 (여러 언어가 섞인 txt/md/docx/pptx/pdf)
+# 같은 seed면 같은 파일이 만들어지므로 실행 간 결과를 비교할 수 있음
+import os
+import random
+from typing import Dict, List
+
+# 언어별 단어 목록 (실제 문장은 아니지만 토크나이저/임베딩 부하는 비슷하게)
+VOCAB: Dict[str, List[str]] = {
+    "ko": [
+        "강의", "과제", "마감", "시험", "교수님", "데이터", "구조", "알고리즘", "정렬", "그래프",
+        "네트워크", "운영체제", "메모리", "프로세스", "스레드", "데이터베이스", "인덱스", "쿼리", "트랜잭션", "검색",
+        "벡터", "임베딩", "모델", "학습", "평가", "정확도", "발표", "보고서", "실습", "중간고사",
+        "기말고사", "참고문헌", "요약", "정리", "예제", "증명", "정리한다", "설명한다", "계산한다", "비교한다",
+    ],
+    "en": [
+        "lecture", "assignment", "deadline", "exam", "professor", "data", "structure", "algorithm", "sorting", "graph",
+        "network", "kernel", "memory", "process", "thread", "database", "index", "query", "transaction", "search",
+        "vector", "embedding", "model", "training", "evaluation", "accuracy", "presentation", "report", "lab", "midterm",
+        "final", "reference", "summary", "example", "proof", "theorem", "latency", "throughput", "cache", "schedule",
+    ],
+    "ja": [
+        "講義", "課題", "締切", "試験", "教授", "データ", "構造", "アルゴリズム", "整列", "グラフ",
+        "ネットワーク", "メモリ", "プロセス", "スレッド", "データベース", "索引", "検索", "ベクトル", "モデル", "評価",
+    ],
+    "zh": [
+        "课程", "作业", "截止", "考试", "教授", "数据", "结构", "算法", "排序", "图",
+        "网络", "内存", "进程", "线程", "数据库", "索引", "查询", "向量", "模型", "评估",
+    ],
+}
+# 정확한 식별자 검색(전문 검색) 부하용
+IDENTIFIERS = ["CS101", "HW-3", "O(n log n)", "B+tree", "TCP/IP", "SQL", "GPU", "ISO-8601", "v2.1", "RFC 793"]
+
+FORMATS = ["txt", "md", "docx", "pptx", "pdf"]
+
+
+def sentence(rng: random.Random, languages: List[str], words: int = 12) -> str:
+    lang = rng.choice(languages)
+    tokens = [rng.choice(VOCAB[lang]) for _ in range(words)]
+    if rng.random() < 0.2:
+        tokens.insert(rng.randrange(len(tokens)), rng.choice(IDENTIFIERS))
+    sep = "" if lang in ("ja", "zh") else " "
+    end = "。" if lang in ("ja", "zh") else "."
+    return sep.join(tokens) + end
+
+
+def page_text(rng: random.Random, languages: List[str], chars: int) -> str:
+    parts: List[str] = []
+    size = 0
+    while size < chars:
+        s = sentence(rng, languages)
+        parts.append(s)
+        size += len(s) + 1
+    return " ".join(parts)
+
+
+def query_texts(n: int, languages: List[str], seed: int = 0) -> List[str]:
+    """코퍼스와 같은 단어 분포의 짧은 질문들"""
+    rng = random.Random(seed + 1)
+    return [sentence(rng, languages, words=rng.randint(2, 6)) for _ in range(n)]
+
+
+def _write_txt(path: str, title: str, pages: List[str]):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(pages))
+
+
+def _write_md(path: str, title: str, pages: List[str]):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# {title}\n\n")
+        for i, text in enumerate(pages, start=1):
+            f.write(f"## {i}\n\n{text}\n\n")
+
+
+def _write_docx(path: str, title: str, pages: List[str]):
+    from docx import Document as DocxDocument
+
+    doc = DocxDocument()
+    doc.add_heading(title, level=1)
+    for text in pages:
+        doc.add_paragraph(text)
+    doc.save(path)
+
+
+def _write_pptx(path: str, title: str, pages: List[str]):
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    prs = Presentation()
+    layout = prs.slide_layouts[1]  # 제목 + 내용
+    for i, text in enumerate(pages, start=1):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = f"{title} ({i})"
+        body = slide.placeholders[1]
+        body.text = text
+        body.width = Inches(9)
+    prs.save(path)
+
+
+def _write_pdf(path: str, title: str, pages: List[str]):
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        rect = page.rect + (50, 50, -50, -50)
+        # CJK 글자가 섞여 있으므로 내장 CJK 폰트 사용 (라틴 문자도 포함)
+        page.insert_textbox(rect, text, fontsize=10, fontname="korea")
+    doc.set_metadata({"title": title})
+    doc.save(path)
+    doc.close()
+
+
+WRITERS = {
+    "txt": _write_txt,
+    "md": _write_md,
+    "docx": _write_docx,
+    "pptx": _write_pptx,
+    "pdf": _write_pdf,
+}
+
+
+def generate_corpus(
+    out_dir: str,
+    files: int = 50,
+    pages: int = 5,
+    page_chars: int = 1500,
+    formats: List[str] = FORMATS,
+    languages: List[str] = ("ko", "en"),
+    seed: int = 0,
+) -> List[str]:
+    """
+    out_dir에 files개 파일 생성 (형식은 formats를 돌아가며) → 파일 경로 목록
+    설치되지 않은 라이브러리가 필요한 형식은 건너뜀
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    languages = [lang for lang in languages if lang in VOCAB] or ["en"]
+    available = []
+    for ext in formats:
+        try:
+            WRITERS[ext](os.path.join(out_dir, f".probe.{ext}"), "probe", ["probe"])
+            available.append(ext)
+        except ImportError as e:
+            print(f"[BENCH] Skipping .{ext} files ({e})")
+        finally:
+            probe = os.path.join(out_dir, f".probe.{ext}")
+            if os.path.exists(probe):
+                os.remove(probe)
+    if not available:
+        raise ValueError(f"No writable formats in {formats}")
+
+    paths = []
+    for i in range(files):
+        ext = available[i % len(available)]
+        title = f"bench_{i:05d}"
+        texts = [page_text(rng, languages, page_chars) for _ in range(pages)]
+        path = os.path.join(out_dir, f"{title}.{ext}")
+        WRITERS[ext](path, title, texts)
+        paths.append(path)
+    return paths
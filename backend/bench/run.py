@@ -0,0 +1,421 @@
+# bench/run.py
+# 합성 코퍼스로 단계별 성능 측정 → JSON
+#   parse      : loader.load_text (parser_pool, 파일/청크 처리량 + 파일당 지연)
+#   embed      : 문서 청크 배치 임베딩, 질문 1개 임베딩 (동시성별)
+#   insert     : 계산된 임베딩을 Chroma에 기록 (배치별)
+#   query      : 벡터 검색 (동시성별)
+#   rerank     : CrossEncoder 후보 점수 계산 (동시성별)
+#   projection : /galaxy 투영 (처음 학습, 캐시 조회, 증분 갱신)
+#   compact    : 압축 저장(CHROMA_COMPACT_DIM) 차원별 recall@k와 청크당 바이트 (정확한 float32 검색 대비)
+#   search     : 실행 중인 서버의 /search (--url을 준 경우만, 동시성별)
+# 실제 데이터(DATA_DIR, DB, chroma_store)는 건드리지 않고 임시 폴더에서 실행
+#
+# 예) python -m bench.run --files 100 --concurrency 1,4,16 --out bench.json
+#     python -m bench.run --baseline bench.json --tolerance 0.2   (느려졌으면 종료 코드 1)
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, List
+
+import numpy as np
+
+from bench.corpus import FORMATS, generate_corpus, query_texts
+from bench.timing import run_concurrent, summarize, timed
+
+SESSION_ID = "bench"
+
+
+def bench_parse(paths: List[str], workers: int) -> Dict[str, Any]:
+    from loader import load_text
+    from parser_pool import parse_files
+
+    # 파일당 지연은 순차 실행으로, 처리량은 프로세스 풀로 따로 측정
+    latencies = []
+    parsed: Dict[str, list] = {}
+    start = time.perf_counter()
+    for path in paths:
+        t = time.perf_counter()
+        parsed[path] = load_text(path) or []
+        latencies.append(time.perf_counter() - t)
+    serial = summarize(latencies, time.perf_counter() - start, items=sum(len(c) for c in parsed.values()))
+
+    start = time.perf_counter()
+    n_chunks = sum(len(chunks or []) for _, chunks in parse_files(paths, workers=workers))
+    wall = time.perf_counter() - start
+    pooled = {
+        "wall_s": round(wall, 4),
+        "workers": workers,
+        "files_per_s": round(len(paths) / wall, 2) if wall > 0 else 0.0,
+        "items": n_chunks,
+        "items_per_s": round(n_chunks / wall, 2) if wall > 0 else 0.0,
+    }
+
+    by_ext: Dict[str, List[float]] = {}
+    for path, latency in zip(paths, latencies):
+        by_ext.setdefault(path.rsplit(".", 1)[-1], []).append(latency)
+
+    return {
+        "serial": serial,
+        "pool": pooled,
+        "by_ext": {ext: summarize(v, sum(v)) for ext, v in sorted(by_ext.items())},
+        "_chunks": parsed,
+    }
+
+
+def bench_embed(engine, texts: List[str], queries: List[str], batch_size: int, concurrency: List[int]):
+    import numpy as np
+
+    engine.embed(texts[:batch_size])  # warm-up
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    vectors = []
+    latencies = []
+    start = time.perf_counter()
+    for batch in batches:
+        t = time.perf_counter()
+        vectors.append(engine.embed(batch))
+        latencies.append(time.perf_counter() - t)
+    documents = summarize(latencies, time.perf_counter() - start, items=len(texts))
+    documents["batch_size"] = batch_size
+
+    single = {f"c{c}": run_concurrent(lambda q: engine.embed([q]), queries, c) for c in concurrency}
+    return {"documents": documents, "query": single}, np.vstack(vectors)
+
+
+def bench_insert(engine, ids, embeddings, texts, metadatas, batch_size: int) -> Dict[str, Any]:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(0, len(ids), batch_size):
+        sl = slice(i, i + batch_size)
+        latencies.append(timed(
+            engine.upsert_embeddings, ids[sl], embeddings[sl], texts[sl], metadatas[sl]
+        ))
+    result = summarize(latencies, time.perf_counter() - start, items=len(ids))
+    result["batch_size"] = batch_size
+    return result
+
+
+def bench_query(engine, query_vectors, k: int, concurrency: List[int]) -> Dict[str, Any]:
+    def search(vec):
+        return engine.query(
+            SESSION_ID,
+            query_embeddings=[vec.tolist()],
+            n_results=k,
+            include=["documents", "metadatas", "distances"],
+        )
+
+    search(query_vectors[0])  # warm-up
+    return {f"c{c}": run_concurrent(search, list(query_vectors), c) for c in concurrency}
+
+
+def bench_rerank(engine, queries, query_vectors, k: int, concurrency: List[int]) -> Dict[str, Any]:
+    import rerank
+
+    pairs_per_query = []
+    for q, vec in zip(queries, query_vectors):
+        res = engine.query(SESSION_ID, query_embeddings=[vec.tolist()], n_results=k, include=["documents"])
+        pairs_per_query.append([[q, doc or ""] for doc in res["documents"][0]])
+
+    rerank.predict(pairs_per_query[0])  # 모델 로드 + warm-up
+    result = {
+        f"c{c}": run_concurrent(rerank.predict, pairs_per_query, c, items=sum(map(len, pairs_per_query)))
+        for c in concurrency
+    }
+    result["candidates"] = k
+    return result
+
+
+def bench_projection(engine, directory: str, repeats: int, extra) -> Dict[str, Any]:
+    from projection import ProjectionStore
+
+    store = ProjectionStore(engine, directory=directory)
+    cold = timed(store.get, SESSION_ID)
+    warm = run_concurrent(lambda _: store.get(SESSION_ID), list(range(repeats)), 1)
+
+    # 청크 몇 개가 추가된 뒤의 증분 갱신 (기존 기저로 투영)
+    engine.upsert_embeddings(*extra)
+    incremental = timed(store.get, SESSION_ID)
+    return {
+        "cold_ms": round(cold * 1000, 3),
+        "warm": warm,
+        "incremental_ms": round(incremental * 1000, 3),
+        "incremental_chunks": len(extra[0]),
+    }
+
+
+def bench_compact(embeddings, query_vectors, k: int, dims: List[int], oversample: int) -> Dict[str, Any]:
+    """
+    전체 벡터 brute-force 결과를 정답으로, 줄인 벡터만 쓴 검색과 float16 원래 벡터로 재정렬한 검색의 recall@k
+    (HNSW 근사 오차는 빼고 압축으로 인한 손실만 측정)
+    """
+    import numpy as np
+    from compact import CHROMA_COMPACT_FIT_SAMPLES, cosine_distances, fit_components, recall_at_k
+
+    X = np.asarray(embeddings, dtype=np.float32)
+    Q = np.asarray(query_vectors, dtype=np.float32)
+    full_dim = X.shape[1]
+    ids = [str(i) for i in range(len(X))]
+
+    def top(vectors, q, n, candidates=None):
+        pool = np.arange(len(vectors)) if candidates is None else np.asarray(candidates)
+        order = np.argsort(cosine_distances(q, vectors[pool]), kind="stable")[:n]
+        return [ids[i] for i in pool[order]]
+
+    exact = [top(X, q, k) for q in Q]
+    X16 = X.astype(np.float16).astype(np.float32)
+    result: Dict[str, Any] = {
+        "k": k,
+        "full_dim": full_dim,
+        "full_bytes_per_chunk": full_dim * 4,
+        "float16_recall": round(recall_at_k(exact, [top(X16, q, k) for q in Q], k), 4),
+    }
+
+    fit = X[np.random.default_rng(0).permutation(len(X))[:CHROMA_COMPACT_FIT_SAMPLES]]
+    for dim in dims:
+        if dim >= full_dim:
+            continue
+        components, explained = fit_components(fit, dim)
+        R = X @ components.T
+        reduced, rescored = [], []
+        for q in Q:
+            rq = q @ components.T
+            reduced.append(top(R, rq, k))
+            candidates = [int(i) for i in top(R, rq, k * oversample)]
+            rescored.append(top(X16, q, k, candidates))
+        result[f"d{dim}"] = {
+            "explained_variance": round(explained, 4),
+            "recall": round(recall_at_k(exact, reduced, k), 4),
+            "rescored_recall": round(recall_at_k(exact, rescored, k), 4),
+            "bytes_per_chunk": dim * 4,
+            "rescore_bytes_per_chunk": dim * 4 + full_dim * 2,
+        }
+    result["oversample"] = oversample
+    return result
+
+
+def bench_search(url: str, queries: List[str], session_id: str, concurrency: List[int]) -> Dict[str, Any]:
+    def search(q):
+        params = urllib.parse.urlencode({"q": q, "session_id": session_id})
+        with urllib.request.urlopen(f"{url.rstrip('/')}/search?{params}", timeout=60) as res:
+            res.read()
+
+    search(queries[0])  # warm-up
+    return {f"c{c}": run_concurrent(search, queries, c) for c in concurrency}
+
+
+def regressions(result: Dict, baseline: Dict, tolerance: float, path: str = "") -> List[str]:
+    """baseline보다 p95가 (1 + tolerance)배 넘게 느려졌거나 처리량이 (1 - tolerance)배 미만이거나 recall이 떨어진 항목"""
+    found = []
+    for key, base in baseline.items():
+        cur = result.get(key)
+        where = f"{path}.{key}" if path else key
+        if isinstance(base, dict) and isinstance(cur, dict):
+            found.extend(regressions(cur, base, tolerance, where))
+        elif key in ("p95_ms", "p99_ms") and isinstance(cur, (int, float)) and base:
+            if cur > base * (1 + tolerance):
+                found.append(f"{where}: {base} -> {cur}")
+        elif key in ("throughput", "items_per_s", "files_per_s") and isinstance(cur, (int, float)) and base:
+            if cur < base * (1 - tolerance):
+                found.append(f"{where}: {base} -> {cur}")
+        elif key.endswith("recall") and isinstance(cur, (int, float)):
+            # recall은 시드가 같으면 결정적이므로 tolerance 대신 0.01 이상 떨어지면 회귀
+            if cur < base - 0.01:
+                found.append(f"{where}: {base} -> {cur}")
+    return found
+
+
+def prepare_corpus(args, workdir: str, languages: List[str], stages: set, result: Dict[str, Any]) -> tuple:
+    """합성 코퍼스 생성 + 파싱 → (ids, texts, metadatas). parse 단계를 요청했을 때만 파싱 시간을 측정"""
+    from parser_pool import PARSE_WORKERS, parse_files
+
+    print(f"[BENCH] Generating {args.files} files in {workdir}...", file=sys.stderr)
+    start = time.perf_counter()
+    paths = generate_corpus(
+        os.path.join(workdir, "corpus"),
+        files=args.files,
+        pages=args.pages,
+        page_chars=args.page_chars,
+        formats=args.formats.split(","),
+        languages=languages,
+        seed=args.seed,
+    )
+    result["corpus"] = {
+        "files": len(paths),
+        "bytes": sum(os.path.getsize(p) for p in paths),
+        "generate_s": round(time.perf_counter() - start, 3),
+    }
+
+    workers = PARSE_WORKERS if args.parse_workers is None else args.parse_workers
+    if "parse" in stages:
+        print("[BENCH] parse", file=sys.stderr)
+        parse = bench_parse(paths, workers)
+        parsed = parse.pop("_chunks")
+        result["stages"]["parse"] = parse
+    else:
+        parsed = {path: chunks or [] for path, chunks in parse_files(paths, workers=workers)}
+
+    ids, texts, metas = [], [], []
+    for i, path in enumerate(paths):
+        ext = path.rsplit(".", 1)[-1]
+        for chunk in parsed[path]:
+            ids.append(f"{i}_{chunk['page']}")
+            texts.append(chunk["content"])
+            metas.append({
+                "title": os.path.basename(path).rsplit(".", 1)[0],
+                "ext": ext,
+                "path": path,
+                "session_id": SESSION_ID,
+                "page": chunk["page"],
+                "hash": hashlib.sha1(chunk["content"].encode("utf-8")).hexdigest()[:16],
+            })
+    result["corpus"]["chunks"] = len(ids)
+    if not ids:
+        raise ValueError("Corpus produced no chunks")
+    return ids, texts, metas
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="FoundByMe ingestion/search benchmark")
+    parser.add_argument("--files", type=int, default=50, help="number of generated files")
+    parser.add_argument("--pages", type=int, default=5, help="pages (or slides) per file")
+    parser.add_argument("--page-chars", type=int, default=1500, help="characters per page")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="comma separated: txt,md,docx,pptx,pdf")
+    parser.add_argument("--languages", default="ko,en,ja,zh", help="comma separated: ko,en,ja,zh")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=100, help="queries per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated concurrency levels")
+    parser.add_argument("--top-k", type=int, default=15, help="vector candidates per query (= rerank candidates)")
+    parser.add_argument("--parse-workers", type=int, default=None, help="default: PARSE_WORKERS")
+    parser.add_argument("--batch-size", type=int, default=256, help="chunks per embed/insert batch")
+    parser.add_argument("--compact-dims", default="64,128,192", help="comma separated dims for the compact stage")
+    parser.add_argument("--compact-oversample", type=int, default=4, help="rescore candidates = top-k * oversample")
+    parser.add_argument("--stages", default="parse,embed,insert,query,rerank,projection,compact",
+                        help="comma separated stages to run (search needs --url)")
+    parser.add_argument("--url", default=None, help="running server for end-to-end /search, e.g. http://localhost:8000")
+    parser.add_argument("--session-id", default="default", help="session_id for --url searches")
+    parser.add_argument("--workdir", default=None, help="keep generated corpus/index here (default: temp dir)")
+    parser.add_argument("--out", default=None, help="write JSON here (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="previous JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression ratio vs baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    stages = set(args.stages.split(","))
+    if args.url:
+        stages.add("search")
+    concurrency = [int(c) for c in args.concurrency.split(",") if c]
+    languages = args.languages.split(",")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="foundbyme-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    # 임베딩 디스크 캐시도 임시 폴더로 (실제 캐시 적중이 측정을 왜곡하지 않도록)
+    os.environ.setdefault("EMBEDDING_CACHE_DIR", os.path.join(workdir, "embedding_cache"))
+
+    # 요청한 단계에 필요한 준비 단계만 실행 (parse/search만 측정할 때는 모델을 로드하지 않음)
+    needs_insert = bool(stages & {"insert", "query", "rerank", "projection"})
+    needs_engine = needs_insert or bool(stages & {"embed", "compact"})
+    needs_corpus = needs_engine or "parse" in stages
+
+    result: Dict[str, Any] = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "stages": {},
+    }
+    try:
+        queries = query_texts(args.queries, languages, args.seed)
+        if needs_corpus:
+            ids, texts, metas = prepare_corpus(args, workdir, languages, stages, result)
+
+        if needs_engine:
+            from chroma_engine import ChromaEngine
+
+            engine = ChromaEngine(persist_dir=os.path.join(workdir, "chroma"))
+            result["environment"].update({
+                "embedding_model": engine.model_name,
+                "model_load_s": round(timed(lambda: engine.model), 3),
+                "device": engine.device,
+                "sharding": "session" if engine.sharded else "none",
+            })
+
+            if "embed" in stages:
+                print("[BENCH] embed", file=sys.stderr)
+                result["stages"]["embed"], embeddings = bench_embed(
+                    engine, texts, queries, args.batch_size, concurrency
+                )
+            else:
+                embeddings = np.vstack([
+                    engine.embed(texts[i:i + args.batch_size]) for i in range(0, len(texts), args.batch_size)
+                ])
+            query_vectors = engine.embed(queries)
+
+        if needs_insert:
+            # 증분 투영 측정용으로 마지막 몇 개는 나중에 넣음
+            n_extra = min(max(1, len(ids) // 20), len(ids) - 1)
+            head = len(ids) - n_extra
+            print("[BENCH] insert", file=sys.stderr)
+            insert = bench_insert(engine, ids[:head], embeddings[:head], texts[:head], metas[:head], args.batch_size)
+            if "insert" in stages:
+                result["stages"]["insert"] = insert
+
+        if "query" in stages:
+            print("[BENCH] query", file=sys.stderr)
+            result["stages"]["query"] = bench_query(engine, query_vectors, args.top_k, concurrency)
+        if "rerank" in stages:
+            print("[BENCH] rerank", file=sys.stderr)
+            result["stages"]["rerank"] = bench_rerank(engine, queries, query_vectors, args.top_k, concurrency)
+        if "projection" in stages:
+            print("[BENCH] projection", file=sys.stderr)
+            result["stages"]["projection"] = bench_projection(
+                engine,
+                os.path.join(workdir, "projection"),
+                repeats=min(args.queries, 20),
+                extra=(ids[head:], embeddings[head:], texts[head:], metas[head:]),
+            )
+        if "compact" in stages:
+            print("[BENCH] compact", file=sys.stderr)
+            result["stages"]["compact"] = bench_compact(
+                embeddings,
+                query_vectors,
+                args.top_k,
+                dims=[int(d) for d in args.compact_dims.split(",") if d],
+                oversample=args.compact_oversample,
+            )
+        if "search" in stages and args.url:
+            print(f"[BENCH] search ({args.url})", file=sys.stderr)
+            result["stages"]["search"] = bench_search(args.url, queries, args.session_id, concurrency)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"[BENCH] Wrote {args.out}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            found = regressions(result["stages"], json.load(f).get("stages", {}), args.tolerance)
+        for line in found:
+            print(f"[BENCH] Regression {line}", file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# bench/timing.py
+# 지연 시간 측정 / 동시 실행 / 백분위 요약
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def summarize(samples: Sequence[float], wall: float, items: Optional[int] = None) -> Dict[str, Any]:
+    """
+    samples: 호출별 소요 시간(초), wall: 전체 소요 시간(초)
+    items: 처리한 항목 수 (청크, 파일 등. 호출 수와 다를 때만)
+    """
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    result: Dict[str, Any] = {
+        "count": len(ms),
+        "wall_s": round(wall, 4),
+        "throughput": round(len(ms) / wall, 2) if wall > 0 else 0.0,
+    }
+    if items is not None:
+        result["items"] = items
+        result["items_per_s"] = round(items / wall, 2) if wall > 0 else 0.0
+    if len(ms):
+        result.update({
+            "mean_ms": round(float(ms.mean()), 3),
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "max_ms": round(float(ms.max()), 3),
+        })
+    return result
+
+
+def timed(fn: Callable, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run_concurrent(
+    fn: Callable[[Any], Any],
+    inputs: List[Any],
+    concurrency: int,
+    items: Optional[int] = None,
+) -> Dict[str, Any]:
+    """inputs 각각에 fn을 concurrency개 스레드로 실행 → 호출별 지연 시간 요약"""
+    errors: List[str] = []
+
+    def call(x):
+        start = time.perf_counter()
+        try:
+            fn(x)
+        except Exception as e:
+            errors.append(str(e))
+            print(f"[BENCH] Call failed: {e}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        samples = [call(x) for x in inputs]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(call, inputs))
+    wall = time.perf_counter() - start
+
+    result = summarize(samples, wall, items)
+    result["concurrency"] = concurrency
+    result["errors"] = len(errors)
+    return result
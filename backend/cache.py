@@ -0,0 +1,59 @@
+# cache.py
+# 프로세스 내 LRU + TTL 캐시 (쿼리 임베딩, 검색 결과 캐시용)
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+def normalize_query(text: str) -> str:
+    # 공백/유니코드 정규화만 수행 (대소문자는 임베딩 결과가 달라질 수 있어 유지)
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TTLCache:
+    """
+    크기 제한(LRU)과 만료 시간(TTL)이 있는 thread-safe 캐시
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
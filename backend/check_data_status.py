@@ -56,11 +56,7 @@ def check_status(session_id=None):
     try:
         chroma = ChromaEngine()
         
-        where_filter = None
-        if session_id:
-            where_filter = {"session_id": session_id}
-            
-        results = chroma.collection.get(where=where_filter)
+        results = chroma.get(session_id or "default", include=["metadatas"])
         count = len(results['ids'])
         
         if count > 0:
@@ -1,73 +1,867 @@
 # chroma_engine.py
 import os
-from typing import List, Dict, Any
+import re
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional
 from dotenv import load_dotenv
 
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+import numpy as np
+
+import metrics
+import compact
+from cache import TTLCache, normalize_query
+from compact import (
+    CHROMA_COMPACT_DIM,
+    CHROMA_COMPACT_FIT_SAMPLES,
+    CHROMA_COMPACT_MIN_SAMPLES,
+    CHROMA_COMPACT_OVERSAMPLE,
+    CHROMA_COMPACT_RESCORE,
+    CompactProjection,
+    FullVectorStore,
+    cosine_distances,
+    fit_components,
+)
+from model_server import model_client
+from embedding_cache import EmbeddingCache, text_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows: 버전 파일 lock 없음
+    fcntl = None
 
 load_dotenv()
 
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+# 활성 세대(generation) 이름 (전체 재구축 때는 "documents_<timestamp>" 새 세대를 만든 뒤 교체)
+COLLECTION_NAME = "documents"
+# none   : 모든 세션을 한 컬렉션에 저장하고 session_id 메타데이터로 필터
+# session: 세션마다 컬렉션 하나 ("{세대}__{세션}"), 세션 검색은 그 컬렉션만 조회
+CHROMA_SHARDING = os.getenv("CHROMA_SHARDING", "none").lower()
+# 전체 세션(default) 검색 시 shard를 동시에 조회할 스레드 수
+CHROMA_SHARD_QUERY_WORKERS = int(os.getenv("CHROMA_SHARD_QUERY_WORKERS", "4"))
+SHARD_SEPARATOR = "__"
+# HNSW 인덱스 파라미터 (비워두면 Chroma 기본값, 값 고르기: python tune_hnsw.py)
+# M / CONSTRUCTION_EF는 컬렉션을 만들 때만 적용 (바꾼 뒤에는 /reindex?full=true 필요)
+# SEARCH_EF는 기존 컬렉션도 열 때 맞춰서 변경
+CHROMA_HNSW_M = int(os.getenv("CHROMA_HNSW_M") or 0)
+CHROMA_HNSW_CONSTRUCTION_EF = int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF") or 0)
+CHROMA_HNSW_SEARCH_EF = int(os.getenv("CHROMA_HNSW_SEARCH_EF") or 0)
+
+
+def shard_suffix(session_id: str) -> str:
+    # Chroma 컬렉션 이름 규칙(영숫자로 시작/끝, [A-Za-z0-9._-])에 맞지 않으면 해시로 대체
+    if re.fullmatch(r"[A-Za-z0-9](?:[A-Za-z0-9_-]{0,58}[A-Za-z0-9])?", session_id) and SHARD_SEPARATOR not in session_id:
+        return session_id
+    return "h" + hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:16]
+
+
+def generation_of(name: str) -> str:
+    return name.split(SHARD_SEPARATOR, 1)[0]
+
 
 class ChromaEngine:
+    """
+    임베딩 모델, Chroma 클라이언트/컬렉션은 처음 사용할 때 로드
+    (import만 하는 관리 스크립트나 재시작한 워커가 모델 로딩을 기다리지 않도록)
+    """
+
     def __init__(self, persist_dir: str | None = None):
         self.persist_dir = persist_dir or os.getenv("CHROMA_PERSIST_DIR", "./chroma_store")
 
-        self.client = chromadb.PersistentClient(
-            path=self.persist_dir,
-            settings=Settings(anonymized_telemetry=False),
-        )
-
-        model_name = os.getenv(
+        self.model_name = os.getenv(
             "EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
         )
-        print(f"[CHROMA] Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
+        # DEVICE 미지정 시 SentenceTransformer가 cuda/mps/cpu 중 자동 선택
+        self._device = os.getenv("DEVICE") or None
+        self.batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
 
-        self.collection = self.client.get_or_create_collection(
-            name="documents",
-            metadata={"hnsw:space": "cosine"},
+        self._model = None
+        self._client = None
+        self.sharded = CHROMA_SHARDING == "session"
+        # 컬렉션 이름 → handle (활성 세대가 바뀌면 비움)
+        self._handles: Dict[str, Any] = {}
+        self._handles_mtime = None
+        # 전체 재구축 중인 shadow 세대 (이 프로세스에서 삭제 요청이 오면 같이 반영)
+        self._shadow: Optional[str] = None
+        self._lock = threading.RLock()
+        self._query_pool = ThreadPoolExecutor(
+            max_workers=max(1, CHROMA_SHARD_QUERY_WORKERS), thread_name_prefix="chroma-shard"
         )
 
-    def embed(self, texts: List[str]) -> List[List[float]]:
-        emb = self.model.encode(texts, convert_to_numpy=True)
-        return emb.tolist()
+        # 누적 임베딩 통계 (chunks/s 계산용)
+        self.stats = {"chunks": 0, "seconds": 0.0}
+
+        # (모델명, 정규화된 질문) → 임베딩
+        self.query_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+        # (모델명, 청크 텍스트 해시) → 임베딩 (디스크, 인덱싱용)
+        self.embedding_cache = EmbeddingCache()
+        # 컬렉션이 바뀔 때마다 갱신되는 파일 (다른 워커 프로세스도 변경을 알 수 있도록)
+        self._version_path = os.path.join(self.persist_dir, "index_version")
+        # 활성 컬렉션 이름을 가리키는 파일 (교체를 다른 워커 프로세스도 알 수 있도록)
+        self._active_path = os.path.join(self.persist_dir, "active_collection")
+        # 세대별 압축 투영 / 재정렬용 원래 벡터 (compact.py)
+        self._compact_dir = os.path.join(self.persist_dir, "compact")
+        self._compact: Dict[str, CompactProjection] = {}
+        self._full_vectors: Dict[str, FullVectorStore] = {}
+        # 이미 원래 차원으로 기록돼 있어서 압축하지 않는 세대 (경고는 한 번만)
+        self._compact_skipped: set = set()
+        # 세대별 투영 학습 lock (학습 중에도 다른 세대의 검색은 계속)
+        self._fit_locks: Dict[str, threading.Lock] = {}
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    print(f"[CHROMA] Loading embedding model: {self.model_name}")
+                    start = time.perf_counter()
+                    self._model = SentenceTransformer(self.model_name, device=self._device)
+                    print(f"[CHROMA] Embedding model loaded in {time.perf_counter() - start:.1f}s")
+        return self._model
+
+    @property
+    def device(self) -> str:
+        if self._model is None and model_client.available():
+            return "model-server"
+        return str(self.model.device)
+
+    def dimension(self) -> int:
+        if self._model is None and model_client.available():
+            return int(model_client.info["dim"])
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import chromadb
+                    from chromadb.config import Settings
+
+                    self._client = chromadb.PersistentClient(
+                        path=self.persist_dir,
+                        settings=Settings(anonymized_telemetry=False),
+                    )
+        return self._client
+
+    @staticmethod
+    def _collection_metadata(
+        m: int = CHROMA_HNSW_M,
+        construction_ef: int = CHROMA_HNSW_CONSTRUCTION_EF,
+        search_ef: int = CHROMA_HNSW_SEARCH_EF,
+    ) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {"hnsw:space": "cosine"}
+        if m > 0:
+            metadata["hnsw:M"] = m
+        if construction_ef > 0:
+            metadata["hnsw:construction_ef"] = construction_ef
+        if search_ef > 0:
+            metadata["hnsw:search_ef"] = search_ef
+        return metadata
+
+    @staticmethod
+    def hnsw_config(handle) -> Dict[str, Any]:
+        """컬렉션의 현재 HNSW 설정 (Chroma 버전에 따라 없으면 메타데이터 기준)"""
+        try:
+            return dict(handle.configuration_json.get("hnsw") or {})
+        except Exception:
+            meta = handle.metadata or {}
+            return {
+                "max_neighbors": meta.get("hnsw:M"),
+                "ef_construction": meta.get("hnsw:construction_ef"),
+                "ef_search": meta.get("hnsw:search_ef"),
+            }
+
+    def _apply_search_ef(self, handle):
+        # search ef는 인덱스를 다시 만들지 않고 바꿀 수 있음 (M / construction ef는 재구축 필요)
+        if CHROMA_HNSW_SEARCH_EF <= 0 or self.hnsw_config(handle).get("ef_search") == CHROMA_HNSW_SEARCH_EF:
+            return
+        try:
+            handle.modify(configuration={"hnsw": {"ef_search": CHROMA_HNSW_SEARCH_EF}})
+            print(f"[CHROMA] {handle.name}: hnsw ef_search -> {CHROMA_HNSW_SEARCH_EF}")
+        except Exception as e:
+            print(f"[CHROMA] Could not change ef_search of {handle.name}: {e}")
+
+    def _pointer_mtime(self) -> int:
+        try:
+            return os.stat(self._active_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def generation(self) -> str:
+        """활성 세대 이름 (비샤딩 모드에서는 곧 컬렉션 이름)"""
+        try:
+            with open(self._active_path, "r") as f:
+                return f.read().strip() or COLLECTION_NAME
+        except FileNotFoundError:
+            return COLLECTION_NAME
+
+    def _name(self, generation: str, session_id: str) -> str:
+        if not self.sharded:
+            return generation
+        return f"{generation}{SHARD_SEPARATOR}{shard_suffix(session_id)}"
+
+    def _handle(self, name: str, create: bool = False):
+        """컬렉션 handle (캐시). create=False면 없는 컬렉션은 None"""
+        # 다른 프로세스가 세대를 교체했으면 캐시를 비움
+        mtime = self._pointer_mtime()
+        with self._lock:
+            if mtime != self._handles_mtime:
+                self._handles.clear()
+                self._handles_mtime = mtime
+            handle = self._handles.get(name)
+            if handle is not None:
+                return handle
+
+            if create:
+                handle = self.client.get_or_create_collection(
+                    name=name, metadata=self._collection_metadata()
+                )
+            else:
+                try:
+                    handle = self.client.get_collection(name=name)
+                except Exception:
+                    return None
+            self._apply_search_ef(handle)
+            self._handles[name] = handle
+            return handle
+
+    def _evict(self, name: str):
+        with self._lock:
+            self._handles.pop(name, None)
+
+    def _list_names(self, generation: str) -> List[str]:
+        # 세대에 속한 컬렉션 이름 (비샤딩: 자기 자신, 샤딩: 세션별 shard)
+        names = [getattr(c, "name", c) for c in self.client.list_collections()]
+        return [n for n in names if n == generation or n.startswith(generation + SHARD_SEPARATOR)]
+
+    @property
+    def collection(self):
+        """활성 컬렉션 (비샤딩 모드 전용, 샤딩 모드에서는 세션별 메서드 사용)"""
+        if self.sharded:
+            raise RuntimeError("collection is not available with CHROMA_SHARDING=session")
+        return self._handle(self.generation(), create=True)
+
+    def collections_for(self, session_id: str = "default", generation: Optional[str] = None) -> list:
+        """
+        session_id 조회 대상 컬렉션들
+        샤딩 모드에서 default는 모든 세션 shard (없는 세션은 빈 목록, 컬렉션을 만들지 않음)
+        """
+        generation = generation or self.generation()
+        if not self.sharded:
+            return [self._handle(generation, create=True)]
+        if session_id == "default":
+            names = [n for n in self._list_names(generation) if n != generation]
+        else:
+            names = [self._name(generation, session_id)]
+        return [h for h in (self._handle(n) for n in names) if h is not None]
+
+    def where_for(self, session_id: str) -> Optional[Dict[str, Any]]:
+        # 샤딩 모드에서는 컬렉션 자체가 세션이므로 필터가 필요 없음
+        if self.sharded or session_id == "default":
+            return None
+        return {"session_id": session_id}
+
+    def _each(self, collections: list, fn) -> list:
+        """
+        컬렉션별로 fn(handle) 실행 (여러 개면 병렬). 다른 프로세스가 지운 shard만 건너뜀
+        그 밖의 에러(차원 불일치, 잘못된 include, I/O 등)는 그대로 올려서 일부 결과만 돌려주지 않음
+        """
+        from chromadb.errors import NotFoundError
+
+        def run(handle):
+            try:
+                return fn(handle)
+            except NotFoundError as e:
+                if not self.sharded:
+                    raise
+                print(f"[CHROMA] Skipping deleted shard {handle.name}: {e}")
+                self._evict(handle.name)
+                return None
+
+        if len(collections) <= 1:
+            results = [run(h) for h in collections]
+        else:
+            results = list(self._query_pool.map(run, collections))
+        return [r for r in results if r is not None]
+
+    def query(
+        self,
+        session_id: str,
+        query_embeddings,
+        n_results: int,
+        include: List[str],
+        rescore: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        세션 범위 벡터 검색 (collection.query와 같은 형태, 질문 1개)
+        rescore=False면 압축 세대에서도 원래 벡터로 재정렬하지 않음 (HNSW 결과만 보는 tune_hnsw.py용)
+        여러 shard를 조회한 경우 거리순으로 합쳐 상위 n_results개
+        """
+        include = list(include)
+        if "distances" not in include:
+            include.append("distances")
+        where = self.where_for(session_id)
+
+        # 압축 세대: 질문도 같은 공간으로 투영, 원래 벡터가 있으면 후보를 넉넉히 뽑아 재정렬
+        gen = self.generation()
+        proj = self.compact_for(gen)
+        store = self._full_store(gen) if proj is not None and rescore else None
+        full_queries = np.asarray(query_embeddings, dtype=np.float32)
+        fetch_n = n_results
+        if proj is not None:
+            query_embeddings = proj.transform(full_queries).tolist()
+            if store is not None and len(full_queries) == 1:
+                fetch_n = n_results * max(1, CHROMA_COMPACT_OVERSAMPLE)
+            else:
+                store = None
+
+        with metrics.span("chroma.query"):
+            parts = self._each(
+                self.collections_for(session_id, generation=gen),
+                lambda h: h.query(
+                    query_embeddings=query_embeddings,
+                    n_results=fetch_n,
+                    where=where,
+                    include=include,
+                ),
+            )
+
+        merged = []
+        for part in parts:
+            for i, cid in enumerate(part["ids"][0]):
+                merged.append((
+                    part["distances"][0][i],
+                    cid,
+                    {key: part[key][0][i] for key in include if part.get(key) is not None},
+                ))
+        merged.sort(key=lambda x: x[0])
+        if store is not None:
+            with metrics.span("chroma.rescore"):
+                merged = self._rescore(store, full_queries[0], merged, n_results)
+        merged = merged[:n_results]
+
+        result: Dict[str, Any] = {"ids": [[cid for _, cid, _ in merged]]}
+        for key in include:
+            result[key] = [[row[key] for _, _, row in merged if key in row]]
+        return result
+
+    @staticmethod
+    def _rescore(store: FullVectorStore, query: np.ndarray, merged: list, n_results: int) -> list:
+        # 원래 벡터로 정확한 cosine 거리를 다시 계산 (보관된 벡터가 없는 후보는 근사 거리 유지)
+        vectors = store.get([cid for _, cid, _ in merged])
+        hit = [i for i, (_, cid, _) in enumerate(merged) if cid in vectors]
+        if not hit:
+            return merged
+        exact = cosine_distances(query, np.vstack([vectors[merged[i][1]] for i in hit]))
+
+        rescored = list(merged)
+        for i, distance in zip(hit, exact):
+            _, cid, row = merged[i]
+            row["distances"] = float(distance)
+            rescored[i] = (float(distance), cid, row)
+        rescored.sort(key=lambda x: x[0])
+
+        before = {cid for _, cid, _ in merged[:n_results]}
+        after = [cid for _, cid, _ in rescored[:n_results]]
+        if after:
+            compact.rescore_overlap.observe(len(before.intersection(after)) / len(after))
+        return rescored
+
+    def get(
+        self,
+        session_id: str = "default",
+        ids: Optional[List[str]] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """세션 범위 get (여러 shard면 결과를 이어붙임, 순서는 보장하지 않음)"""
+        include = include or ["metadatas"]
+        where = self.where_for(session_id)
+        if ids is not None and not ids:
+            return {"ids": [], **{key: [] for key in include}}
+
+        with metrics.span("chroma.get"):
+            parts = self._each(
+                self.collections_for(session_id),
+                lambda h: h.get(ids=ids, where=where, include=include),
+            )
+        result: Dict[str, Any] = {"ids": [], **{key: [] for key in include}}
+        for part in parts:
+            result["ids"].extend(part["ids"])
+            for key in include:
+                if part.get(key) is not None:
+                    result[key].extend(list(part[key]))
+        return result
+
+    def count(self, session_id: str = "default") -> int:
+        if not self.sharded and session_id != "default":
+            return len(self.get(session_id)["ids"])
+        return sum(self._each(self.collections_for(session_id), lambda h: h.count()))
+
+    def iter_pages(self, include: List[str], page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """활성 세대의 모든 청크를 페이지 단위로 (backfill, 통계용)"""
+        for handle in self.collections_for("default"):
+            total = handle.count()
+            for offset in range(0, total, page_size):
+                yield handle.get(include=include, limit=page_size, offset=offset)
+
+    def create_shadow(self) -> str:
+        """
+        전체 재구축용 새 세대 생성 (검색은 교체 전까지 기존 세대를 계속 사용)
+        이전에 실패한 재구축이 남긴 세대는 여기서 정리
+        """
+        active = self.generation()
+        stale = set()
+        for name in [getattr(c, "name", c) for c in self.client.list_collections()]:
+            gen = generation_of(name)
+            if gen.startswith(f"{COLLECTION_NAME}_") and gen != active:
+                print(f"[CHROMA] Dropping stale shadow collection {name}")
+                stale.add(gen)
+                try:
+                    self.client.delete_collection(name)
+                except Exception:
+                    pass
+        if os.path.isdir(self._compact_dir):
+            for file in os.listdir(self._compact_dir):
+                gen = file.split(".", 1)[0]
+                if gen.startswith(f"{COLLECTION_NAME}_") and gen != active:
+                    stale.add(gen)
+        for gen in stale:
+            self._drop_compact(gen)
+
+        generation = f"{COLLECTION_NAME}_{time.time_ns()}"
+        if not self.sharded:
+            self.client.create_collection(name=generation, metadata=self._collection_metadata())
+        self._shadow = generation
+        print(f"[CHROMA] Building shadow generation {generation}")
+        return generation
+
+    def swap(self, generation: str):
+        """shadow 세대를 활성 세대로 교체하고 이전 세대의 컬렉션 삭제"""
+        old = self.generation()
+        os.makedirs(self.persist_dir, exist_ok=True)
+        tmp = self._active_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(generation)
+        # 교체는 원자적으로 (읽는 쪽은 이전 이름 또는 새 이름만 봄)
+        os.replace(tmp, self._active_path)
+
+        with self._lock:
+            self._handles.clear()
+            self._shadow = None
+        self._bump_version()
+        print(f"[CHROMA] Active generation: {old} -> {generation}")
+        self._drop_generation(old)
+
+    def drop_shadow(self, generation: str):
+        # 재구축 실패/취소 시 shadow 삭제 (활성 세대는 그대로)
+        with self._lock:
+            if self._shadow == generation:
+                self._shadow = None
+        self._drop_generation(generation)
+
+    def _drop_generation(self, generation: str):
+        for name in self._list_names(generation):
+            try:
+                self.client.delete_collection(name)
+                self._evict(name)
+            except Exception as e:
+                print(f"[CHROMA] Failed to drop collection {name}: {e}")
+        self._drop_compact(generation)
+
+    def _compact_paths(self, generation: str) -> tuple:
+        # (투영 행렬, 원래 벡터) 파일
+        base = os.path.join(self._compact_dir, generation)
+        return base + ".npz", base + ".sqlite"
+
+    def compact_for(self, generation: Optional[str] = None) -> Optional[CompactProjection]:
+        """세대의 압축 투영 (압축 세대가 아니면 None)"""
+        generation = generation or self.generation()
+        proj = self._compact.get(generation)
+        if proj is None:
+            path, _ = self._compact_paths(generation)
+            if not os.path.exists(path):
+                return None
+            with self._lock:
+                proj = self._compact.get(generation)
+                if proj is None:
+                    proj = self._compact[generation] = CompactProjection.load(path)
+        return proj
+
+    def _full_store(self, generation: str, create: bool = False) -> Optional[FullVectorStore]:
+        store = self._full_vectors.get(generation)
+        if store is None:
+            _, path = self._compact_paths(generation)
+            if not create and not os.path.exists(path):
+                return None
+            with self._lock:
+                store = self._full_vectors.get(generation)
+                if store is None:
+                    store = self._full_vectors[generation] = FullVectorStore(path)
+        return store
+
+    def _ensure_compact(self, generation: str, embeddings: np.ndarray) -> Optional[CompactProjection]:
+        """
+        쓰기 전에 호출: 압축 세대면 투영 반환
+        CHROMA_COMPACT_DIM이 설정돼 있고 세대가 비어 있으면 여기서 투영을 학습
+        (임베딩 디스크 캐시의 샘플 + 이번 배치)
+        """
+        proj = self.compact_for(generation)
+        if proj is not None or CHROMA_COMPACT_DIM <= 0 or generation in self._compact_skipped:
+            return proj
+        # 학습(샘플링 + SVD)은 엔진 lock 밖에서: 같은 lock을 쓰는 검색(_handle)이 학습을 기다리지 않도록
+        # 이 프로세스 안의 중복 학습은 세대별 lock으로, 프로세스 간 경쟁은 save()의 os.link로 정리
+        with self._fit_lock(generation):
+            proj = self.compact_for(generation)
+            if proj is not None:
+                return proj
+            if sum(h.count() for h in self.collections_for("default", generation=generation)) > 0:
+                # 이미 원래 차원으로 기록된 세대에는 섞어 쓸 수 없음
+                print(f"[CHROMA] {generation} already stores full vectors, "
+                      f"run a full reindex to switch to compact storage")
+                with self._lock:
+                    self._compact_skipped.add(generation)
+                return None
+
+            samples = self.embedding_cache.sample(self.model_name, CHROMA_COMPACT_FIT_SAMPLES)
+            if samples.shape[1:] == embeddings.shape[1:]:
+                # 이번 배치는 보통 이미 캐시에 들어 있으므로 중복 제거
+                samples = np.unique(np.vstack([samples, embeddings]), axis=0)
+            else:
+                samples = embeddings
+            if len(samples) < CHROMA_COMPACT_MIN_SAMPLES:
+                # 새로 설치한 뒤 첫 업로드처럼 벡터가 몇 개 없으면 학습하지 않음
+                # (이 세대는 원래 벡터로 저장, 충분히 쌓인 뒤 전체 재구축 때 압축)
+                print(f"[CHROMA] Only {len(samples)} vectors to learn the compact projection for {generation} "
+                      f"(need {CHROMA_COMPACT_MIN_SAMPLES}), storing full vectors. "
+                      f"Run a full reindex once more documents are indexed")
+                metrics.event("compact_fit_skipped")
+                with self._lock:
+                    self._compact_skipped.add(generation)
+                return None
+            components, explained = fit_components(samples, CHROMA_COMPACT_DIM)
+            path, _ = self._compact_paths(generation)
+            proj = CompactProjection(components, explained, len(samples)).save(path)
+            if CHROMA_COMPACT_RESCORE:
+                self._full_store(generation, create=True)
+            with self._lock:
+                self._compact[generation] = proj
+            print(f"[CHROMA] Compact storage for {generation}: {proj.full_dim} -> {proj.dim} dims, "
+                  f"explained variance {proj.explained:.3f} ({proj.samples} samples, "
+                  f"rescore={'on' if CHROMA_COMPACT_RESCORE else 'off'})")
+            return proj
+
+    def _fit_lock(self, generation: str) -> threading.Lock:
+        with self._lock:
+            return self._fit_locks.setdefault(generation, threading.Lock())
+
+    def _drop_compact(self, generation: str):
+        with self._lock:
+            self._compact.pop(generation, None)
+            self._compact_skipped.discard(generation)
+            self._fit_locks.pop(generation, None)
+            store = self._full_vectors.pop(generation, None)
+        if store is not None:
+            store.close()
+        for path in self._compact_paths(generation):
+            for file in (path, path + "-wal", path + "-shm"):
+                try:
+                    os.remove(file)
+                except FileNotFoundError:
+                    pass
+
+    def to_stored(self, vectors, generation: Optional[str] = None) -> np.ndarray:
+        """원래 임베딩 → 컬렉션에 저장된 벡터 공간 (압축 세대면 투영, 아니면 그대로)"""
+        X = np.asarray(vectors, dtype=np.float32)
+        proj = self.compact_for(generation)
+        return X if proj is None else proj.transform(X)
+
+    def compact_info(self) -> Optional[Dict[str, Any]]:
+        """활성 세대의 압축 정보 (압축 세대가 아니면 None)"""
+        gen = self.generation()
+        proj = self.compact_for(gen)
+        if proj is None:
+            return None
+        return dict(proj.info(), rescore=self._full_store(gen) is not None)
+
+    def _generations(self) -> List[str]:
+        # 쓰기/삭제 대상 세대 (활성 + 재구축 중인 shadow)
+        return [self.generation()] + ([self._shadow] if self._shadow is not None else [])
+
+    def status(self) -> Dict[str, bool]:
+        """로드 여부 (로드를 일으키지 않음)"""
+        return {
+            "embedding_model": self._model is not None or model_client.available(),
+            "collection": self._client is not None,
+        }
+
+    def warm_up(self):
+        # 첫 검색 요청이 모델 로딩/컬렉션 열기를 기다리지 않도록 미리 로드
+        self.collections_for("default")
+        self.embed(["warm up"])
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        texts → (N, dim) float32 배열 (입력 순서 유지)
+        길이순으로 정렬해서 배치마다 패딩 낭비를 줄이고, 결과는 원래 순서로 되돌림
+        """
+        if not texts:
+            return np.zeros((0, self.dimension()), dtype=np.float32)
+
+        if model_client.enabled:
+            # 모델 서버가 있으면 거기서 계산 (연결할 수 없으면 None → 아래에서 직접 계산)
+            start = time.perf_counter()
+            with metrics.span("embed.remote"):
+                out = model_client.embed(self.model_name, list(texts))
+            if out is not None:
+                self.stats["chunks"] += len(texts)
+                self.stats["seconds"] += time.perf_counter() - start
+                return out
+
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        model = self.model
+        start = time.perf_counter()
+        with metrics.span("embed.encode"):
+            emb = model.encode(
+                [texts[i] for i in order],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        elapsed = time.perf_counter() - start
+
+        out = np.empty_like(emb, dtype=np.float32)
+        out[order] = emb
+
+        self.stats["chunks"] += len(texts)
+        self.stats["seconds"] += elapsed
+        return out
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """
+        인덱싱용 임베딩: 디스크 캐시에 없는 텍스트만 모델로 계산
+        (같은 내용의 청크는 reindex/다른 세션 업로드 때 다시 계산하지 않음)
+        """
+        if not texts:
+            return self.embed([])
+
+        hashes = [text_hash(t) for t in texts]
+        cached = self.embedding_cache.get_many(self.model_name, hashes)
+
+        missing = [i for i, h in enumerate(hashes) if h not in cached]
+        metrics.event("embedding_cache_hit", len(texts) - len(missing))
+        metrics.event("embedding_cache_miss", len(missing))
+        # 같은 배치 안의 중복 텍스트도 한 번만 계산
+        unique = list(dict.fromkeys(hashes[i] for i in missing))
+        if unique:
+            first = {}
+            for i in missing:
+                first.setdefault(hashes[i], i)
+            emb = self.embed([texts[first[h]] for h in unique])
+            self.embedding_cache.put_many(self.model_name, unique, emb)
+            cached.update(zip(unique, emb))
+
+        return np.vstack([cached[h] for h in hashes]).astype(np.float32)
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        검색 질문 임베딩 (LRU 캐시 사용, 캐시에 없는 것만 한 번에 인코딩)
+        """
+        keys = [self.query_key(q) for q in queries]
+        vectors = [self.query_cache.get(key) for key in keys]
+
+        missing = [i for i, vec in enumerate(vectors) if vec is None]
+        if missing:
+            emb = self.embed([keys[i][1] for i in missing])
+            for i, vec in zip(missing, emb):
+                self.query_cache.set(keys[i], vec)
+                vectors[i] = vec
+
+        if not vectors:
+            return np.zeros((0, self.dimension()), dtype=np.float32)
+        return np.vstack(vectors)
+
+    def query_key(self, query: str) -> tuple:
+        return (self.model_name, normalize_query(query))
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.embed_queries([query])[0]
+
+    def index_version(self) -> int:
+        """컬렉션 내용이 바뀔 때마다 1씩 늘어나는 값 (검색 결과 캐시 키로 사용)"""
+        try:
+            with open(self._version_path) as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_SH)  # 쓰는 중인 (비어 있는) 파일을 읽지 않도록
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _bump_version(self):
+        # 다른 워커 프로세스와 동시에 올려도 같은 값이 나오지 않도록 파일 lock 안에서 읽고 씀
+        os.makedirs(self.persist_dir, exist_ok=True)
+        with open(self._version_path, "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                version = int(f.read().strip() or 0)
+            except ValueError:
+                version = 0
+            f.seek(0)
+            f.truncate()
+            f.write(str(version + 1))
+
+    def throughput(self) -> float:
+        """지금까지 임베딩한 청크 수 / 소요 시간 (chunks/s)"""
+        if self.stats["seconds"] <= 0:
+            return 0.0
+        return self.stats["chunks"] / self.stats["seconds"]
 
     def clear_all(self):
+        if self.sharded:
+            # 세션 shard 컬렉션을 통째로 삭제 (다음 쓰기 때 다시 생성)
+            self._drop_generation(self.generation())
+            self._bump_version()
+            return
         # Instead of deleting the collection, we delete all items.
         # This prevents stale reference issues in other modules.
         try:
             existing_ids = self.collection.get()["ids"]
             if existing_ids:
                 self.collection.delete(ids=existing_ids)
+            store = self._full_store(self.generation())
+            if store is not None:
+                store.clear()
         except Exception as e:
             print(f"[CHROMA] Error clearing collection: {e}")
             # Fallback to recreate if needed, but prefer deletion
-            self.client.delete_collection("documents")
-            self.collection = self.client.get_or_create_collection(
-                name="documents",
-                metadata={"hnsw:space": "cosine"},
-            )
+            name = self.generation()
+            self.client.delete_collection(name)
+            self._evict(name)
+        self._bump_version()
+
+    def delete_paths(
+        self,
+        paths: List[str],
+        batch_size: int = 500,
+        generation: Optional[str] = None,
+        session_ids: Optional[List[str]] = None,
+    ):
+        """
+        파일 경로 단위로 청크 삭제 (증분 reindex에서 변경/삭제된 파일 정리용)
+        generation 미지정 시 활성 세대 (+ 재구축 중인 shadow)
+        샤딩 모드에서 session_ids를 주면 그 세션 shard만, 아니면 모든 shard에서 삭제
+        """
+        if not paths:
+            return
+        generations = [generation] if generation is not None else self._generations()
+        for gen in generations:
+            if not self.sharded:
+                targets = [self._handle(gen, create=True)]
+            elif session_ids is not None:
+                names = [self._name(gen, sid) for sid in dict.fromkeys(session_ids)]
+                targets = [h for h in (self._handle(n) for n in names) if h is not None]
+            else:
+                targets = self.collections_for("default", generation=gen)
+            for target in targets:
+                for i in range(0, len(paths), batch_size):
+                    target.delete(where={"path": {"$in": paths[i:i + batch_size]}})
+            store = self._full_store(gen)
+            if store is not None:
+                store.delete_paths(paths)
+        if generation is None:
+            self._bump_version()
+
+    def delete_session(self, session_id: str):
+        for gen in self._generations():
+            if self.sharded:
+                # 세션 shard는 컬렉션째 삭제 (메타데이터 필터 삭제보다 훨씬 빠름)
+                name = self._name(gen, session_id)
+                try:
+                    self.client.delete_collection(name)
+                except Exception:
+                    pass
+                self._evict(name)
+            else:
+                self._handle(gen, create=True).delete(where={"session_id": session_id})
+            store = self._full_store(gen)
+            if store is not None:
+                store.delete_session(session_id)
+        self._bump_version()
 
     def upsert_documents(
         self,
         ids: List[str],
         texts: List[str],
         metadatas: List[Dict[str, Any]],
+        generation: Optional[str] = None,
     ):
-        embeddings = self.embed(texts)
+        """
+        generation 미지정 시 활성 세대에 기록 (shadow에 쓸 때는 검색 캐시 버전을 올리지 않음)
+        샤딩 모드에서는 metadata의 session_id로 shard를 골라 기록
+        """
+        start = time.perf_counter()
+        hits = self.embedding_cache.hits
+        embeddings = self.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+        cached = self.embedding_cache.hits - hits
+        rate = len(texts) / elapsed if elapsed > 0 else 0.0
+        print(f"[CHROMA] Embedded {len(texts)} chunks ({cached} cached) in {elapsed:.2f}s "
+              f"({rate:.1f} chunks/s, batch={self.batch_size}, device={self.device})")
+
+        self.upsert_embeddings(ids, embeddings, texts, metadatas, generation=generation)
+
+    def upsert_embeddings(
+        self,
+        ids: List[str],
+        embeddings,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        generation: Optional[str] = None,
+    ):
+        """이미 계산한 임베딩을 기록 (upsert_documents의 쓰기 단계, 벤치마크에서 단독 측정용)"""
+        if not ids:
+            return
+        gen = generation or self.generation()
+        # 압축 세대면 줄인 벡터를 Chroma에, 원래 벡터는 (재정렬용으로) float16 sidecar에
+        proj = self._ensure_compact(gen, np.asarray(embeddings, dtype=np.float32))
+        if proj is not None:
+            store = self._full_store(gen)
+            if store is not None:
+                with metrics.span("chroma.full_vectors"):
+                    store.put(ids, embeddings, metadatas)
+            embeddings = proj.transform(embeddings)
+
+        groups: Dict[str, List[int]] = {}
+        for i, meta in enumerate(metadatas):
+            name = self._name(gen, meta.get("session_id") or "default")
+            groups.setdefault(name, []).append(i)
+
         # Chroma는 id가 중복되면 add에서 에러날 수 있으니 upsert-like 동작을 위해:
-        self.collection.upsert(
-            ids=ids,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            documents=texts,
-        )
+        with metrics.span("chroma.upsert"):
+            for name, idx in groups.items():
+                self._handle(name, create=True).upsert(
+                    ids=[ids[i] for i in idx],
+                    embeddings=[embeddings[i] for i in idx],
+                    metadatas=[metadatas[i] for i in idx],
+                    documents=[texts[i] for i in idx],
+                )
+        if generation is None:
+            self._bump_version()
 
     def search(self, query: str, top_k: int = 5) -> Dict[str, Any]:
-        q_emb = self.embed([query])[0]
-        return self.collection.query(
+        q_emb = self.embed_query(query)
+        return self.query(
+            "default",
             query_embeddings=[q_emb],
             n_results=top_k,
+            include=["documents", "metadatas", "distances"],
         )
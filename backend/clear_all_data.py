@@ -47,12 +47,11 @@ def clear_all_data():
     print("\n[3] 🧠 Cleaning Vector Database (ChromaDB)...")
     try:
         chroma = ChromaEngine()
-        # Get all IDs
-        result = chroma.collection.get()
-        ids = result['ids']
-        if ids:
-            chroma.collection.delete(ids=ids)
-            print(f"   ✅ Deleted {len(ids)} vectors from ChromaDB.")
+        count = chroma.count()
+        if count:
+            # clear_all()은 인덱스 버전도 갱신하므로 실행 중인 서버의 검색 캐시도 무효화됨
+            chroma.clear_all()
+            print(f"   ✅ Deleted {count} vectors from ChromaDB.")
         else:
             print("   - ChromaDB is already empty.")
             
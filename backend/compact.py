@@ -0,0 +1,193 @@
+# compact.py
+# 압축 벡터 저장 (CHROMA_COMPACT_DIM > 0일 때 새로 만드는 세대에 적용)
+# - Chroma에는 PCA로 줄인 CHROMA_COMPACT_DIM차원 벡터만 저장 (HNSW 메모리/디스크가 차원에 비례해서 줄어듦)
+# - 투영 행렬은 세대마다 {persist_dir}/compact/{세대}.npz로 저장 (세대가 살아 있는 동안 바뀌지 않음)
+# - CHROMA_COMPACT_RESCORE=true면 원래 벡터를 float16으로 {세대}.sqlite에 따로 보관하고,
+#   검색 때 줄인 벡터로 후보를 넉넉히 뽑은 뒤 원래 벡터로 정확한 cosine 거리를 다시 계산
+# 압축 여부는 세대 단위 (투영 파일이 있으면 압축 세대). 기존 세대를 바꾸려면 전체 재구축
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# 0이면 사용 안 함 (원래 차원 그대로 저장)
+CHROMA_COMPACT_DIM = int(os.getenv("CHROMA_COMPACT_DIM", "0"))
+# 원래 벡터(float16)를 보관해서 검색 결과를 정확한 거리로 다시 정렬
+CHROMA_COMPACT_RESCORE = os.getenv("CHROMA_COMPACT_RESCORE", "true").lower() in ("1", "true", "yes")
+# 재정렬할 후보 수 = n_results * OVERSAMPLE
+CHROMA_COMPACT_OVERSAMPLE = int(os.getenv("CHROMA_COMPACT_OVERSAMPLE", "4"))
+# 투영 학습에 쓸 최대 벡터 수 (임베딩 디스크 캐시 + 첫 배치에서 샘플링)
+CHROMA_COMPACT_FIT_SAMPLES = int(os.getenv("CHROMA_COMPACT_FIT_SAMPLES", "20000"))
+# 투영을 학습하는 데 필요한 최소 벡터 수 (모자라면 그 세대는 원래 벡터로 저장, 기본: 차원 × 4)
+# 샘플이 적으면 나머지 축이 무작위 벡터로 채워진 투영이 세대가 끝날 때까지 고정되므로
+CHROMA_COMPACT_MIN_SAMPLES = int(os.getenv("CHROMA_COMPACT_MIN_SAMPLES") or 4 * CHROMA_COMPACT_DIM)
+
+# 재정렬 전 상위 n개 중 재정렬 후에도 상위 n개에 남은 비율 (1.0이면 압축으로 순위가 바뀌지 않음)
+rescore_overlap = metrics.histogram(
+    "compact_rescore_overlap",
+    "Share of the compact top-n that is still in the top-n after exact rescoring",
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0),
+)
+
+
+def fit_components(samples: np.ndarray, dim: int, seed: int = 0) -> tuple:
+    """
+    samples (N, D) → (components (dim, D), 설명된 분산 비율)
+    cosine/내적을 보존하도록 평균을 빼지 않은 SVD (정규화된 임베딩은 원점 기준 방향이 의미)
+    샘플이 dim개보다 적으면 나머지 축은 무작위 직교 벡터로 채움
+    """
+    X = np.asarray(samples, dtype=np.float32)
+    full_dim = X.shape[1]
+    dim = min(dim, full_dim)
+
+    _, s, vt = np.linalg.svd(X, full_matrices=False)
+    energy = s ** 2
+    explained = float(energy[:dim].sum() / energy.sum()) if energy.sum() > 0 else 0.0
+    components = vt[:dim]
+
+    if components.shape[0] < dim:
+        rng = np.random.default_rng(seed)
+        extra = rng.standard_normal((dim - components.shape[0], full_dim)).astype(np.float32)
+        q, _ = np.linalg.qr(np.vstack([components, extra]).T)
+        components = q.T[:dim]
+    return components.astype(np.float32), explained
+
+
+class CompactProjection:
+    def __init__(self, components: np.ndarray, explained: float, samples: int):
+        self.components = np.asarray(components, dtype=np.float32)  # (dim, full_dim)
+        self.explained = explained
+        self.samples = samples
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def full_dim(self) -> int:
+        return self.components.shape[1]
+
+    def transform(self, vectors) -> np.ndarray:
+        X = np.asarray(vectors, dtype=np.float32)
+        if len(X) == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return X @ self.components.T
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "dim": self.dim,
+            "full_dim": self.full_dim,
+            "explained_variance": round(self.explained, 4),
+            "fit_samples": self.samples,
+        }
+
+    @classmethod
+    def load(cls, path: str) -> "CompactProjection":
+        with np.load(path) as data:
+            return cls(data["components"], float(data["explained"]), int(data["samples"]))
+
+    def save(self, path: str) -> "CompactProjection":
+        """
+        이미 같은 세대의 투영이 있으면 (다른 워커 프로세스가 먼저 학습) 그것을 돌려줌
+        한 세대의 벡터는 모두 같은 투영을 써야 하므로 덮어쓰지 않음
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, components=self.components, explained=self.explained, samples=self.samples)
+        try:
+            os.link(tmp, path)  # 없을 때만 생성 (원자적)
+            return self
+        except FileExistsError:
+            return CompactProjection.load(path)
+        finally:
+            os.remove(tmp)
+
+
+class FullVectorStore:
+    """재정렬용 원래 벡터 (float16, id → vector). 세대마다 sqlite 파일 하나"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS vectors (
+                id TEXT PRIMARY KEY,
+                session_id TEXT,
+                path TEXT,
+                vec BLOB NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_vectors_path ON vectors (path)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_vectors_session ON vectors (session_id)")
+
+    def put(self, ids: List[str], vectors, metadatas: List[Dict[str, Any]]):
+        vectors = np.asarray(vectors, dtype=np.float16)
+        rows = [
+            (cid, meta.get("session_id"), meta.get("path"), vec.tobytes())
+            for cid, vec, meta in zip(ids, vectors, metadatas)
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (id, session_id, path, vec) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.execute("COMMIT")
+
+    def get(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ", ".join("?" * len(batch))
+                for cid, blob in self._conn.execute(
+                    f"SELECT id, vec FROM vectors WHERE id IN ({placeholders})", batch
+                ):
+                    found[cid] = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+        return found
+
+    def delete_paths(self, paths: List[str]):
+        with self._lock:
+            for i in range(0, len(paths), 500):
+                batch = paths[i:i + 500]
+                placeholders = ", ".join("?" * len(batch))
+                self._conn.execute(f"DELETE FROM vectors WHERE path IN ({placeholders})", batch)
+
+    def delete_session(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM vectors WHERE session_id = ?", (session_id,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM vectors")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def cosine_distances(query: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    q = np.asarray(query, dtype=np.float32)
+    V = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(V, axis=1) * np.linalg.norm(q)
+    return 1.0 - (V @ q) / np.maximum(norms, 1e-12)
+
+
+def recall_at_k(exact: List[List[str]], approx: List[List[str]], k: int) -> float:
+    """질문별 정확한 상위 k개 중 근사 검색 상위 k개에 들어간 비율의 평균"""
+    if not exact:
+        return 0.0
+    total = 0.0
+    for e, a in zip(exact, approx):
+        if e[:k]:
+            total += len(set(e[:k]) & set(a[:k])) / len(e[:k])
+    return total / len(exact)
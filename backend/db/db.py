@@ -20,9 +20,21 @@ if os.getenv("USE_POSTGRES") == "true":
 else:
     DATABASE_URL = "sqlite:///./sql_app.db"
 
+# 커넥션 풀 설정 (uvicorn 워커 수 × (POOL_SIZE + MAX_OVERFLOW)가 DB max_connections를 넘지 않게)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# 끊긴 커넥션(DB 재시작, 방화벽 idle timeout)을 꺼내기 전에 확인
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# 이 시간(초)보다 오래된 커넥션은 새로 연결 (-1이면 사용 안 함)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
 )
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 Base = declarative_base()
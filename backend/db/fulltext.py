@@ -0,0 +1,167 @@
+# db/fulltext.py
+# 청크 본문 전문(lexical) 검색 인덱스
+# - SQLite    : fts_chunks(일반 테이블) + chunk_fts(FTS5 external content, trigger로 동기화)
+# - PostgreSQL: fts_chunks + tsvector generated column + GIN index
+# 정확한 식별자, 파일 코드, 드문 한국어 단어처럼 벡터 검색 후보에서 빠지기 쉬운 것들을 보완한다.
+import os
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from .db import engine
+
+# SQLite FTS5 tokenizer. trigram은 조사가 붙은 한국어/부분 문자열에 강함 (SQLite 3.34+)
+FTS_TOKENIZER = os.getenv("FTS_TOKENIZER", "trigram")
+
+
+def _is_postgres(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+def create_schema(bind=engine):
+    with bind.begin() as conn:
+        if _is_postgres(bind):
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS fts_chunks (
+                    chunk_id VARCHAR(255) PRIMARY KEY,
+                    session_id VARCHAR(255) NOT NULL,
+                    path VARCHAR(1024) NOT NULL,
+                    content TEXT NOT NULL,
+                    tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED
+                )
+            """))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_fts_chunks_tsv ON fts_chunks USING GIN (tsv)"))
+        else:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS fts_chunks (
+                    rowid INTEGER PRIMARY KEY,
+                    chunk_id VARCHAR(255) NOT NULL UNIQUE,
+                    session_id VARCHAR(255) NOT NULL,
+                    path VARCHAR(1024) NOT NULL,
+                    content TEXT NOT NULL
+                )
+            """))
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunk_fts'"
+            )).first()
+            if not exists:
+                try:
+                    conn.execute(text(
+                        "CREATE VIRTUAL TABLE chunk_fts USING fts5("
+                        f"content, content='fts_chunks', content_rowid='rowid', tokenize='{FTS_TOKENIZER}')"
+                    ))
+                except OperationalError as e:
+                    # 오래된 SQLite에는 trigram tokenizer가 없음
+                    print(f"[DB] FTS5 tokenizer '{FTS_TOKENIZER}' unavailable ({e}), using unicode61")
+                    conn.execute(text(
+                        "CREATE VIRTUAL TABLE chunk_fts USING fts5("
+                        "content, content='fts_chunks', content_rowid='rowid', tokenize='unicode61')"
+                    ))
+
+            conn.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS fts_chunks_ai AFTER INSERT ON fts_chunks BEGIN
+                    INSERT INTO chunk_fts(rowid, content) VALUES (new.rowid, new.content);
+                END
+            """))
+            conn.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS fts_chunks_ad AFTER DELETE ON fts_chunks BEGIN
+                    INSERT INTO chunk_fts(chunk_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+                END
+            """))
+
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_fts_chunks_path ON fts_chunks (path)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_fts_chunks_session_id ON fts_chunks (session_id)"))
+
+
+def _sqlite_tokenizer(db: Session) -> str:
+    sql = db.execute(text("SELECT sql FROM sqlite_master WHERE name = 'chunk_fts'")).scalar() or ""
+    return "trigram" if "trigram" in sql else "unicode61"
+
+
+def count(db: Session) -> int:
+    return db.execute(text("SELECT COUNT(*) FROM fts_chunks")).scalar_one()
+
+
+def _delete_in(db: Session, column: str, values: List[str], batch_size: int = 500):
+    for i in range(0, len(values), batch_size):
+        batch = values[i:i + batch_size]
+        params = {f"v{j}": v for j, v in enumerate(batch)}
+        placeholders = ", ".join(f":v{j}" for j in range(len(batch)))
+        db.execute(text(f"DELETE FROM fts_chunks WHERE {column} IN ({placeholders})"), params)
+
+
+def delete_paths(db: Session, paths: List[str]):
+    _delete_in(db, "path", paths)
+
+
+def delete_session(db: Session, session_id: str):
+    db.execute(text("DELETE FROM fts_chunks WHERE session_id = :sid"), {"sid": session_id})
+
+
+def delete_all(db: Session):
+    db.execute(text("DELETE FROM fts_chunks"))
+
+
+def add_chunks(db: Session, rows: List[Dict]):
+    """
+    rows: [{"chunk_id", "session_id", "path", "content"}, ...]
+    같은 path의 기존 청크는 delete_paths로 먼저 지운 뒤 호출
+    """
+    if not rows:
+        return
+    # doc id가 재사용된 경우 등 남아 있는 같은 chunk_id 정리
+    _delete_in(db, "chunk_id", [r["chunk_id"] for r in rows])
+    db.execute(
+        text(
+            "INSERT INTO fts_chunks (chunk_id, session_id, path, content) "
+            "VALUES (:chunk_id, :session_id, :path, :content)"
+        ),
+        rows,
+    )
+
+
+def _terms(query: str) -> List[str]:
+    return re.findall(r"\w[\w\-.]*", query)
+
+
+def search(db: Session, query: str, session_id: Optional[str] = None, limit: int = 15) -> List[str]:
+    """
+    질문의 단어 중 하나라도 포함한 청크를 관련도 순으로 → chunk_id 목록
+    session_id가 None이면 전체 세션 대상
+    """
+    terms = _terms(query)
+    params = {"limit": limit}
+    session_clause = ""
+    if session_id is not None:
+        session_clause = "AND f.session_id = :sid"
+        params["sid"] = session_id
+
+    if _is_postgres(db.get_bind()):
+        if not terms:
+            return []
+        params["tsq"] = " | ".join("'" + t.replace("'", "''") + "'" for t in terms)
+        rows = db.execute(text(f"""
+            SELECT f.chunk_id FROM fts_chunks f
+            WHERE f.tsv @@ to_tsquery('simple', :tsq) {session_clause}
+            ORDER BY ts_rank(f.tsv, to_tsquery('simple', :tsq)) DESC
+            LIMIT :limit
+        """), params)
+        return [r[0] for r in rows]
+
+    if _sqlite_tokenizer(db) == "trigram":
+        # trigram은 3글자 미만 단어를 찾을 수 없음
+        terms = [t for t in terms if len(t) >= 3]
+    if not terms:
+        return []
+    params["match"] = " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+    rows = db.execute(text(f"""
+        SELECT f.chunk_id FROM chunk_fts
+        JOIN fts_chunks f ON f.rowid = chunk_fts.rowid
+        WHERE chunk_fts MATCH :match {session_clause}
+        ORDER BY bm25(chunk_fts)
+        LIMIT :limit
+    """), params)
+    return [r[0] for r in rows]
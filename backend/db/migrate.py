@@ -0,0 +1,91 @@
+# 실행: python -m db.migrate
+# create_all()은 이미 존재하는 테이블에 컬럼을 추가하지 않으므로,
+# 모델에 새로 생긴 컬럼(nullable)만 ALTER TABLE로 보강한다.
+from sqlalchemy import inspect, text, select, update, bindparam, func
+
+from .db import Base, engine
+from . import models
+from . import fulltext
+from paths import DATA_DIR, session_of
+
+
+def upgrade():
+    Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            added = []
+
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"))
+                added.append(col.name)
+                print(f"[DB] Added column {table.name}.{col.name}")
+
+            # 새 컬럼에 걸린 인덱스 생성
+            for index in table.indexes:
+                if any(c.name in added for c in index.columns):
+                    index.create(bind=conn, checkfirst=True)
+
+    backfill_document_sessions()
+    backfill_previews()
+
+    # 전문 검색 인덱스 (DB 종류별 DDL이 달라 모델 대신 직접 생성)
+    fulltext.create_schema(engine)
+
+
+def backfill_document_sessions(batch_size: int = 1000):
+    """
+    session_id/ext 컬럼이 생기기 전에 인덱싱된 문서 행을 경로로부터 채움
+    (채워야 할 행이 없으면 인덱스 조회 한 번으로 끝남)
+    """
+    Document = models.Document
+    stmt = (
+        update(Document.__table__)
+        .where(Document.__table__.c.id == bindparam("doc_id"))
+        .values(session_id=bindparam("sid"), ext=bindparam("doc_ext"))
+    )
+
+    total = 0
+    with engine.begin() as conn:
+        while True:
+            rows = conn.execute(
+                select(Document.id, Document.path)
+                .where(Document.session_id.is_(None))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            conn.execute(stmt, [
+                {
+                    "doc_id": doc_id,
+                    "sid": session_of(path, DATA_DIR),
+                    "doc_ext": path.split(".")[-1].lower(),
+                }
+                for doc_id, path in rows
+            ])
+            total += len(rows)
+
+    if total:
+        print(f"[DB] Backfilled session_id/ext for {total} documents")
+
+
+def backfill_previews():
+    # 예전 버전에서 content에 저장된 전체 본문으로 미리보기 채움
+    Document = models.Document
+    with engine.begin() as conn:
+        result = conn.execute(
+            update(Document.__table__)
+            .where(Document.__table__.c.preview.is_(None))
+            .values(preview=func.substr(Document.__table__.c.content, 1, models.PREVIEW_CHARS))
+        )
+    if result.rowcount:
+        print(f"[DB] Backfilled preview for {result.rowcount} documents")
+
+
+if __name__ == "__main__":
+    upgrade()
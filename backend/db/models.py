@@ -1,8 +1,12 @@
 # db/models.py
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Text, DateTime, ForeignKey, Index
+from sqlalchemy.orm import deferred
 from .db import Base
 
+# 문서 목록에 보여줄 미리보기 길이
+PREVIEW_CHARS = 200
+
 
 class Document(Base):
     __tablename__ = "documents"
@@ -10,10 +14,34 @@ class Document(Base):
     id = Column(Integer, primary_key=True, index=True)
     path = Column(String(1024), unique=True, index=True, nullable=False)
     title = Column(String(512), nullable=False)
-    content = Column(Text, nullable=False)
+    # 예전 버전의 전체 본문 (지금은 빈 문자열, 본문은 Chunk에 저장). 목록 조회 시 로드하지 않음
+    content = deferred(Column(Text, nullable=False))
+    preview = Column(String(PREVIEW_CHARS), nullable=True)
+    # 세션별 목록/삭제를 인덱스로 처리 (경로 LIKE 검색 대신)
+    session_id = Column(String(255), index=True, nullable=True)
+    ext = Column(String(16), index=True, nullable=True)
+    # 증분 인덱싱용 파일 지문 (size/mtime이 같으면 해시 계산도 생략)
+    size = Column(BigInteger, nullable=True)
+    mtime = Column(Float, nullable=True)
+    content_hash = Column(String(64), index=True, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class Chunk(Base):
+    __tablename__ = "chunks"
+    __table_args__ = (Index("ix_chunks_document_page", "document_id", "page"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    # Chroma id({document_id}_{page})와 같은 page 번호
+    page = Column(Integer, nullable=False)
+    # 문서 전체 텍스트(청크를 빈 줄로 이은 것)에서의 시작 위치
+    offset = Column(Integer, nullable=False, default=0)
+    text = deferred(Column(Text, nullable=False))
+    # Chroma 메타데이터의 hash와 같은 값 (청크 내용 변경 판단용)
+    hash = Column(String(16), nullable=False)
+
+
 class SearchLog(Base):
     __tablename__ = "search_logs"
 
@@ -0,0 +1,247 @@
+# embedding_cache.py
+# 디스크 임베딩 캐시: (모델명, 청크 텍스트 해시) → 벡터
+# - 벡터: 모델별 float32 memmap 파일 (slot 번호 = 행 번호)
+# - 인덱스: sqlite3 (model, hash → slot, 마지막 사용 시각)
+# 텍스트와 모델이 같으면 reindex나 다른 세션에 올린 같은 파일도 모델을 다시 돌리지 않는다.
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+# 모델별 최대 벡터 수 (넘으면 오래 안 쓴 것부터 삭제, 0이면 캐시 사용 안 함)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# memmap 파일은 이 행 수부터 시작해서 두 배씩 늘림
+_INITIAL_CAPACITY = 1024
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, directory: str = EMBEDDING_CACHE_DIR, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.enabled = max_entries > 0
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # model → (memmap, dim)
+        self._maps: Dict[str, tuple] = {}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(
+                os.path.join(self.directory, "index.sqlite"),
+                isolation_level=None,  # 트랜잭션은 직접 BEGIN/COMMIT
+                check_same_thread=False,
+                timeout=30,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS models (
+                    model TEXT PRIMARY KEY,
+                    file TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    capacity INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    model TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    slot INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, hash)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_lru ON entries (model, last_used)")
+            self._conn = conn
+        return self._conn
+
+    def _vectors(self, model: str, min_rows: int = 0) -> Optional[np.memmap]:
+        """모델의 memmap (다른 프로세스가 파일을 키웠으면 다시 엶)"""
+        row = self._db().execute(
+            "SELECT file, dim, capacity FROM models WHERE model = ?", (model,)
+        ).fetchone()
+        if row is None:
+            return None
+        file, dim, capacity = row
+        cached = self._maps.get(model)
+        if cached is None or cached[0].shape[0] < max(min_rows, capacity):
+            path = os.path.join(self.directory, file)
+            cached = (np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, dim)), dim)
+            self._maps[model] = cached
+        return cached[0]
+
+    def _ensure_capacity(self, model: str, dim: int, rows: int) -> np.memmap:
+        db = self._db()
+        row = db.execute("SELECT file, dim, capacity FROM models WHERE model = ?", (model,)).fetchone()
+        if row is None:
+            file = f"{hashlib.sha1(model.encode('utf-8')).hexdigest()[:16]}.f32"
+            capacity = 0
+            db.execute(
+                "INSERT INTO models (model, file, dim, capacity) VALUES (?, ?, ?, 0)",
+                (model, file, dim),
+            )
+        else:
+            file, _, capacity = row
+
+        if rows > capacity:
+            new_capacity = max(_INITIAL_CAPACITY, capacity)
+            while new_capacity < rows:
+                new_capacity *= 2
+            new_capacity = max(min(new_capacity, self.max_entries), rows)
+            # 파일 크기만 늘림 (기존 slot 내용은 그대로)
+            with open(os.path.join(self.directory, file), "ab") as f:
+                f.truncate(new_capacity * dim * 4)
+            db.execute("UPDATE models SET capacity = ? WHERE model = ?", (new_capacity, model))
+            self._maps.pop(model, None)
+
+        return self._vectors(model, rows)
+
+    def _lookup(self, model: str, hashes: List[str]) -> Dict[str, int]:
+        slots: Dict[str, int] = {}
+        unique = list(dict.fromkeys(hashes))
+        for i in range(0, len(unique), 500):
+            batch = unique[i:i + 500]
+            placeholders = ", ".join("?" * len(batch))
+            rows = self._db().execute(
+                f"SELECT hash, slot FROM entries WHERE model = ? AND hash IN ({placeholders})",
+                (model, *batch),
+            ).fetchall()
+            slots.update(rows)
+        return slots
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """캐시에 있는 것만 {hash: vector}"""
+        if not self.enabled or not hashes:
+            return {}
+        with self._lock:
+            db = self._db()
+            # slot 조회 ~ 벡터 읽기를 put_many와 같은 쓰기 lock 안에서
+            # (다른 프로세스가 그 사이에 slot을 회수해서 다른 텍스트의 벡터로 덮어쓰지 못하도록)
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                slots = self._lookup(model, hashes)
+
+                found: Dict[str, np.ndarray] = {}
+                if slots:
+                    vectors = self._vectors(model, max(slots.values()) + 1)
+                    for h, slot in slots.items():
+                        found[h] = np.array(vectors[slot])
+                    now = time.time()
+                    db.executemany(
+                        "UPDATE entries SET last_used = ? WHERE model = ? AND hash = ?",
+                        [(now, model, h) for h in slots],
+                    )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+            return found
+
+    def put_many(self, model: str, hashes: List[str], vectors: np.ndarray):
+        if not self.enabled or not hashes:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        items = dict(zip(hashes, vectors))
+        # 한 번에 캐시 전체보다 많이 넣으면 뒤쪽만 유지
+        keys = list(items)[-self.max_entries:]
+
+        with self._lock:
+            db = self._db()
+            # slot 배정 ~ 벡터 기록 ~ 인덱스 반영을 한 트랜잭션으로 (다른 프로세스와 slot이 겹치지 않게)
+            row = db.execute("SELECT dim FROM models WHERE model = ?", (model,)).fetchone()
+            if row is not None and row[0] != vectors.shape[1]:
+                print(f"[EMB-CACHE] Dimension mismatch for {model} ({row[0]} != {vectors.shape[1]}), not caching")
+                return
+
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._lookup(model, keys)
+                new_keys = [h for h in keys if h not in existing]
+                total, max_slot = db.execute(
+                    "SELECT COUNT(*), MAX(slot) FROM entries WHERE model = ?", (model,)
+                ).fetchone()
+                next_slot = 0 if max_slot is None else max_slot + 1
+
+                # 꽉 찼으면 오래 안 쓴 항목부터 slot 회수
+                overflow = total + len(new_keys) - self.max_entries
+                freed: List[int] = []
+                if overflow > 0:
+                    keep = set(keys)
+                    victims = [
+                        (h, slot) for h, slot in db.execute(
+                            "SELECT hash, slot FROM entries WHERE model = ? ORDER BY last_used LIMIT ?",
+                            (model, overflow + len(keys)),
+                        ) if h not in keep
+                    ][:overflow]
+                    db.executemany(
+                        "DELETE FROM entries WHERE model = ? AND hash = ?",
+                        [(model, h) for h, _ in victims],
+                    )
+                    freed = [slot for _, slot in victims]
+
+                slots = {h: existing[h] for h in keys if h in existing}
+                for h in new_keys:
+                    if freed:
+                        slots[h] = freed.pop()
+                    else:
+                        slots[h] = next_slot
+                        next_slot += 1
+
+                dim = vectors.shape[1]
+                mm = self._ensure_capacity(model, dim, max(slots.values()) + 1)
+                for h, slot in slots.items():
+                    mm[slot] = items[h]
+                mm.flush()
+
+                now = time.time()
+                db.executemany(
+                    "INSERT OR REPLACE INTO entries (model, hash, slot, last_used) VALUES (?, ?, ?, ?)",
+                    [(model, h, slot, now) for h, slot in slots.items()],
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def sample(self, model: str, n: int, seed: int = 0) -> np.ndarray:
+        """모델의 캐시된 벡터 중 최대 n개를 무작위로 (압축 투영 학습용)"""
+        if not self.enabled or n <= 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        with self._lock:
+            slots = [row[0] for row in self._db().execute(
+                "SELECT slot FROM entries WHERE model = ?", (model,)
+            )]
+            if not slots:
+                return np.zeros((0, 0), dtype=np.float32)
+            rng = np.random.default_rng(seed)
+            if len(slots) > n:
+                slots = rng.choice(slots, size=n, replace=False).tolist()
+            vectors = self._vectors(model, max(slots) + 1)
+            return np.array(vectors[sorted(slots)], dtype=np.float32)
+
+    def count(self, model: Optional[str] = None) -> int:
+        with self._lock:
+            if model is None:
+                return self._db().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return self._db().execute(
+                "SELECT COUNT(*) FROM entries WHERE model = ?", (model,)
+            ).fetchone()[0]
@@ -1,78 +1,165 @@
 # indexer.py
 import os
 import glob
-from typing import List
+import time
+import hashlib
+import threading
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, delete, update, insert, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from db.db import SessionLocal
-from db.models import Document
-from loader import load_text
+from db.models import Document, Chunk, PREVIEW_CHARS
+from db.migrate import upgrade
+from db import fulltext
+from parser_pool import parse_files
+from loader import SUPPORTED_EXT
+from jobs import Job
 from chroma_engine import ChromaEngine
+from paths import DATA_DIR, file_hash, session_of
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: 파일 lock 없이 프로세스 안에서만
+    fcntl = None
 
 load_dotenv()
 chroma = ChromaEngine()
-DATA_DIR = os.getenv("DATA_DIR", "./data")
+# 한 번에 임베딩 + 커밋할 청크 수 (reindex 중 메모리 상한)
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "256"))
+
+# 인덱싱 작업은 한 번에 하나만 (업로드 파일 인덱싱이 전체 재구축의 shadow 교체와 겹치지 않도록)
+# 프로세스 안은 index_lock, API 워커 프로세스끼리는 active_collection 옆의 index.lock 파일 lock
+index_lock = threading.Lock()
+INDEX_LOCK_PATH = os.path.join(chroma.persist_dir, "index.lock")
+_index_lock_file = None
 
 
 def scan_files() -> List[str]:
-    patterns = ["*.txt", "*.pdf", "*.md", "*.docx", "*.pptx"]
-    files: List[str] = []
-    for p in patterns:
-        files.extend(glob.glob(os.path.join(DATA_DIR, "**", p), recursive=True))
-    return sorted(set(files))
+    # 확장자는 대소문자 구분 없이 (/upload도 소문자로 바꿔서 확인하므로 Report.PDF도 인덱싱 대상)
+    files = glob.glob(os.path.join(DATA_DIR, "**", "*.*"), recursive=True)
+    return sorted(
+        p for p in set(files)
+        if os.path.isfile(p) and os.path.splitext(p)[1][1:].lower() in SUPPORTED_EXT
+    )
+
 
+def file_fingerprint(path: str) -> Dict:
+    """파일 지문: size, mtime, sha256"""
+    st = os.stat(path)
+    return {
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "content_hash": file_hash(path),
+    }
 
-def upsert_documents(db: Session, file_paths: List[str]) -> List[int]:
+
+def iter_batches(
+    parsed: Iterable[Tuple[str, Optional[list]]],
+    batch_size: int,
+) -> Iterator[List[Tuple[str, list]]]:
     """
-    1) PostgreSQL documents 테이블 upsert
-    2) 같은 시점에 Chroma에도 저장
+    (path, chunks) 스트림 → 청크 수가 batch_size를 넘을 때마다 파일 묶음 하나를 넘김
+    파일 하나의 청크는 한 묶음 안에 같이 들어감 (파일 단위로 커밋되도록)
     """
-    doc_ids: List[int] = []
-
-    chroma_ids = []
-    chroma_docs = []
-    chroma_metas = []
+    batch: List[Tuple[str, list]] = []
+    n_chunks = 0
 
-    for path in file_paths:
-        chunks = load_text(path)
-        if not chunks:
+    for path, chunks in parsed:
+        if chunks is None:
+            # 파싱 실패/timeout: 지문을 기록하지 않아 다음 reindex 때 다시 시도
             continue
 
-        title = os.path.basename(path).rsplit(".", 1)[0]
-        full_content = "\n\n".join([c['content'] for c in chunks])
+        batch.append((path, chunks))
+        n_chunks += len(chunks)
+        if n_chunks >= batch_size:
+            yield batch
+            batch, n_chunks = [], 0
 
-        # PostgreSQL upsert
-        stmt = select(Document).where(Document.path == path)
-        existing = db.execute(stmt).scalar_one_or_none()
+    if batch:
+        yield batch
 
-        if existing:
-            existing.title = title
-            existing.content = full_content
-            db.flush()
-            doc_id = existing.id
-        else:
-            doc = Document(path=path, title=title, content=full_content)
-            db.add(doc)
-            db.flush()
-            doc_id = doc.id
 
-        doc_ids.append(doc_id)
+def bulk_upsert_documents(db: Session, rows: List[Dict]) -> Dict[str, int]:
+    """
+    Document 행들을 path 기준으로 한 번에 insert/update
+    (INSERT ... ON CONFLICT (path) DO UPDATE ... RETURNING id, path)
+    → {path: id}
+    """
+    if not rows:
+        return {}
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = pg_insert(Document).values(rows)
+    else:
+        stmt = sqlite_insert(Document).values(rows)  # SQLite 3.35+ (RETURNING)
+
+    # created_at은 처음 insert 때의 값 유지
+    columns = [k for k in rows[0] if k != "path"]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Document.path],
+        set_={k: stmt.excluded[k] for k in columns},
+    ).returning(Document.id, Document.path)
+    return {path: doc_id for doc_id, path in db.execute(stmt)}
 
-        # metadata
-        ext = path.split(".")[-1].lower()
-        
-        # Extract session_id from path (assuming data/{session_id}/{filename})
-        rel_path = os.path.relpath(path, DATA_DIR)
-        parts = rel_path.split(os.sep)
-        if len(parts) > 1:
-            session_id = parts[0]
-        else:
-            session_id = "default"
 
+def commit_batch(
+    db: Session,
+    batch: List[Tuple[str, list]],
+    fingerprints: Dict[str, Dict],
+    generation: Optional[str] = None,
+) -> List[int]:
+    """
+    파일 묶음 하나를 Chroma(generation, 기본은 활성 세대) + SQL에 반영
+    Chroma를 먼저 쓰고 SQL(지문 포함)을 나중에 커밋하므로,
+    중간에 실패해도 지문이 갱신되지 않은 파일은 다음 reindex 때 다시 처리됨
+    """
+    # 텍스트가 없는 파일도 지문은 기록해 두어야 다음 reindex 때 다시 파싱하지 않음
+    rows = []
+    for path, chunks in batch:
+        fp = fingerprints.get(path) or file_fingerprint(path)
+        rows.append({
+            "path": path,
+            "title": os.path.basename(path).rsplit(".", 1)[0],
+            "content": "",
+            "preview": chunks[0]['content'][:PREVIEW_CHARS] if chunks else "",
+            "session_id": session_of(path),
+            "ext": path.split(".")[-1].lower(),
+            **fp,
+        })
+    with metrics.span("index.sql_documents"):
+        id_by_path = bulk_upsert_documents(db, rows)
+        doc_ids: List[int] = [id_by_path[path] for path, _ in batch]
+
+        # 본문은 청크 단위로 저장 (페이지 수가 바뀌었을 수 있으므로 통째로 교체)
+        db.execute(delete(Chunk).where(Chunk.document_id.in_(doc_ids)))
+
+    chroma_ids = []
+    chroma_docs = []
+    chroma_metas = []
+    chunk_rows = []
+
+    for (path, chunks), row, doc_id in zip(batch, rows, doc_ids):
+        title, ext, session_id = row["title"], row["ext"], row["session_id"]
+        offset = 0
+
+        # metadata
         for chunk in chunks:
+            chunk_hash = hashlib.sha1(chunk['content'].encode("utf-8")).hexdigest()[:16]
+            chunk_rows.append({
+                "document_id": doc_id,
+                "page": chunk['page'],
+                "offset": offset,
+                "text": chunk['content'],
+                "hash": chunk_hash,
+            })
+            # 예전 full_content처럼 청크를 빈 줄로 이었을 때의 위치
+            offset += len(chunk['content']) + 2
+
             # ID format: {doc_id}_{page}
             chroma_ids.append(f"{doc_id}_{chunk['page']}")
             chroma_docs.append(chunk['content'])
@@ -81,43 +168,389 @@ def upsert_documents(db: Session, file_paths: List[str]) -> List[int]:
                 "ext": ext,
                 "path": path,
                 "session_id": session_id,
-                "page": chunk['page']
+                "page": chunk['page'],
+                # 청크 내용이 바뀌었는지 판단용 (galaxy 좌표 캐시 등)
+                "hash": chunk_hash,
             })
 
-    db.commit()
+    if chunk_rows:
+        with metrics.span("index.sql_chunks"):
+            db.execute(insert(Chunk), chunk_rows)
 
-    # 🔥 Chroma 업로드 (한 번만)
-    chroma.collection.add(
-        ids=chroma_ids,
-        documents=chroma_docs,
-        metadatas=chroma_metas
+    # 페이지 수가 줄었을 수 있으므로 기존 청크를 먼저 지움
+    chroma.delete_paths(
+        [path for path, _ in batch],
+        generation=generation,
+        session_ids=[row["session_id"] for row in rows],
     )
 
+    # 임베딩은 검색 때와 같은 모델로 ChromaEngine이 직접 계산 (Chroma 기본 모델 사용 X)
+    if chroma_ids:
+        chroma.upsert_documents(chroma_ids, chroma_docs, chroma_metas, generation=generation)
+
+    # 전문 검색 인덱스도 같은 트랜잭션에서 교체
+    with metrics.span("index.fulltext"):
+        fulltext.delete_paths(db, [path for path, _ in batch])
+        fulltext.add_chunks(db, [
+            {"chunk_id": cid, "session_id": meta["session_id"], "path": meta["path"], "content": doc}
+            for cid, doc, meta in zip(chroma_ids, chroma_docs, chroma_metas)
+        ])
+
+    with metrics.span("index.sql_commit"):
+        db.commit()
     return doc_ids
 
 
-def rebuild_index():
-    print("[INDEX] Scanning files...")
-    file_paths = scan_files()
-    print(f"[INDEX] Found {len(file_paths)} files.")
+def backfill_fulltext(db: Session, page_size: int = 1000):
+    """
+    전문 검색 인덱스가 비어 있으면 Chroma에 저장된 청크 텍스트로 채움
+    (전문 검색 도입 이전에 인덱싱된 데이터용, 재임베딩 없음)
+    """
+    total = chroma.count()
+    if total == 0 or fulltext.count(db) > 0:
+        return
+
+    print(f"[INDEX] Backfilling full-text index from {total} Chroma chunks...")
+    for rows in chroma.iter_pages(["documents", "metadatas"], page_size):
+        fulltext.add_chunks(db, [
+            {
+                "chunk_id": cid,
+                "session_id": meta.get("session_id", "default"),
+                "path": meta.get("path", ""),
+                "content": doc or "",
+            }
+            for cid, doc, meta in zip(rows["ids"], rows["documents"], rows["metadatas"])
+        ])
+    db.commit()
+
+
+def backfill_chunks(db: Session, page_size: int = 1000):
+    """
+    chunks 테이블이 비어 있으면 Chroma에 저장된 청크 텍스트로 채움
+    (Chunk 모델 도입 이전에 인덱싱된 데이터용, 재임베딩 없음)
+    """
+    total = chroma.count()
+    if total == 0 or db.execute(select(Chunk.id).limit(1)).first() is not None:
+        return
+
+    known = set(db.execute(select(Document.id)).scalars().all())
+    lengths: Dict[int, Dict[int, int]] = {}
+
+    print(f"[INDEX] Backfilling chunk table from {total} Chroma chunks...")
+    for rows in chroma.iter_pages(["documents", "metadatas"], page_size):
+        chunk_rows = []
+        for cid, doc, meta in zip(rows["ids"], rows["documents"], rows["metadatas"]):
+            doc_id = int(cid.split("_", 1)[0])
+            if doc_id not in known:
+                continue
+            doc = doc or ""
+            page = int(meta.get("page", 1))
+            lengths.setdefault(doc_id, {})[page] = len(doc)
+            chunk_rows.append({
+                "document_id": doc_id,
+                "page": page,
+                "offset": 0,
+                "text": doc,
+                "hash": meta.get("hash") or hashlib.sha1(doc.encode("utf-8")).hexdigest()[:16],
+            })
+        if chunk_rows:
+            db.execute(insert(Chunk), chunk_rows)
+
+    # 페이지 순서가 모두 모인 뒤에 문서 내 위치 계산
+    offsets = []
+    for doc_id, pages in lengths.items():
+        offset = 0
+        for page in sorted(pages):
+            offsets.append({"doc_id": doc_id, "page_no": page, "offset": offset})
+            offset += pages[page] + 2
+    if offsets:
+        db.execute(
+            update(Chunk.__table__)
+            .where(Chunk.__table__.c.document_id == bindparam("doc_id"))
+            .where(Chunk.__table__.c.page == bindparam("page_no"))
+            .values(offset=bindparam("offset")),
+            offsets,
+        )
+    db.commit()
+
+
+def upsert_documents(
+    db: Session,
+    file_paths: List[str],
+    fingerprints: Optional[Dict[str, Dict]] = None,
+    batch_size: Optional[int] = None,
+    job: Optional[Job] = None,
+    generation: Optional[str] = None,
+) -> List[int]:
+    """
+    files → chunks → 임베딩 배치 → 배치 단위 Chroma/SQL 커밋
+    전체 코퍼스를 메모리에 모으지 않으므로 메모리 사용량이 코퍼스 크기와 무관하고,
+    실패한 배치만 다음 reindex 때 다시 처리됨
+    job이 주어지면 진행률을 기록하고 배치 사이에서 취소를 확인
+    """
+    fingerprints = fingerprints or {}
+    batch_size = batch_size or INDEX_BATCH_SIZE
+    job = job or Job(kind="reindex", scope="local")
+    doc_ids: List[int] = []
+    done_files = 0
+
+    job.set_stage("commit", total=len(file_paths))
+    job.set_stage("embed")
+    job.set_stage("parse", total=len(file_paths))
 
-    if not file_paths:
-        print("[INDEX] No files found. Abort.")
+    def parsed():
+        files = parse_files(file_paths)
+        while True:
+            # 파싱 풀에서 다음 파일이 나올 때까지 기다린 시간
+            with metrics.span("index.parse_wait"):
+                item = next(files, None)
+            if item is None:
+                return
+            job.advance("parse")
+            yield item
+
+    # 파싱은 프로세스 풀에서 병렬로, 끝나는 순서대로 배치 단계로 넘어옴
+    batches = iter_batches(parsed(), batch_size)
+    try:
+        for batch in batches:
+            # 취소되면 여기서 멈춤 (이미 커밋한 배치는 유지, 나머지는 다음 reindex 때 처리)
+            job.set_stage("embed")
+            n_chunks = sum(len(chunks) for _, chunks in batch)
+            try:
+                doc_ids.extend(commit_batch(db, batch, fingerprints, generation))
+            except Exception as e:
+                db.rollback()
+                metrics.event("index_batch_failed")
+                print(f"[INDEX] Batch failed ({len(batch)} files), will retry on next reindex: {e}")
+                continue
+
+            done_files += len(batch)
+            metrics.event("indexed_files", len(batch))
+            metrics.event("indexed_chunks", n_chunks)
+            job.advance("embed", n_chunks)
+            job.advance("commit", len(batch))
+            print(f"[INDEX] Committed {len(batch)} files / {n_chunks} chunks "
+                  f"({done_files}/{len(file_paths)} files)")
+    finally:
+        # 취소/에러 시 파싱 프로세스 풀도 정리
+        batches.close()
+
+    return doc_ids
+
+
+def diff_files(
+    db: Session,
+    file_paths: List[str],
+    hashes: Optional[Dict[str, str]] = None,
+    only_given: bool = False,
+):
+    """
+    DB에 저장된 지문과 현재 파일을 비교
+    → (변경/추가된 파일 목록, 지문 dict, 삭제된 파일 경로 목록)
+    hashes: 이미 계산한 sha256 (업로드 중 계산한 값 등, 파일을 다시 읽지 않음)
+    only_given=True면 file_paths만 비교 (삭제된 파일 목록은 항상 비어 있음)
+    """
+    stmt = select(Document.id, Document.path, Document.size, Document.mtime, Document.content_hash)
+    if only_given:
+        stmt = stmt.where(Document.path.in_(file_paths))
+    rows = db.execute(stmt).all()
+    known = {row.path: row for row in rows}
+
+    changed: List[str] = []
+    fingerprints: Dict[str, Dict] = {}
+
+    for path in file_paths:
+        st = os.stat(path)
+        row = known.get(path)
+
+        # size/mtime이 그대로면 내용도 그대로라고 보고 해시 계산 생략
+        if row and row.size == st.st_size and row.mtime == st.st_mtime:
+            continue
+
+        content_hash = (hashes or {}).get(path) or file_hash(path)
+        fp = {"size": st.st_size, "mtime": st.st_mtime, "content_hash": content_hash}
+        if row and row.content_hash == fp["content_hash"]:
+            # 내용은 같고 mtime만 바뀐 경우 (복사, touch 등) → 지문만 갱신
+            db.execute(
+                update(Document)
+                .where(Document.id == row.id)
+                .values(size=fp["size"], mtime=fp["mtime"])
+            )
+            continue
+
+        changed.append(path)
+        fingerprints[path] = fp
+
+    current = set(file_paths)
+    removed = [path for path in known if path not in current]
+    return changed, fingerprints, removed
+
+
+def acquire_index_lock(job: Job):
+    # 다른 인덱싱 작업이 끝나길 기다리는 동안에도 취소 요청에 응답
+    global _index_lock_file
+    job.set_stage("wait")
+    while not index_lock.acquire(timeout=0.5):
+        job.check_cancelled()
+    if fcntl is None:
         return
 
+    f = None
+    try:
+        os.makedirs(chroma.persist_dir, exist_ok=True)
+        f = open(INDEX_LOCK_PATH, "a")
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                job.check_cancelled()
+                time.sleep(0.5)
+    except BaseException:
+        if f is not None:
+            f.close()
+        index_lock.release()
+        raise
+    _index_lock_file = f
+
+
+def release_index_lock():
+    global _index_lock_file
+    if _index_lock_file is not None:
+        _index_lock_file.close()  # 닫으면 파일 lock도 풀림
+        _index_lock_file = None
+    index_lock.release()
+
+
+def index_files(
+    file_paths: List[str],
+    hashes: Optional[Dict[str, str]] = None,
+    job: Optional[Job] = None,
+) -> Dict:
+    """
+    지정한 파일만 인덱싱 (업로드 직후용, 전체 스캔 없음)
+    지문이 그대로인 파일은 건너뜀
+    → {"files", "changed"}
+    """
+    job = job or Job(kind="index_files", scope="local")
+    acquire_index_lock(job)
+    try:
+        return _index_files(file_paths, hashes, job)
+    finally:
+        release_index_lock()
+
+
+def _index_files(file_paths: List[str], hashes: Optional[Dict[str, str]], job: Job) -> Dict:
     db: Session = SessionLocal()
+    try:
+        job.set_stage("diff", total=len(file_paths))
+        existing = [path for path in file_paths if os.path.exists(path)]
+        changed, fingerprints, _ = diff_files(db, existing, hashes, only_given=True)
+        db.commit()
+        job.advance("diff", len(file_paths))
+
+        # 업그레이드 후 첫 인덱싱이 업로드여도 기존 문서의 전문 검색/청크 행을 채움
+        # (두 backfill 모두 테이블이 비어 있을 때만 동작하므로 새 파일을 넣기 전에)
+        backfill_fulltext(db)
+        backfill_chunks(db)
+
+        print(f"[INDEX] Indexing {len(changed)} of {len(file_paths)} uploaded files...")
+        if changed:
+            upsert_documents(db, changed, fingerprints, job=job)
+        return {"files": len(file_paths), "changed": len(changed)}
+    finally:
+        db.close()
 
+
+def rebuild_index(full: bool = False, job: Optional[Job] = None) -> Dict:
+    """
+    full=False: 지문이 바뀐 파일만 다시 파싱/임베딩하고, 사라진 파일의 청크는 삭제
+    full=True : 새 shadow 세대에 전체를 다시 만든 뒤 활성 세대와 교체
+                (재구축 중에도 검색은 기존 컬렉션으로 정상 동작)
+    → {"files", "changed", "removed"}
+    """
+    job = job or Job(kind="reindex", scope="local")
+    acquire_index_lock(job)
     try:
-        print("[INDEX] Clearing Chroma collection...")
-        chroma.clear_all()
+        return _rebuild_index(full, job)
+    finally:
+        release_index_lock()
+
+
+def _rebuild_index(full: bool, job: Job) -> Dict:
+    job.set_stage("scan")
+    print("[INDEX] Scanning files...")
+    with metrics.span("index.scan"):
+        file_paths = scan_files()
+    print(f"[INDEX] Found {len(file_paths)} files.")
+    job.advance("scan", len(file_paths))
+
+    upgrade()
+    db: Session = SessionLocal()
+
+    shadow = None
+    try:
+        if full:
+            job.set_stage("shadow")
+            # 지문을 먼저 지워둬야 중간에 실패해도 다음 증분 reindex가 나머지를 이어서 처리함
+            db.execute(update(Document).values(size=None, mtime=None, content_hash=None))
+            db.commit()
+
+            shadow = chroma.create_shadow()
+            changed, fingerprints = file_paths, {}
+            stale = set(db.execute(select(Document.path)).scalars().all()) - set(file_paths)
+            removed = sorted(stale)
+        else:
+            job.set_stage("diff", total=len(file_paths))
+            with metrics.span("index.diff"):
+                changed, fingerprints, removed = diff_files(db, file_paths)
+            db.commit()
+            job.advance("diff", len(file_paths))
+
+        print(f"[INDEX] {len(changed)} changed, {len(removed)} removed, "
+              f"{len(file_paths) - len(changed)} unchanged.")
+
+        if removed:
+            job.set_stage("remove", total=len(removed))
+            print("[INDEX] Removing deleted files...")
+            chroma.delete_paths(removed)
+            fulltext.delete_paths(db, removed)
+            removed_ids = select(Document.id).where(Document.path.in_(removed))
+            db.execute(delete(Chunk).where(Chunk.document_id.in_(removed_ids)))
+            db.execute(delete(Document).where(Document.path.in_(removed)))
+            db.commit()
+            job.advance("remove", len(removed))
+
+        if not full:
+            backfill_fulltext(db)
+            backfill_chunks(db)
+
+        if changed:
+            print("[INDEX] Upserting documents into PostgreSQL + Chroma...")
+            upsert_documents(db, changed, fingerprints, job=job, generation=shadow)
 
-        print("[INDEX] Upserting documents into PostgreSQL + Chroma...")
-        upsert_documents(db, file_paths)
+        if shadow is not None:
+            job.set_stage("swap")
+            with metrics.span("index.swap"):
+                chroma.swap(shadow)
+            shadow = None
 
-        print("[INDEX] Done.")
+        print(f"[INDEX] Done. (embedding throughput: {chroma.throughput():.1f} chunks/s)")
+        return {"files": len(file_paths), "changed": len(changed), "removed": len(removed)}
+    except BaseException:
+        if shadow is not None:
+            # 교체 전에 실패/취소 → 기존 컬렉션은 그대로 두고 shadow만 삭제
+            # 이번에 커밋된 파일의 벡터는 shadow에만 있었으므로 지문을 지워 다음 reindex 때 다시 처리
+            print("[INDEX] Rebuild aborted, dropping shadow collection")
+            db.rollback()
+            chroma.drop_shadow(shadow)
+            db.execute(update(Document).values(size=None, mtime=None, content_hash=None))
+            db.commit()
+        raise
     finally:
         db.close()
 
 
 if __name__ == "__main__":
-    rebuild_index()
+    import sys
+    rebuild_index(full="--full" in sys.argv)
@@ -0,0 +1,104 @@
+# inference.py
+# 모델 추론 전용 executor + 마이크로 배칭
+# 동시에 들어온 검색 요청들의 임베딩/리랭킹을 몇 ms 동안 모아서 한 번의 encode/predict로 처리
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "1"))
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "5"))
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "64"))
+
+# 모델 추론은 이 executor에서만 실행 (FastAPI 기본 threadpool과 분리)
+inference_executor = ThreadPoolExecutor(
+    max_workers=INFERENCE_THREADS, thread_name_prefix="inference"
+)
+
+
+class MicroBatcher:
+    """
+    window_ms 안에 들어온 요청들의 입력을 이어붙여 fn을 한 번만 호출하고,
+    결과를 요청별로 다시 잘라서 돌려준다.
+
+    fn: list → 입력과 같은 길이의 list/ndarray (i번째 결과가 i번째 입력에 대응)
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], Sequence[Any]],
+        executor: ThreadPoolExecutor = inference_executor,
+        window_ms: float = INFERENCE_BATCH_WINDOW_MS,
+        max_batch: int = INFERENCE_MAX_BATCH,
+    ):
+        self.fn = fn
+        self.executor = executor
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+
+        self._pending: List[tuple] = []  # (items, future)
+        self._pending_items = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def submit(self, items: List[Any]) -> Sequence[Any]:
+        if not items:
+            return []
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 이벤트 루프가 바뀌면(테스트 클라이언트, 재시작 등) 이전 루프의 대기열은 버림
+            self._loop = loop
+            self._pending, self._pending_items, self._timer = [], 0, None
+
+        future = loop.create_future()
+        self._pending.append((items, future))
+        self._pending_items += len(items)
+
+        if self._pending_items >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        self._pending_items = 0
+        if not batch:
+            return
+
+        all_items = [item for items, _ in batch for item in items]
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(self.executor, self.fn, all_items)
+        task.add_done_callback(lambda t: self._fan_out(t, batch))
+
+    @staticmethod
+    def _fan_out(task: asyncio.Future, batch: List[tuple]):
+        if task.cancelled():
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+            return
+
+        error = task.exception()
+        if error is not None:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        results = task.result()
+        offset = 0
+        for items, future in batch:
+            if not future.done():
+                future.set_result(results[offset:offset + len(items)])
+            offset += len(items)
@@ -0,0 +1,180 @@
+# jobs.py
+# 백그라운드 작업 (reindex 등)
+# - 요청은 job id만 받고 바로 응답, 클라이언트는 /jobs/{id}를 polling
+# - 단계별 진행률(파싱한 파일, 임베딩한 청크, 커밋한 행)과 처리량
+# - 취소: 작업이 단계/배치 사이에서 check_cancelled()로 확인
+# - 같은 scope의 작업은 한 번에 하나만 (이미 대기/실행 중이면 그 작업을 돌려줌)
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 동시에 실행할 작업 수 (scope가 달라도 임베딩 모델/DB를 같이 쓰므로 기본 1)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+# 끝난 작업을 몇 개까지 기록해 둘지
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "100"))
+
+ACTIVE = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    kind: str
+    scope: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "queued"  # queued / running / succeeded / failed / cancelled
+    stage: Optional[str] = None
+    # 단계별 {"done", "total"} (total을 모르면 None)
+    progress: Dict[str, Dict[str, Optional[int]]] = field(default_factory=dict)
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def set_stage(self, stage: str, total: Optional[int] = None):
+        with self._lock:
+            self.stage = stage
+            entry = self.progress.setdefault(stage, {"done": 0, "total": None})
+            if total is not None:
+                entry["total"] = total
+        self.check_cancelled()
+
+    def advance(self, stage: str, n: int = 1):
+        with self._lock:
+            self.progress.setdefault(stage, {"done": 0, "total": None})["done"] += n
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            progress = {
+                stage: dict(
+                    entry,
+                    # 단계별 처리량 (작업 시작부터의 평균, 개/초)
+                    rate=round(entry["done"] / elapsed, 1) if elapsed > 0 else 0.0,
+                )
+                for stage, entry in self.progress.items()
+            }
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "scope": self.scope,
+                "params": self.params,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": progress,
+                "cancel_requested": self.cancel_requested,
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed": round(elapsed, 2),
+            }
+
+
+class JobManager:
+    def __init__(self, workers: int = JOB_WORKERS, history: int = JOB_HISTORY):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[str, Job] = {}  # scope → 대기/실행 중인 작업
+        self._history = history
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        kind: str,
+        scope: str,
+        fn: Callable[[Job], Any],
+        single_flight: bool = True,
+        **params,
+    ) -> tuple:
+        """
+        fn(job)을 백그라운드에서 실행 → (job, created)
+        같은 scope에 대기/실행 중인 작업이 있으면 새로 만들지 않고 그 작업을 돌려줌 (created=False)
+        single_flight=False면 항상 새 작업 (작업마다 대상이 다른 경우, 예: 업로드한 파일 인덱싱)
+        """
+        with self._lock:
+            active = self._active.get(scope)
+            if single_flight and active is not None and active.status in ACTIVE:
+                return active, False
+
+            job = Job(kind=kind, scope=scope, params=params)
+            self._jobs[job.id] = job
+            if single_flight:
+                self._active[scope] = job
+            self._trim()
+
+        self._executor.submit(self._run, job, fn)
+        return job, True
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]):
+        job.started_at = time.time()
+        try:
+            if job.cancel_requested:
+                raise JobCancelled()
+            job.status = "running"
+            print(f"[JOB] {job.kind} {job.id} started (scope={job.scope})")
+            job.result = fn(job)
+            job.status = "succeeded"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"[JOB] {job.kind} {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._active.get(job.scope) is job:
+                    del self._active[job.scope]
+            print(f"[JOB] {job.kind} {job.id} {job.status} "
+                  f"in {job.finished_at - job.started_at:.1f}s")
+
+    def _trim(self):
+        # 오래된 끝난 작업부터 삭제 (대기/실행 중인 작업은 유지)
+        finished = [jid for jid, j in self._jobs.items() if j.status not in ACTIVE]
+        for jid in finished[:max(0, len(self._jobs) - self._history)]:
+            del self._jobs[jid]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is not None and job.status in ACTIVE:
+            job.cancel()
+        return job
+
+
+job_manager = JobManager()
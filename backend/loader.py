@@ -6,11 +6,14 @@ import pdfplumber
 from docx import Document as DocxDocument
 from pptx import Presentation
 import markdown
-import pytesseract
-from PIL import Image
 
-# Windows 환경에서 Tesseract 경로 설정 (필요시 주석 해제 및 경로 수정)
-# pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+import ocr
+from paths import file_hash
+
+# 업로드/인덱싱 대상 확장자 (/upload와 indexer.scan_files가 같이 사용)
+DOCUMENT_EXT = {"txt", "pdf", "md", "docx", "pptx"}
+IMAGE_EXT = {"jpg", "jpeg", "png", "bmp", "tiff"}
+SUPPORTED_EXT = DOCUMENT_EXT | IMAGE_EXT
 
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list[str]:
     if not text:
@@ -49,11 +52,27 @@ def load_text(path: str) -> list[dict]:
     elif ext == "pdf":
         try:
             with pdfplumber.open(path) as pdf:
+                texts = {}
                 for i, page in enumerate(pdf.pages):
-                    text = page.extract_text() or ""
+                    texts[i + 1] = page.extract_text() or ""
+
+                # 텍스트 레이어가 없는 페이지(스캔본)는 이미지로 렌더링해서 OCR
+                empty = [n for n, text in texts.items() if not text.strip()]
+                if empty and ocr.OCR_PDF_FALLBACK:
+                    # OCR이 실패해도 (tesseract/언어 데이터 없음 등) 텍스트 레이어가 있는 페이지는 유지
+                    try:
+                        texts.update(ocr.ocr_pages(
+                            f"pdf:{file_hash(path)}",
+                            empty,
+                            lambda n: pdf.pages[n - 1].to_image(resolution=ocr.OCR_PDF_RESOLUTION).original,
+                        ))
+                    except Exception as e:
+                        print(f"OCR fallback failed for {path}: {e}")
+
+                for n, text in texts.items():
                     if text.strip():
                         # PDF 페이지도 너무 길면 자를 수 있음 (선택 사항)
-                        results.append({"page": i + 1, "content": text})
+                        results.append({"page": n, "content": text})
         except Exception as e:
             print(f"Error reading PDF {path}: {e}")
 
@@ -84,15 +103,15 @@ def load_text(path: str) -> list[dict]:
         for i, chunk in enumerate(chunks):
             results.append({"page": i + 1, "content": chunk})
 
-    elif ext in ["jpg", "jpeg", "png", "bmp", "tiff"]:
+    elif ext in IMAGE_EXT:
         try:
-            image = Image.open(path)
-            # 한국어+영어 추출
-            text = pytesseract.image_to_string(image, lang='kor+eng')
+            # 한국어+영어 추출 (같은 이미지는 캐시된 결과 사용)
+            text = ocr.ocr_image_file(path, file_hash(path))
             if text.strip():
                 chunks = chunk_text(text)
                 for i, chunk in enumerate(chunks):
-                    results.append({"page": 1, "content": chunk})
+                    # 청크마다 page를 다르게 해야 Chroma id({doc_id}_{page})가 겹치지 않음
+                    results.append({"page": i + 1, "content": chunk})
         except Exception as e:
             print(f"Error reading Image {path}: {e}")
     
@@ -0,0 +1,188 @@
+# metrics.py
+# 단계별 지연 시간 계측
+# - span("search.embed"): 구간 시간을 히스토그램(stage별)에 기록하고,
+#   요청 안에서 실행됐으면 Server-Timing 응답 헤더에도 추가
+# - Counter / Histogram: Prometheus 텍스트 형식으로 /metrics에서 노출
+# METRICS_ENABLED=false면 span은 아무것도 하지 않는 공용 객체를 돌려줌 (시간 측정/lock 없음)
+# 값은 프로세스별 (uvicorn worker가 여러 개면 worker마다 따로 집계됨)
+import os
+import time
+import threading
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# 응답에 Server-Timing 헤더 추가 (브라우저 개발자 도구 Network 탭에서 단계별 시간 확인)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+METRICS_PREFIX = "foundbyme_"
+
+# 초 단위 버킷 (1ms ~ 60s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 현재 요청의 [(단계, 초), ...] (요청 밖에서는 None)
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+_NOOP = nullcontext()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = METRICS_PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = METRICS_PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels → [버킷별 개수..., 합계, 개수]
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, entry):
+                    cumulative += n
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, inf)} {entry[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {entry[-2]:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {entry[-1]}")
+        return lines
+
+
+_registry: List = []
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, help, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, help, labelnames, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    """Prometheus text exposition format (0.0.4)"""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# 공통 지표
+stage_seconds = histogram("stage_seconds", "Time spent in a pipeline stage", ["stage"])
+http_request_seconds = histogram(
+    "http_request_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+events_total = counter("events_total", "Pipeline events (cache hits, skipped reranks, indexed files, ...)", ["event"])
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stage_seconds.observe(elapsed, self.stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((self.stage, elapsed))
+        return False
+
+
+def span(stage: str):
+    """with span("search.rerank"): ... → 구간 시간 기록"""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _Span(stage)
+
+
+def event(name: str, amount: float = 1.0):
+    events_total.inc(name, amount=amount)
+
+
+def begin_request() -> Optional[List[Tuple[str, float]]]:
+    """요청 시작 시 호출 (이 요청에서 실행되는 span을 모으기 시작)"""
+    if not METRICS_ENABLED:
+        return None
+    spans: List[Tuple[str, float]] = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing 헤더 값 (같은 단계가 여러 번이면 합산)"""
+    merged: Dict[str, float] = {}
+    for stage, seconds in spans:
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in merged.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,277 @@
+# model_server.py
+# 로컬 모델 서버: 한 프로세스가 임베딩 모델 + CrossEncoder를 들고 Unix socket으로 embed/rerank 제공
+# - API worker가 여러 개여도 모델은 한 번만 메모리에 올라감
+# - 여러 worker의 요청을 MicroBatcher로 모아서 한 번에 encode/predict
+# - MODEL_SERVER_SOCKET이 설정된 API worker는 ModelClient로 요청하고,
+#   서버에 연결할 수 없으면 (MODEL_SERVER_FALLBACK=true일 때) 프로세스 안에서 모델을 로드해 계산
+#
+# 실행: python model_server.py [--socket /tmp/foundbyme-models.sock]
+# 프로토콜: 요청/응답 모두 [헤더 길이(4B)][본문 길이(4B)][JSON 헤더][float32 본문]
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import asyncio
+import argparse
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# 비워두면 모델 서버를 쓰지 않음 (각 worker가 모델을 직접 로드)
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+# 요청 하나의 최대 대기 시간(초). 인덱싱 배치는 CPU에서 오래 걸릴 수 있으므로 넉넉하게
+# (넘으면 그 요청만 실패, 서버가 느린 것이므로 worker가 모델을 로드하지는 않음)
+MODEL_SERVER_TIMEOUT = float(os.getenv("MODEL_SERVER_TIMEOUT", "120"))
+# 서버에 연결할 수 없을 때 프로세스 안의 모델로 계산할지 여부 (false면 에러)
+MODEL_SERVER_FALLBACK = os.getenv("MODEL_SERVER_FALLBACK", "true").lower() in ("1", "true", "yes")
+# 연결 실패 후 이 시간(초) 동안은 다시 시도하지 않고 바로 fallback
+MODEL_SERVER_RETRY_S = float(os.getenv("MODEL_SERVER_RETRY_S", "10"))
+
+_FRAME = struct.Struct(">II")
+
+
+def _encode_frame(header: Dict[str, Any], payload: bytes = b"") -> bytes:
+    body = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return _FRAME.pack(len(body), len(payload)) + body + payload
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("model server closed the connection")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+class ModelServerError(Exception):
+    pass
+
+
+class ModelMismatch(Exception):
+    pass
+
+
+class ModelClient:
+    """
+    모델 서버 클라이언트 (동기, 여러 스레드에서 호출 가능)
+    embed/rerank는 서버를 쓸 수 없으면 None을 돌려줌 → 호출 쪽에서 프로세스 안의 모델로 계산
+    """
+
+    def __init__(self, path: str = MODEL_SERVER_SOCKET, timeout: float = MODEL_SERVER_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.info: Optional[Dict[str, Any]] = None  # 서버의 모델 이름/차원 (첫 연결 때 확인)
+        self._pool: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def available(self) -> bool:
+        """최근 요청이 성공했는지 (연결을 새로 시도하지 않음)"""
+        return self.enabled and self.info is not None and time.monotonic() >= self._retry_at
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+    def _call(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        with self._lock:
+            sock = self._pool.pop() if self._pool else None
+        if sock is not None:
+            try:
+                return self._exchange(sock, header)
+            except socket.timeout:
+                raise
+            except (OSError, ConnectionError):
+                # 서버 재시작 등으로 끊긴 pooled 연결 → 새 연결로 한 번 더 (embed/rerank는 다시 보내도 안전)
+                pass
+        return self._exchange(self._connect(), header)
+
+    def _exchange(self, sock: socket.socket, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        try:
+            sock.sendall(_encode_frame(header))
+            header_len, payload_len = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+            reply = json.loads(_recv_exact(sock, header_len))
+            payload = _recv_exact(sock, payload_len) if payload_len else b""
+        except BaseException:
+            sock.close()
+            raise
+        with self._lock:
+            self._pool.append(sock)
+        if not reply.get("ok"):
+            if reply.get("fallback"):
+                # 서버가 다른 모델을 들고 있음 → 이 worker는 자기 모델로 계산
+                raise ValueError(reply.get("error"))
+            raise ModelServerError(reply.get("error", "unknown error"))
+        return reply, payload
+
+    def _request(self, header: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        if not self.enabled or time.monotonic() < self._retry_at:
+            return None
+        try:
+            if self.info is None:
+                self.info, _ = self._call({"op": "ping"})
+                print(f"[MODEL-CLIENT] Connected to model server at {self.path} "
+                      f"(embedding={self.info['embedding_model']}, reranker={self.info['reranker_model']})")
+            return self._call(header)
+        except ModelServerError:
+            # 서버는 살아 있고 요청 처리 중 에러 (입력 문제 등) → 그대로 전달
+            raise
+        except socket.timeout as e:
+            # 서버는 살아 있지만 느림 → 이 요청만 실패 (fallback하면 worker마다 모델을 다시 로드하게 됨)
+            metrics.event("model_server_timeout")
+            print(f"[MODEL-CLIENT] {header.get('op')} timed out after {self.timeout:g}s")
+            raise ModelServerError(f"model server timed out after {self.timeout:g}s") from e
+        except (OSError, ConnectionError, ValueError) as e:
+            self.info = None
+            self._retry_at = time.monotonic() + MODEL_SERVER_RETRY_S
+            if not MODEL_SERVER_FALLBACK:
+                raise ModelServerError(f"model server unavailable: {e}")
+            metrics.event("model_server_fallback")
+            print(f"[MODEL-CLIENT] Model server unavailable ({e}), FALLING BACK to in-process models "
+                  f"for {MODEL_SERVER_RETRY_S:.0f}s (this worker loads its own copy)")
+            return None
+
+    def embed(self, model_name: str, texts: List[str]) -> Optional[np.ndarray]:
+        res = self._request({"op": "embed", "model": model_name, "texts": texts})
+        if res is None:
+            return None
+        reply, payload = res
+        return np.frombuffer(payload, dtype=np.float32).reshape(reply["n"], reply["dim"]).copy()
+
+    def rerank(self, model_name: str, pairs: List[List[str]]) -> Optional[np.ndarray]:
+        res = self._request({"op": "rerank", "model": model_name, "pairs": pairs})
+        if res is None:
+            return None
+        _, payload = res
+        return np.frombuffer(payload, dtype=np.float32).copy()
+
+
+model_client = ModelClient()
+
+
+# =====================================
+# 서버
+# =====================================
+class ModelServer:
+    def __init__(self, path: str):
+        # 서버 프로세스는 항상 자기 모델을 씀 (자기 자신에게 요청하지 않도록 클라이언트를 끔)
+        model_client.path = ""
+
+        import rerank
+        from chroma_engine import ChromaEngine
+        from inference import MicroBatcher
+
+        self.path = path
+        self.engine = ChromaEngine()
+        self.rerank = rerank
+        self.embed_batcher = MicroBatcher(self.engine.embed)
+        self.rerank_batcher = MicroBatcher(rerank.predict)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "ok": True,
+            "embedding_model": self.engine.model_name,
+            "reranker_model": self.rerank.RERANKER_MODEL,
+            "dim": self.engine.dimension(),
+            "pid": os.getpid(),
+        }
+
+    async def _dispatch(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        op = header.get("op")
+        if op == "ping":
+            return self.info(), b""
+
+        if op == "embed":
+            if header.get("model") != self.engine.model_name:
+                raise ModelMismatch(f"embedding model mismatch: server has {self.engine.model_name}")
+            texts = header["texts"]
+            vectors = np.asarray(await self.embed_batcher.submit(texts), dtype=np.float32)
+            vectors = vectors.reshape(len(texts), -1)
+            return {"ok": True, "n": vectors.shape[0], "dim": vectors.shape[1]}, vectors.tobytes()
+
+        if op == "rerank":
+            if header.get("model") != self.rerank.RERANKER_MODEL:
+                raise ModelMismatch(f"reranker model mismatch: server has {self.rerank.RERANKER_MODEL}")
+            scores = np.asarray(await self.rerank_batcher.submit(header["pairs"]), dtype=np.float32)
+            return {"ok": True, "n": len(scores)}, scores.tobytes()
+
+        raise ValueError(f"unknown op: {op}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    header_len, payload_len = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+                    header = json.loads(await reader.readexactly(header_len))
+                    if payload_len:
+                        await reader.readexactly(payload_len)
+                except (asyncio.IncompleteReadError, ConnectionResetError):
+                    return  # 클라이언트가 연결을 닫음
+                except asyncio.CancelledError:
+                    return  # 서버 종료
+
+                try:
+                    reply, payload = await self._dispatch(header)
+                except ModelMismatch as e:
+                    reply, payload = {"ok": False, "error": str(e), "fallback": True}, b""
+                except Exception as e:
+                    reply, payload = {"ok": False, "error": str(e)}, b""
+                try:
+                    writer.write(_encode_frame(reply, payload))
+                    await writer.drain()
+                except (ConnectionResetError, BrokenPipeError):
+                    return  # 응답 전에 클라이언트가 연결을 닫음 (타임아웃 등)
+        finally:
+            writer.close()
+
+    async def serve(self):
+        # 요청을 받기 전에 두 모델을 모두 로드
+        print("[MODEL-SERVER] Loading models...")
+        self.engine.embed(["warm up"])
+        self.rerank.predict([["warm up", "warm up"]])
+
+        if os.path.exists(self.path):
+            os.remove(self.path)  # 이전 실행이 남긴 socket 파일
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        print(f"[MODEL-SERVER] Listening on {self.path} (pid={os.getpid()})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="FoundByMe shared model server")
+    parser.add_argument(
+        "--socket",
+        default=MODEL_SERVER_SOCKET or "/tmp/foundbyme-models.sock",
+        help="Unix socket path (API workers: MODEL_SERVER_SOCKET)",
+    )
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(ModelServer(args.socket).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# ocr.py
+# Tesseract OCR 단계
+# - 결과 캐시: 이미지 파일 해시(또는 PDF 해시 + 페이지) 기준으로 디스크에 텍스트 저장
+# - 스캔 PDF: extract_text()가 빈 페이지만 이미지로 렌더링해서 OCR
+# - 페이지 단위 병렬 처리 (tesseract는 별도 프로세스라 스레드로도 코어를 나눠 씀)
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OCR_LANG = os.getenv("OCR_LANG", "kor+eng")
+# 파일 하나에서 동시에 OCR할 페이지 수 (파싱 워커마다 따로 적용)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "./ocr_cache")
+# 텍스트 레이어가 없는 PDF 페이지를 OCR할지 여부
+OCR_PDF_FALLBACK = os.getenv("OCR_PDF_FALLBACK", "true").lower() in ("1", "true", "yes")
+# PDF 페이지 렌더링 해상도(DPI)
+OCR_PDF_RESOLUTION = int(os.getenv("OCR_PDF_RESOLUTION", "200"))
+# tesseract 실행 파일 경로 (PATH에 없을 때, 예: Windows의 C:\Program Files\Tesseract-OCR\tesseract.exe)
+TESSERACT_CMD = os.getenv("TESSERACT_CMD", "")
+
+
+def _cache_path(key: str) -> str:
+    # 설정(언어, 해상도)이 바뀌면 다른 키가 되도록 함께 해시
+    digest = hashlib.sha256(f"{key}|{OCR_LANG}|{OCR_PDF_RESOLUTION}".encode("utf-8")).hexdigest()
+    return os.path.join(OCR_CACHE_DIR, digest[:2], f"{digest}.txt")
+
+
+def cache_get(key: str) -> Optional[str]:
+    path = _cache_path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def cache_set(key: str, text: str):
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 여러 파싱 워커가 같은 키를 동시에 쓸 수 있으므로 임시 파일 → 교체
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _image_to_string(image) -> str:
+    import pytesseract
+
+    if TESSERACT_CMD:
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    return pytesseract.image_to_string(image, lang=OCR_LANG)
+
+
+def ocr_image_file(path: str, content_hash: str) -> str:
+    """이미지 파일 OCR (content_hash: 파일 sha256, 내용이 같으면 캐시 사용)"""
+    key = f"image:{content_hash}"
+    text = cache_get(key)
+    if text is None:
+        from PIL import Image
+
+        with Image.open(path) as image:
+            text = _image_to_string(image)
+        cache_set(key, text)
+    return text
+
+
+def ocr_pages(
+    key_prefix: str,
+    page_numbers: List[int],
+    render: Callable[[int], object],
+    workers: int = OCR_WORKERS,
+) -> Dict[int, str]:
+    """
+    페이지 번호 목록 → {page: text}
+    캐시에 없는 페이지만 render(page)로 이미지를 만들어 OCR
+    렌더링/OCR에 실패한 페이지는 로그만 남기고 결과에서 빠짐 (나머지 페이지는 그대로 반환)
+    렌더링은 호출한 스레드에서 순서대로 (pdfplumber 객체는 스레드 안전하지 않음),
+    한 번에 workers * 2 페이지까지만 메모리에 올림
+    """
+    results: Dict[int, str] = {}
+    todo = []
+    for page in page_numbers:
+        text = cache_get(f"{key_prefix}:{page}")
+        if text is None:
+            todo.append(page)
+        else:
+            results[page] = text
+
+    if not todo:
+        return results
+
+    window = max(1, workers) * 2
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ocr") as pool:
+        for i in range(0, len(todo), window):
+            futures = {}
+            for page in todo[i:i + window]:
+                try:
+                    futures[page] = pool.submit(_image_to_string, render(page))
+                except Exception as e:
+                    print(f"[OCR] Failed to render page {page} ({key_prefix}): {e}")
+            for page, future in futures.items():
+                try:
+                    text = future.result()
+                except Exception as e:
+                    print(f"[OCR] Failed on page {page} ({key_prefix}): {e}")
+                    continue
+                cache_set(f"{key_prefix}:{page}", text)
+                results[page] = text
+    return results
@@ -0,0 +1,103 @@
+# parser_pool.py
+# loader.load_text를 프로세스 풀로 병렬 실행하는 파싱 단계
+# (pdfplumber 추출, Tesseract OCR은 CPU 바운드 + 단일 스레드라 프로세스로 나눠야 코어를 다 씀)
+import os
+import time
+import multiprocessing as mp
+from collections import deque
+from typing import Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from loader import load_text
+
+load_dotenv()
+
+# 0 또는 1이면 현재 프로세스에서 순차 실행
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# 파일 하나당 최대 파싱 시간(초). 문제 있는 PDF 하나가 전체 reindex를 막지 않도록
+PARSE_TIMEOUT = float(os.getenv("PARSE_TIMEOUT", "120"))
+# fork / spawn / forkserver (비워두면 플랫폼 기본값)
+PARSE_START_METHOD = os.getenv("PARSE_START_METHOD") or None
+
+
+def _parse_serial(paths: List[str]) -> Iterator[Tuple[str, Optional[list]]]:
+    for path in paths:
+        try:
+            yield path, load_text(path)
+        except Exception as e:
+            print(f"[PARSE] Failed {path}: {e}")
+            yield path, None
+
+
+def parse_files(
+    paths: List[str],
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Iterator[Tuple[str, Optional[list]]]:
+    """
+    파일들을 병렬로 파싱해서 끝나는 순서대로 (path, chunks)를 yield
+    실패하거나 timeout이 나면 chunks=None (다음 reindex 때 다시 시도됨)
+    """
+    workers = PARSE_WORKERS if workers is None else workers
+    timeout = PARSE_TIMEOUT if timeout is None else timeout
+
+    if workers <= 1 or len(paths) <= 1:
+        yield from _parse_serial(paths)
+        return
+
+    ctx = mp.get_context(PARSE_START_METHOD)
+    pool = ctx.Pool(processes=workers)
+
+    pending = deque(paths)
+    inflight = {}  # path -> (AsyncResult, 시작 시각)
+    stuck = []     # timeout 난 작업 (워커를 계속 점유 중일 수 있음)
+
+    try:
+        while pending or inflight:
+            # 멈춘 작업이 끝났으면 워커 하나가 다시 비었다고 봄
+            stuck = [r for r in stuck if not r.ready()]
+
+            if len(stuck) >= workers:
+                # 모든 워커가 멈춘 파일에 잡혀 있으면 풀을 새로 만든다
+                print("[PARSE] All workers stuck, restarting pool...")
+                pool.terminate()
+                pool = ctx.Pool(processes=workers)
+                stuck = []
+                for path in inflight:
+                    pending.appendleft(path)
+                inflight.clear()
+
+            # 실행 중 작업 수를 (워커 수 - 멈춘 워커 수)로 제한해야
+            # 큐에서 대기한 시간이 timeout에 포함되지 않음
+            while pending and len(inflight) < workers - len(stuck):
+                path = pending.popleft()
+                inflight[path] = (pool.apply_async(load_text, (path,)), time.monotonic())
+
+            done = []
+            for path, (result, started) in inflight.items():
+                if result.ready():
+                    done.append(path)
+                    try:
+                        yield path, result.get()
+                    except Exception as e:
+                        print(f"[PARSE] Failed {path}: {e}")
+                        yield path, None
+                elif time.monotonic() - started > timeout:
+                    done.append(path)
+                    stuck.append(result)
+                    print(f"[PARSE] Timeout after {timeout:.0f}s: {path}")
+                    yield path, None
+
+            for path in done:
+                del inflight[path]
+
+            if not done and inflight:
+                # 아무 작업 하나가 끝날 때까지 잠깐 대기 (busy loop 방지)
+                next(iter(inflight.values()))[0].wait(0.05)
+    finally:
+        if stuck or inflight:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
@@ -0,0 +1,28 @@
+# paths.py
+# 업로드/데이터 파일 공통 규칙: 경로 → 세션 (data/{session_id}/{filename}), 파일 내용 해시
+# indexer, loader(파싱 워커), db.migrate가 같이 쓰므로 다른 backend 모듈을 import하지 않음
+import os
+import hashlib
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATA_DIR = os.getenv("DATA_DIR", "./data")
+
+
+def session_of(path: str, data_dir: str = DATA_DIR) -> str:
+    # Extract session_id from path (assuming data/{session_id}/{filename})
+    rel_path = os.path.relpath(path, data_dir)
+    parts = rel_path.split(os.sep)
+    if len(parts) > 1:
+        return parts[0]
+    return "default"
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
@@ -0,0 +1,264 @@
+# projection.py
+# /galaxy 3D 좌표 캐시
+# 세션별로 PCA 기저(mean, components)와 모든 청크의 3D 좌표를 저장해 두고,
+# 컬렉션이 바뀌었을 때만 새로 추가/변경된 청크를 기존 기저로 투영한다.
+import os
+import re
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import PCA
+
+import metrics
+
+load_dotenv()
+
+PROJECTION_DIR = os.getenv("PROJECTION_DIR", "./projection_store")
+# 새로 추가/변경된 청크 비율이 이 값을 넘으면 기저를 다시 학습
+PROJECTION_REFIT_RATIO = float(os.getenv("PROJECTION_REFIT_RATIO", "0.5"))
+# 청크가 이보다 많으면 /galaxy는 클러스터 중심점만 반환 (클러스터를 펼칠 때도 이 수까지만)
+GALAXY_MAX_POINTS = int(os.getenv("GALAXY_MAX_POINTS", "2000"))
+# 클러스터 개수 (mini-batch k-means)
+GALAXY_CLUSTERS = int(os.getenv("GALAXY_CLUSTERS", "200"))
+
+
+@dataclass
+class Projection:
+    version: int = 0
+    mean: Optional[np.ndarray] = None        # (dim,)
+    components: Optional[np.ndarray] = None  # (3, dim)
+    ids: List[str] = field(default_factory=list)
+    hashes: List[str] = field(default_factory=list)
+    titles: List[str] = field(default_factory=list)
+    exts: List[str] = field(default_factory=list)
+    pages: List[int] = field(default_factory=list)
+    coords: np.ndarray = field(default_factory=lambda: np.zeros((0, 3), dtype=np.float32))
+    # 청크가 GALAXY_MAX_POINTS보다 많을 때만 채워짐 (임베딩 공간의 클러스터 중심, 청크별 클러스터 번호)
+    centroids: Optional[np.ndarray] = None   # (k, dim)
+    labels: Optional[np.ndarray] = None      # (N,)
+
+    @property
+    def fitted(self) -> bool:
+        return self.components is not None
+
+    @property
+    def clustered(self) -> bool:
+        return self.labels is not None
+
+    def transform(self, vectors) -> np.ndarray:
+        """저장된 기저로 벡터를 3D로 투영 (refit 없음)"""
+        X = np.asarray(vectors, dtype=np.float32)
+        if len(X) == 0:
+            return np.zeros((0, 3), dtype=np.float32)
+        return ((X - self.mean) @ self.components.T).astype(np.float32)
+
+
+def _safe_name(session_id: str) -> str:
+    # 파일명으로 쓸 수 없는 문자가 있으면 해시로 대체
+    if re.fullmatch(r"[A-Za-z0-9_-]{1,100}", session_id):
+        return session_id
+    return hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+
+
+class ProjectionStore:
+    def __init__(self, engine, directory: str = PROJECTION_DIR):
+        self.engine = engine
+        self.directory = directory
+        self._cache: Dict[str, Projection] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{_safe_name(session_id)}.npz")
+
+    def _load(self, session_id: str) -> Projection:
+        path = self._path(session_id)
+        if not os.path.exists(path):
+            return Projection()
+        try:
+            with np.load(path) as data:
+                fitted = data["components"].size > 0
+                clustered = data["centroids"].size > 0
+                return Projection(
+                    version=int(data["version"]),
+                    mean=data["mean"] if fitted else None,
+                    components=data["components"] if fitted else None,
+                    ids=data["ids"].tolist(),
+                    hashes=data["hashes"].tolist(),
+                    titles=data["titles"].tolist(),
+                    exts=data["exts"].tolist(),
+                    pages=data["pages"].tolist(),
+                    coords=data["coords"],
+                    centroids=data["centroids"] if clustered else None,
+                    labels=data["labels"] if clustered else None,
+                )
+        except Exception as e:
+            print(f"[PROJECTION] Failed to load {path}: {e}")
+            return Projection()
+
+    def _save(self, session_id: str, proj: Projection):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(session_id)
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            version=np.int64(proj.version),
+            mean=proj.mean if proj.fitted else np.zeros(0, dtype=np.float32),
+            components=proj.components if proj.fitted else np.zeros((0, 0), dtype=np.float32),
+            ids=np.array(proj.ids, dtype=str),
+            hashes=np.array(proj.hashes, dtype=str),
+            titles=np.array(proj.titles, dtype=str),
+            exts=np.array(proj.exts, dtype=str),
+            pages=np.array(proj.pages, dtype=np.int64),
+            coords=proj.coords.astype(np.float32),
+            centroids=proj.centroids if proj.clustered else np.zeros((0, 0), dtype=np.float32),
+            labels=proj.labels if proj.clustered else np.zeros(0, dtype=np.int64),
+        )
+        # 다른 워커가 반쯤 쓴 파일을 읽지 않도록 교체는 원자적으로
+        os.replace(tmp, path)
+
+    def get(self, session_id: str) -> Projection:
+        """
+        세션의 투영 상태 반환
+        컬렉션 버전이 저장된 버전과 같으면 Chroma를 전혀 조회하지 않음
+        """
+        version = self.engine.index_version()
+        with self._lock:
+            proj = self._cache.get(session_id)
+            if proj is None or proj.version != version:
+                proj = self._load(session_id)
+            if proj.version != version:
+                proj = self._update(session_id, proj, version)
+                self._save(session_id, proj)
+            self._cache[session_id] = proj
+            return proj
+
+    def drop(self, session_id: Optional[str] = None):
+        """세션(또는 전체) 투영 상태 삭제"""
+        with self._lock:
+            if session_id is None:
+                self._cache.clear()
+                if os.path.isdir(self.directory):
+                    for name in os.listdir(self.directory):
+                        if name.endswith(".npz"):
+                            os.remove(os.path.join(self.directory, name))
+                return
+
+            self._cache.pop(session_id, None)
+            # 전체 보기(default)에도 이 세션의 점이 들어 있으므로 같이 무효화
+            self._cache.pop("default", None)
+            for sid in (session_id, "default"):
+                if os.path.exists(self._path(sid)):
+                    os.remove(self._path(sid))
+
+    def _update(self, session_id: str, proj: Projection, version: int) -> Projection:
+        # 메타데이터만 먼저 가져와서 새로 생긴/바뀐 청크를 찾음 (임베딩은 필요한 것만)
+        with metrics.span("projection.fetch_metadata"):
+            current = self.engine.get(session_id, include=["metadatas"])
+        ids = current["ids"]
+        metas = current["metadatas"]
+        hashes = [m.get("hash") or "" for m in metas]
+
+        known = dict(zip(proj.ids, zip(proj.hashes, proj.coords)))
+        new_idx = [i for i, cid in enumerate(ids) if known.get(cid, (None,))[0] != hashes[i]]
+
+        if len(ids) < 3:
+            # 점이 너무 적으면 PCA 불가 → 좌표 없이 저장 (호출 쪽에서 임의 배치)
+            return Projection(
+                version=version,
+                ids=list(ids),
+                hashes=hashes,
+                titles=[m.get("title", "unknown") for m in metas],
+                exts=[m.get("ext", "txt") for m in metas],
+                pages=[int(m.get("page", 1)) for m in metas],
+                coords=np.zeros((len(ids), 3), dtype=np.float32),
+            )
+
+        dim_changed = False
+        refit = not proj.fitted or len(new_idx) > PROJECTION_REFIT_RATIO * len(ids)
+        if not refit and not new_idx:
+            # 바뀐 청크가 없어도 저장된 벡터 차원이 달라졌을 수 있음 (압축 세대로 전체 재구축 등)
+            refit = self._embeddings(session_id, ids[:1]).shape[1] != proj.mean.shape[0]
+
+        coords = np.zeros((len(ids), 3), dtype=np.float32)
+        new_vectors = None
+        if not refit:
+            new_set = set(new_idx)
+            for i, cid in enumerate(ids):
+                if i not in new_set:
+                    coords[i] = known[cid][1]
+
+            if new_idx:
+                new_ids = [ids[i] for i in new_idx]
+                new_vectors = self._embeddings(session_id, new_ids)
+                if new_vectors.shape[1] != proj.mean.shape[0]:
+                    # 임베딩 모델이 바뀐 경우
+                    dim_changed = True
+                else:
+                    coords[new_idx] = proj.transform(new_vectors)
+            print(f"[PROJECTION] {session_id}: projected {len(new_idx)} new chunks "
+                  f"with stored basis ({len(ids)} total)")
+
+        mean, components = proj.mean, proj.components
+        all_vectors = None
+        if refit or dim_changed:
+            all_vectors = self._embeddings(session_id, ids)
+            with metrics.span("projection.pca_fit"):
+                pca = PCA(n_components=3)
+                coords = pca.fit_transform(all_vectors).astype(np.float32)
+            mean = pca.mean_.astype(np.float32)
+            components = pca.components_.astype(np.float32)
+            print(f"[PROJECTION] {session_id}: fitted PCA basis on {len(ids)} chunks")
+
+        # 청크가 많으면 LOD용 클러스터 (기저와 마찬가지로 새 청크는 기존 중심점에 배정만)
+        centroids, labels = None, None
+        if len(ids) > GALAXY_MAX_POINTS:
+            if all_vectors is None and proj.clustered:
+                old_labels = dict(zip(proj.ids, proj.labels.tolist()))
+                labels = np.array([old_labels.get(cid, -1) for cid in ids], dtype=np.int64)
+                centroids = proj.centroids
+                if new_idx:
+                    # ||x - c||^2 = ||c||^2 - 2 x·c (+ ||x||^2, argmin에는 무관)
+                    dists = (centroids ** 2).sum(axis=1)[None, :] - 2 * new_vectors @ centroids.T
+                    labels[new_idx] = dists.argmin(axis=1)
+            else:
+                if all_vectors is None:
+                    all_vectors = self._embeddings(session_id, ids)
+                kmeans = MiniBatchKMeans(
+                    n_clusters=min(GALAXY_CLUSTERS, len(ids)),
+                    batch_size=1024,
+                    n_init=3,
+                    random_state=0,
+                )
+                with metrics.span("projection.cluster"):
+                    labels = kmeans.fit_predict(all_vectors).astype(np.int64)
+                centroids = kmeans.cluster_centers_.astype(np.float32)
+                print(f"[PROJECTION] {session_id}: clustered {len(ids)} chunks "
+                      f"into {len(centroids)} clusters")
+
+        return Projection(
+            version=version,
+            mean=mean,
+            components=components,
+            ids=list(ids),
+            hashes=hashes,
+            titles=[m.get("title", "unknown") for m in metas],
+            exts=[m.get("ext", "txt") for m in metas],
+            pages=[int(m.get("page", 1)) for m in metas],
+            coords=coords,
+            centroids=centroids,
+            labels=labels,
+        )
+
+    def _embeddings(self, session_id: str, ids: List[str], batch_size: int = 1000) -> np.ndarray:
+        # get은 id 순서를 보장하지 않으므로 id로 다시 정렬
+        rows = {}
+        with metrics.span("projection.fetch_embeddings"):
+            for i in range(0, len(ids), batch_size):
+                res = self.engine.get(session_id, ids=ids[i:i + batch_size], include=["embeddings"])
+                rows.update(zip(res["ids"], res["embeddings"]))
+        return np.array([rows[cid] for cid in ids], dtype=np.float32)
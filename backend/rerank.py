@@ -0,0 +1,140 @@
+# rerank.py
+# CrossEncoder 리랭킹 단계 (후보 수, 결과 수, 생략 조건, 지연 시간 예산을 설정으로 제어)
+import os
+import time
+import asyncio
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from model_server import model_client
+
+load_dotenv()
+
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-v2-m3")
+# 질문+문단을 합친 최대 토큰 수 (넘으면 잘림, 길수록 느림)
+RERANK_MAX_TOKENS = int(os.getenv("RERANK_MAX_TOKENS", "512"))
+# 요청 파라미터로 후보 수를 키워도 이 이상은 허용하지 않음
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "100"))
+# reciprocal rank fusion 상수 (클수록 하위 순위의 영향이 커짐)
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class RerankConfig:
+    # 1차 벡터 검색에서 가져올 후보 수
+    candidate_k: int = int(os.getenv("RERANK_CANDIDATE_K", "15"))
+    # 최종 결과 수
+    top_k: int = int(os.getenv("RERANK_TOP_K", "5"))
+    enabled: bool = _env_bool("RERANK_ENABLED", "true")
+    # 1등과 2등의 벡터 유사도 차이가 이 값 이상이면 리랭킹 생략 (0이면 사용 안 함)
+    skip_margin: float = float(os.getenv("RERANK_SKIP_MARGIN", "0"))
+    # 리랭킹 지연 시간 예산(ms). 넘으면 벡터 순서로 응답 (0이면 제한 없음)
+    budget_ms: float = float(os.getenv("RERANK_BUDGET_MS", "0"))
+
+    def override(self, **kwargs) -> "RerankConfig":
+        """요청별 값(None이 아닌 것만)으로 덮어쓴 설정"""
+        config = replace(self, **{k: v for k, v in kwargs.items() if v is not None})
+        candidate_k = max(1, min(config.candidate_k, RERANK_MAX_CANDIDATES))
+        top_k = max(1, min(config.top_k, candidate_k))
+        return replace(config, candidate_k=candidate_k, top_k=top_k)
+
+
+default_config = RerankConfig()
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """CrossEncoder는 처음 쓸 때(또는 warm-up 때) 로드"""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                from sentence_transformers import CrossEncoder
+
+                # Cross-Encoder는 속도는 느리지만 정확도가 매우 높음
+                # 다국어 지원 모델 사용 (기본 BAAI/bge-reranker-v2-m3: 성능이 우수한 다국어 리랭커)
+                print(f"[RERANK] Loading Re-ranker model: {RERANKER_MODEL}")
+                start = time.perf_counter()
+                _reranker = CrossEncoder(RERANKER_MODEL, max_length=RERANK_MAX_TOKENS)
+                print(f"[RERANK] Re-ranker loaded in {time.perf_counter() - start:.1f}s")
+    return _reranker
+
+
+def reranker_loaded() -> bool:
+    return _reranker is not None or model_client.available()
+
+
+def predict(pairs: List[List[str]]) -> Sequence[float]:
+    if model_client.enabled:
+        # 모델 서버가 있으면 거기서 계산 (연결할 수 없으면 None → 직접 로드해서 계산)
+        scores = model_client.rerank(RERANKER_MODEL, pairs)
+        if scores is not None:
+            return scores
+    return get_reranker().predict(pairs, show_progress_bar=False)
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    여러 검색 결과 순위(id 목록)를 RRF로 합침: score(id) = Σ 1 / (k + rank)
+    → [(id, score), ...] 점수 내림차순
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+
+async def rerank_candidates(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    config: RerankConfig,
+    score_fn: Callable[[List[List[str]]], Awaitable[Sequence[float]]],
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    candidates: 1차 검색 순으로 정렬된 [{"id", "doc", "meta", "score", "vector_score"}, ...]
+      score       : 1차 검색 점수 (벡터 유사도 또는 RRF 점수)
+      vector_score: 벡터 유사도 (lexical 검색에서만 나온 후보는 None)
+    → (상위 top_k 결과, {"applied": bool, "reason": str})
+    리랭킹을 하지 않는 경우에는 1차 검색 순서/점수를 그대로 사용
+    """
+    vector_top = candidates[:config.top_k]
+
+    if not candidates:
+        return [], {"applied": False, "reason": "no_candidates"}
+    if not config.enabled:
+        return vector_top, {"applied": False, "reason": "disabled"}
+    top_scores = [c.get("vector_score") for c in candidates[:2]]
+    if (
+        config.skip_margin > 0
+        and len(top_scores) > 1
+        and None not in top_scores
+        and top_scores[0] - top_scores[1] >= config.skip_margin
+    ):
+        return vector_top, {"applied": False, "reason": "decisive_margin"}
+
+    # (질문, 문서내용) 쌍을 만들어 점수 계산
+    pairs = [[query, c["doc"] or ""] for c in candidates]
+    try:
+        if config.budget_ms > 0:
+            scores = await asyncio.wait_for(score_fn(pairs), timeout=config.budget_ms / 1000.0)
+        else:
+            scores = await score_fn(pairs)
+    except asyncio.TimeoutError:
+        print(f"[RERANK] Budget {config.budget_ms:.0f}ms exceeded, using vector order")
+        return vector_top, {"applied": False, "reason": "budget_exceeded"}
+
+    scored = [dict(c, score=float(s)) for c, s in zip(candidates, scores)]
+    # 점수 내림차순 정렬
+    scored.sort(key=lambda x: x["score"], reverse=True)
+    return scored[:config.top_k], {"applied": True, "reason": "ok"}
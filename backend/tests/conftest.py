@@ -0,0 +1,52 @@
+# 테스트 공통 설정
+# 모듈들이 import 시점에 .env/상대 경로(./data, ./sql_app.db, ./chroma_store ...)를 읽으므로
+# backend 모듈을 import하기 전에 임시 폴더로 옮겨서 실제 데이터와 섞이지 않게 함
+import os
+import sys
+import hashlib
+import tempfile
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.chdir(tempfile.mkdtemp(prefix="foundbyme-test-"))
+os.environ.update(
+    DATA_DIR="./data",
+    USE_POSTGRES="false",
+    MODEL_SERVER_SOCKET="",
+    WARMUP_ON_STARTUP="false",
+    PARSE_WORKERS="1",
+    CHROMA_SHARDING="none",
+    CHROMA_COMPACT_DIM="0",
+)
+
+FAKE_DIM = 32
+
+
+class FakeModel:
+    """단어 해시로 만든 정규화 벡터 (모델 다운로드 없이 인덱싱/검색 흐름만 확인)"""
+
+    device = "cpu"
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return FAKE_DIM
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        out = np.zeros((len(texts), FAKE_DIM), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                h = int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16)
+                out[i, h % FAKE_DIM] += 1.0
+            out[i] /= max(np.linalg.norm(out[i]), 1e-6)
+        return out
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    from indexer import chroma
+
+    monkeypatch.setattr(chroma, "_model", FakeModel())
+    return chroma
@@ -0,0 +1,44 @@
+# ChromaEngine 세션 샤딩: 다른 프로세스가 지운 shard만 건너뛰고 나머지 에러는 올림
+import pytest
+
+from chroma_engine import ChromaEngine
+
+from conftest import FakeModel
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    engine = ChromaEngine(persist_dir=str(tmp_path / "chroma"))
+    engine.sharded = True
+    engine._model = FakeModel()
+    for i, session_id in enumerate(["s1", "s2"]):
+        engine.upsert_documents(
+            [f"{i}_1"], [f"notes about {session_id} and wombats"],
+            [{"session_id": session_id, "path": f"{session_id}.txt", "page": 1}],
+        )
+    return engine
+
+
+def query_all(engine):
+    vec = engine.embed(["wombats"])[0]
+    return engine.query("default", [vec], n_results=5, include=["metadatas"])["ids"][0]
+
+
+def test_deleted_shard_is_skipped(sharded):
+    handles = sharded.collections_for("default")
+    assert sorted(query_all(sharded)) == ["0_1", "1_1"]
+
+    # 다른 워커가 세션을 삭제 (이 프로세스의 handle은 그대로 남아 있음)
+    other = ChromaEngine(persist_dir=sharded.persist_dir)
+    other.client.delete_collection(sharded._name(sharded.generation(), "s2"))
+
+    vec = sharded.embed(["wombats"])[0]
+    parts = sharded._each(handles, lambda h: h.query(query_embeddings=[vec.tolist()], n_results=5))
+    assert [p["ids"][0] for p in parts] == [["0_1"]]
+
+
+def test_other_shard_errors_are_raised(sharded):
+    vec = sharded.embed(["wombats"])[0]
+    with pytest.raises(Exception):
+        # 차원이 다른 질문 벡터 → 일부 결과만 돌려주지 않고 에러
+        sharded.query("default", [vec[:8]], n_results=5, include=["metadatas"])
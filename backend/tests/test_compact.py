@@ -0,0 +1,149 @@
+# 압축 저장(compact.py): 투영 학습, 세대별 투영 파일 경쟁, 원래 벡터 보관, 재정렬 순서
+import os
+import multiprocessing as mp
+
+import numpy as np
+import pytest
+
+import chroma_engine
+import metrics
+from chroma_engine import ChromaEngine
+from compact import CompactProjection, FullVectorStore, cosine_distances, fit_components, recall_at_k
+from embedding_cache import EmbeddingCache
+
+from conftest import FakeModel
+
+
+def test_fit_components_orthonormal_and_explained():
+    rng = np.random.default_rng(0)
+    # 3차원 부분공간에 있는 벡터 → 3축이면 분산을 전부 설명
+    basis = np.linalg.qr(rng.standard_normal((16, 3)))[0].T
+    samples = rng.standard_normal((200, 3)) @ basis
+
+    components, explained = fit_components(samples, 3)
+    assert components.shape == (3, 16)
+    assert np.allclose(components @ components.T, np.eye(3), atol=1e-5)
+    assert explained == pytest.approx(1.0, abs=1e-5)
+    # 투영 후 되돌리면 원래 벡터
+    assert np.allclose(samples @ components.T @ components, samples, atol=1e-4)
+
+
+def test_fit_components_fills_missing_axes():
+    samples = np.random.default_rng(1).standard_normal((2, 16))
+    components, _ = fit_components(samples, 8)
+    assert components.shape == (8, 16)
+    assert np.allclose(components @ components.T, np.eye(8), atol=1e-5)
+
+
+def _save(path, seed, barrier, result):
+    components = np.random.default_rng(seed).standard_normal((4, 16)).astype(np.float32)
+    barrier.wait()
+    saved = CompactProjection(components, 0.5, seed).save(path)
+    result.put((seed, saved.samples))
+
+
+def test_save_first_writer_wins_across_processes(tmp_path):
+    path = str(tmp_path / "compact" / "gen.npz")
+    ctx = mp.get_context("spawn")
+    n = 4
+    barrier, result = ctx.Barrier(n), ctx.Queue()
+    procs = [ctx.Process(target=_save, args=(path, seed, barrier, result)) for seed in range(n)]
+    for p in procs:
+        p.start()
+    returned = [result.get(timeout=60) for _ in procs]
+    for p in procs:
+        p.join(60)
+
+    # 모든 프로세스가 같은 (파일에 남은) 투영을 쓰고, 임시 파일은 남지 않음
+    winner = CompactProjection.load(path)
+    assert {samples for _, samples in returned} == {winner.samples}
+    assert os.listdir(os.path.dirname(path)) == ["gen.npz"]
+
+
+def test_full_vector_store_roundtrip(tmp_path):
+    store = FullVectorStore(str(tmp_path / "gen.sqlite"))
+    vectors = np.random.default_rng(2).standard_normal((3, 8)).astype(np.float32)
+    metas = [
+        {"session_id": "s1", "path": "a.txt"},
+        {"session_id": "s1", "path": "b.txt"},
+        {"session_id": "s2", "path": "c.txt"},
+    ]
+    store.put(["a", "b", "c"], vectors, metas)
+
+    found = store.get(["a", "c", "missing"])
+    assert sorted(found) == ["a", "c"]
+    assert np.allclose(found["a"], vectors[0], atol=1e-2)  # float16 보관
+
+    store.delete_paths(["a.txt"])
+    assert sorted(store.get(["a", "b", "c"])) == ["b", "c"]
+    store.delete_session("s2")
+    assert sorted(store.get(["a", "b", "c"])) == ["b"]
+    store.clear()
+    assert store.get(["b"]) == {}
+    store.close()
+
+
+def test_rescore_orders_by_exact_distance(tmp_path):
+    store = FullVectorStore(str(tmp_path / "gen.sqlite"))
+    query = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+    vectors = np.array([[0.0, 1.0, 0.0], [1.0, 0.1, 0.0], [0.7, 0.7, 0.0]], dtype=np.float32)
+    store.put(["far", "near", "mid"], vectors, [{} for _ in range(3)])
+
+    # 압축 공간의 근사 거리 순서는 틀렸고, "nostore"는 원래 벡터가 없어서 근사 거리 유지
+    merged = [(0.1, "far", {}), (0.2, "mid", {}), (0.3, "near", {}), (0.25, "nostore", {})]
+    rescored = ChromaEngine._rescore(store, query, merged, n_results=2)
+
+    assert [cid for _, cid, _ in rescored] == ["near", "nostore", "mid", "far"]
+    exact = cosine_distances(query, vectors)
+    assert rescored[0][2]["distances"] == pytest.approx(exact[1], abs=1e-3)
+    store.close()
+
+
+def test_recall_at_k():
+    exact = [["a", "b", "c"], ["d", "e", "f"]]
+    approx = [["b", "a", "x"], ["x", "y", "z"]]
+    assert recall_at_k(exact, approx, 2) == pytest.approx(0.5)
+    assert recall_at_k(exact, exact, 3) == 1.0
+    assert recall_at_k([], [], 3) == 0.0
+
+
+@pytest.fixture
+def compact_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(chroma_engine, "CHROMA_COMPACT_DIM", 4)
+    monkeypatch.setattr(chroma_engine, "CHROMA_COMPACT_MIN_SAMPLES", 16)
+    engine = ChromaEngine(persist_dir=str(tmp_path / "chroma"))
+    engine._model = FakeModel()
+    engine.embedding_cache = EmbeddingCache(str(tmp_path / "cache"))
+    return engine
+
+
+def test_small_first_write_does_not_fix_projection(compact_engine, monkeypatch):
+    events = []
+    monkeypatch.setattr(metrics, "event", lambda name, amount=1.0: events.append(name))
+    texts = ["tiny upload about lemurs", "second chunk about lemurs"]
+    compact_engine.upsert_documents(
+        ["1_1", "1_2"], texts, [{"session_id": "s", "path": "a.txt", "page": i} for i in (1, 2)]
+    )
+
+    assert compact_engine.compact_for() is None
+    assert "compact_fit_skipped" in events
+    stored = compact_engine.get("s", include=["embeddings"])["embeddings"]
+    assert len(stored[0]) == FakeModel().get_sentence_embedding_dimension()
+
+
+def test_compact_generation_rescores_queries(compact_engine):
+    words = [f"word{i}" for i in range(40)]
+    texts = [" ".join(words[i:i + 3]) for i in range(32)]
+    ids = [f"{i}_1" for i in range(len(texts))]
+    metas = [{"session_id": "s", "path": f"{i}.txt", "page": 1} for i in range(len(texts))]
+    compact_engine.upsert_documents(ids, texts, metas)
+
+    proj = compact_engine.compact_for()
+    assert proj is not None and proj.dim == 4
+
+    query = compact_engine.embed([texts[5]])[0]
+    res = compact_engine.query("s", [query], n_results=3, include=["distances"])
+    # 재정렬 후 거리는 원래 벡터 기준 (자기 자신이 1등, 거리 오름차순)
+    assert res["ids"][0][0] == "5_1"
+    assert res["distances"][0] == sorted(res["distances"][0])
+    assert res["distances"][0][0] == pytest.approx(0.0, abs=1e-2)
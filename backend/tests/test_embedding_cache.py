@@ -0,0 +1,80 @@
+# 임베딩 디스크 캐시: 여러 프로세스가 같은 디렉터리를 쓸 때 slot이 섞이지 않는지
+# (backend 폴더에서 python -m pytest tests)
+import os
+import sys
+import time
+import multiprocessing as mp
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import EmbeddingCache  # noqa: E402
+
+MODEL = "test-model"
+DIM = 8
+MAX_ENTRIES = 16
+KEYS = [f"h{i:03d}" for i in range(64)]
+
+
+def expected(h: str) -> np.ndarray:
+    # 해시마다 고정된 벡터 (다른 해시의 벡터가 섞이면 바로 드러남)
+    return np.full(DIM, int(h[1:]), dtype=np.float32)
+
+
+def _writer(directory: str, seconds: float):
+    cache = EmbeddingCache(directory, max_entries=MAX_ENTRIES)
+    rng = np.random.default_rng(1)
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        # 캐시보다 많은 키를 계속 넣어서 오래된 slot이 다른 해시로 재사용되게 함
+        keys = list(rng.choice(KEYS, size=4, replace=False))
+        cache.put_many(MODEL, keys, np.stack([expected(h) for h in keys]))
+
+
+def _reader(directory: str, seconds: float, result):
+    cache = EmbeddingCache(directory, max_entries=MAX_ENTRIES)
+    rng = np.random.default_rng(2)
+    deadline = time.time() + seconds
+    reads = mismatches = 0
+    while time.time() < deadline:
+        keys = list(rng.choice(KEYS, size=8, replace=False))
+        for h, vec in cache.get_many(MODEL, keys).items():
+            reads += 1
+            if not np.array_equal(vec, expected(h)):
+                mismatches += 1
+    result.put((reads, mismatches))
+
+
+def test_get_many_never_returns_another_hash_vector(tmp_path):
+    directory = str(tmp_path / "cache")
+    EmbeddingCache(directory, max_entries=MAX_ENTRIES).put_many(
+        MODEL, KEYS[:MAX_ENTRIES], np.stack([expected(h) for h in KEYS[:MAX_ENTRIES]])
+    )
+
+    ctx = mp.get_context("spawn")
+    result = ctx.Queue()
+    writer = ctx.Process(target=_writer, args=(directory, 3.0))
+    reader = ctx.Process(target=_reader, args=(directory, 3.0, result))
+    writer.start()
+    reader.start()
+    reads, mismatches = result.get(timeout=60)
+    writer.join(60)
+    reader.join(60)
+
+    assert writer.exitcode == 0 and reader.exitcode == 0
+    assert reads > 0
+    assert mismatches == 0
+
+
+def test_lru_keeps_at_most_max_entries(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache"), max_entries=MAX_ENTRIES)
+    for i in range(0, len(KEYS), 4):
+        keys = KEYS[i:i + 4]
+        cache.put_many(MODEL, keys, np.stack([expected(h) for h in keys]))
+
+    assert cache.count(MODEL) == MAX_ENTRIES
+    found = cache.get_many(MODEL, KEYS)
+    assert sorted(found) == KEYS[-MAX_ENTRIES:]
+    for h, vec in found.items():
+        assert np.array_equal(vec, expected(h))
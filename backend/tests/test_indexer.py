@@ -0,0 +1,77 @@
+# 업로드 인덱싱(index_files)과 이후 증분 reindex가 서로의 결과를 지우지 않는지
+import os
+
+from sqlalchemy import delete, select
+
+import indexer
+from db import fulltext
+from db.db import SessionLocal
+from db.migrate import upgrade
+from db.models import Chunk, Document
+
+
+def write(session_id: str, filename: str, text: str) -> str:
+    path = os.path.join(indexer.DATA_DIR, session_id, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text + " (padding so the loader keeps this short file)")
+    return path
+
+
+def document(path: str):
+    db = SessionLocal()
+    try:
+        return db.execute(select(Document).where(Document.path == path)).scalar()
+    finally:
+        db.close()
+
+
+def lexical(query: str, session_id: str):
+    db = SessionLocal()
+    try:
+        return fulltext.search(db, query, session_id)
+    finally:
+        db.close()
+
+
+def test_uppercase_extension_survives_incremental_reindex(fake_model):
+    upgrade()
+    path = write("upper", "C.TXT", "uppercase extension quokka notes")
+    indexer.index_files([path])
+    assert document(path) is not None
+
+    assert path in indexer.scan_files()
+    result = indexer.rebuild_index(full=False)
+
+    assert result["removed"] == 0
+    assert document(path) is not None
+    assert lexical("quokka", "upper")
+    assert fake_model.get("upper")["ids"]
+
+
+def test_upload_first_indexing_backfills_existing_documents(fake_model):
+    upgrade()
+    old = write("backfill", "old.txt", "pangolin facts indexed before the upgrade")
+    indexer.index_files([old])
+
+    # 전문 검색/chunks 테이블이 생기기 전에 인덱싱된 상태 (Chroma에만 청크가 있음)
+    db = SessionLocal()
+    try:
+        fulltext.delete_all(db)
+        db.execute(delete(Chunk))
+        db.commit()
+    finally:
+        db.close()
+
+    # 업그레이드 후 첫 인덱싱이 /reindex가 아니라 업로드
+    new = write("backfill", "new.txt", "axolotl facts uploaded after the upgrade")
+    indexer.index_files([new])
+
+    assert lexical("pangolin", "backfill")
+    assert lexical("axolotl", "backfill")
+    db = SessionLocal()
+    try:
+        old_id = db.execute(select(Document.id).where(Document.path == old)).scalar()
+        assert db.execute(select(Chunk.id).where(Chunk.document_id == old_id)).first() is not None
+    finally:
+        db.close()
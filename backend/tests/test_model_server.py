@@ -0,0 +1,44 @@
+# 모델 서버: 응답 전에 클라이언트가 끊어도 (타임아웃 등) 처리 안 된 예외가 남지 않는지
+import asyncio
+
+from model_server import ModelServer, _encode_frame
+
+
+def test_reply_to_closed_client_is_ignored(tmp_path, monkeypatch):
+    server = ModelServer(str(tmp_path / "models.sock"))
+
+    async def slow_dispatch(header):
+        await asyncio.sleep(0.2)
+        return {"ok": True}, b"x" * (1 << 20)
+
+    monkeypatch.setattr(server, "_dispatch", slow_dispatch)
+
+    async def run():
+        errors = []
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+        handled = []
+
+        async def handle(reader, writer):
+            try:
+                await server._handle(reader, writer)
+                handled.append("ok")
+            except Exception as e:
+                handled.append(e)
+
+        srv = await asyncio.start_unix_server(handle, path=server.path)
+        async with srv:
+            _, writer = await asyncio.open_unix_connection(server.path)
+            writer.write(_encode_frame({"op": "embed", "model": "m", "texts": ["a"]}))
+            await writer.drain()
+            writer.close()  # 클라이언트 타임아웃
+            await writer.wait_closed()
+            for _ in range(50):
+                if handled:
+                    break
+                await asyncio.sleep(0.05)
+        return handled, errors
+
+    handled, errors = asyncio.run(run())
+    assert handled == ["ok"]
+    assert errors == []
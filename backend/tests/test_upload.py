@@ -0,0 +1,94 @@
+# /upload 중복 처리: 같은 요청 안, 아직 인덱싱 대기 중인 업로드, 이미 인덱싱된 문서
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+import indexer
+
+
+@pytest.fixture
+def client(fake_model):
+    with TestClient(app_module.app) as c:
+        yield c
+
+
+def wait(client, job):
+    while True:
+        job = client.get(f"/jobs/{job['id']}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+
+
+def upload(client, session_id, files):
+    return client.post(
+        "/upload", data={"session_id": session_id}, files=[("files", f) for f in files]
+    ).json()
+
+
+def test_duplicates_within_one_request(client):
+    body = b"same bytes twice in one request"
+    res = upload(client, "dup-request", [("a.txt", body), ("b.txt", body)])
+
+    assert res["saved"] == ["a.txt"]
+    assert res["skipped"] == [{"filename": "b.txt", "duplicate_of": "a.txt"}]
+    assert wait(client, res["job"])["status"] == "succeeded"
+    assert not app_module._pending_uploads
+
+
+def test_duplicate_of_queued_upload(client):
+    body = b"uploaded again while the first job waits"
+    indexer.index_lock.acquire()  # 첫 작업이 인덱싱 lock 앞에서 대기하도록
+    try:
+        first = upload(client, "dup-queued", [("first.txt", body)])
+        again = upload(client, "dup-queued", [("again.txt", body)])
+    finally:
+        indexer.index_lock.release()
+
+    assert again["saved"] == []
+    assert again["skipped"] == [{"filename": "again.txt", "duplicate_of": "first.txt"}]
+    assert again["job"] is None
+    assert wait(client, first["job"])["status"] == "succeeded"
+
+    # 인덱싱이 끝나면 예약은 풀리고 DB의 content_hash로 중복을 찾음
+    assert not app_module._pending_uploads
+    later = upload(client, "dup-queued", [("later.txt", body)])
+    assert later["skipped"] == [{"filename": "later.txt", "duplicate_of": "first.txt"}]
+
+
+def test_failed_job_releases_reservation(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("indexing failed")
+
+    monkeypatch.setattr(app_module, "index_files", fail)
+    res = upload(client, "dup-failed", [("x.txt", b"content of a failed upload")])
+    assert wait(client, res["job"])["status"] == "failed"
+    assert not app_module._pending_uploads
+
+
+def test_same_content_in_other_session_is_not_duplicate(client):
+    body = b"shared between two sessions"
+    a = upload(client, "dup-s1", [("a.txt", body)])
+    b = upload(client, "dup-s2", [("a.txt", body)])
+    assert a["saved"] == ["a.txt"] and b["saved"] == ["a.txt"]
+    wait(client, a["job"])
+    wait(client, b["job"])
+
+
+def test_full_reindex_is_not_merged_into_incremental(client):
+    indexer.index_lock.acquire()  # 첫 작업이 대기 상태로 남도록
+    try:
+        incremental = client.get("/reindex").json()
+        again = client.get("/reindex").json()
+        full = client.get("/reindex", params={"full": "true"}).json()
+    finally:
+        indexer.index_lock.release()
+
+    assert incremental["created"] and not again["created"]
+    assert again["job"]["id"] == incremental["job"]["id"]
+    assert full["created"]
+    assert full["job"]["params"]["full"] is True
+    assert wait(client, incremental["job"])["status"] == "succeeded"
+    assert wait(client, full["job"])["status"] == "succeeded"
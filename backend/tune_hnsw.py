@@ -0,0 +1,254 @@
+# tune_hnsw.py
+# HNSW 파라미터 튜닝: SearchLog의 실제 질문으로 근사 검색(HNSW) 결과를 정확한 brute-force 결과와 비교
+# - 저장된 벡터를 임시 폴더의 Chroma 컬렉션에 (M, construction_ef) 조합마다 새로 만들고,
+#   search_ef 값마다 recall@k와 질문당 지연 시간을 측정 (운영 중인 컬렉션은 조회만 함)
+# - 현재 컬렉션 설정의 recall/지연 시간도 같이 측정
+# - 목표 recall을 만족하는 조합 중 p95가 가장 낮은 것을 .env 형식으로 추천
+# 비교는 컬렉션에 저장된 벡터 공간 기준 (압축 세대면 줄인 벡터, 재정렬 전)
+#
+# 예) python tune_hnsw.py --queries 200 --m 16,32 --construction-ef 100,200 --search-ef 10,50,100,200
+#     python tune_hnsw.py --session-id abc --target-recall 0.98 --out tune.json
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from bench.timing import summarize
+from chroma_engine import ChromaEngine
+from compact import recall_at_k
+
+
+def sample_queries(session_id: str, n: int, seed: int) -> List[str]:
+    """SearchLog에서 중복 없이 최대 n개 (session_id=default면 모든 세션)"""
+    from db.db import SessionLocal
+    from db.models import SearchLog
+
+    db = SessionLocal()
+    try:
+        stmt = select(SearchLog.query).distinct()
+        if session_id != "default":
+            stmt = stmt.where(SearchLog.session_id == session_id)
+        queries = [q for q in db.execute(stmt).scalars().all() if q and q.strip()]
+    finally:
+        db.close()
+
+    rng = np.random.default_rng(seed)
+    if len(queries) > n:
+        queries = [queries[i] for i in sorted(rng.choice(len(queries), size=n, replace=False))]
+    return queries
+
+
+def load_vectors(engine: ChromaEngine, session_id: str) -> tuple:
+    """세션의 (ids, 저장된 벡터)"""
+    ids: List[str] = []
+    rows: List[Any] = []
+    if session_id == "default":
+        for page in engine.iter_pages(["embeddings"]):
+            ids.extend(page["ids"])
+            rows.extend(page["embeddings"])
+    else:
+        res = engine.get(session_id, include=["embeddings"])
+        ids, rows = res["ids"], res["embeddings"]
+    return ids, np.asarray(rows, dtype=np.float32)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, ids: List[str], k: int, block: int = 64) -> List[List[str]]:
+    """cosine 유사도 brute-force 상위 k개 (질문 block개씩 행렬곱)"""
+    X = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    Q = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    k = min(k, len(ids))
+    result = []
+    for i in range(0, len(Q), block):
+        sims = Q[i:i + block] @ X.T
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        for row, cand in zip(sims, top):
+            order = cand[np.argsort(-row[cand], kind="stable")]
+            result.append([ids[j] for j in order])
+    return result
+
+
+def measure(search, queries, exact: List[List[str]], k: int) -> Dict[str, Any]:
+    """search(q) → id 목록. 질문마다 순서대로 실행해서 recall@k와 지연 시간"""
+    search(queries[0])  # warm-up
+    approx, latencies = [], []
+    start = time.perf_counter()
+    for q in queries:
+        t = time.perf_counter()
+        approx.append(search(q))
+        latencies.append(time.perf_counter() - t)
+    result = summarize(latencies, time.perf_counter() - start)
+    result["recall"] = round(recall_at_k(exact, approx, k), 4)
+    return result
+
+
+def build_collection(client, name: str, ids: List[str], vectors: np.ndarray, m: int, construction_ef: int, search_ef: int):
+    try:
+        client.delete_collection(name)
+    except Exception:
+        pass
+    collection = client.create_collection(
+        name=name, metadata=ChromaEngine._collection_metadata(m, construction_ef, search_ef)
+    )
+    try:
+        batch = client.get_max_batch_size()
+    except Exception:
+        batch = 5000
+    for i in range(0, len(ids), batch):
+        collection.add(ids=ids[i:i + batch], embeddings=vectors[i:i + batch].tolist())
+    return collection
+
+
+def set_search_ef(client, collection, ids, vectors, m: int, construction_ef: int, search_ef: int):
+    """search ef만 바꿈 (지원하지 않는 Chroma 버전이면 컬렉션을 다시 만듦)"""
+    try:
+        collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+        return collection
+    except Exception:
+        return build_collection(client, collection.name, ids, vectors, m, construction_ef, search_ef)
+
+
+def recommend(rows: List[Dict[str, Any]], target: float) -> Optional[Dict[str, Any]]:
+    # 목표 recall 이상 중 p95가 가장 낮은 설정 (없으면 recall이 가장 높은 설정)
+    ok = [r for r in rows if r["recall"] >= target]
+    if ok:
+        return min(ok, key=lambda r: (r["p95_ms"], -r["recall"]))
+    return max(rows, key=lambda r: (r["recall"], -r["p95_ms"])) if rows else None
+
+
+def parse_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tune Chroma HNSW parameters against exact search")
+    parser.add_argument("--session-id", default="default", help="tune on this session's chunks and queries")
+    parser.add_argument("--queries", type=int, default=200, help="queries sampled from SearchLog")
+    parser.add_argument("--top-k", type=int, default=15, help="results compared per query (= search candidate_k)")
+    parser.add_argument("--m", default="8,16,32", help="comma separated hnsw:M values")
+    parser.add_argument("--construction-ef", default="100,200", help="comma separated hnsw:construction_ef values")
+    parser.add_argument("--search-ef", default="10,20,50,100,200", help="comma separated hnsw:search_ef values")
+    parser.add_argument("--max-vectors", type=int, default=200000,
+                        help="sample at most this many chunks into the test collections")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="test collections go here (default: temp dir)")
+    parser.add_argument("--out", default=None, help="also write the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    engine = ChromaEngine()
+    rng = np.random.default_rng(args.seed)
+
+    print(f"[TUNE] Loading vectors (session: {args.session_id})...")
+    ids, vectors = load_vectors(engine, args.session_id)
+    if len(ids) == 0:
+        print("[TUNE] No chunks stored for this session.")
+        return 1
+    subsampled = len(ids) > args.max_vectors
+    if subsampled:
+        keep = np.sort(rng.choice(len(ids), size=args.max_vectors, replace=False))
+        ids = [ids[i] for i in keep]
+        vectors = vectors[keep]
+
+    queries = sample_queries(args.session_id, args.queries, args.seed)
+    if queries:
+        full_queries = engine.embed_queries(queries)
+        stored_queries = engine.to_stored(full_queries)
+        source = "search_log"
+    else:
+        # 검색 기록이 없으면 저장된 청크 벡터를 질문으로 사용 (자기 자신도 정답에 포함)
+        print("[TUNE] No search logs, using stored chunks as queries.")
+        full_queries = None
+        pick = rng.choice(len(ids), size=min(args.queries, len(ids)), replace=False)
+        stored_queries = vectors[pick]
+        source = "chunks"
+
+    k = min(args.top_k, len(ids))
+    print(f"[TUNE] {len(ids)} chunks, {len(stored_queries)} queries ({source}), "
+          f"dim={vectors.shape[1]}, k={k}")
+    start = time.perf_counter()
+    exact = exact_top_k(vectors, stored_queries, ids, k)
+    print(f"[TUNE] Exact search in {time.perf_counter() - start:.2f}s")
+
+    report: Dict[str, Any] = {
+        "session_id": args.session_id,
+        "chunks": len(ids),
+        "subsampled": subsampled,
+        "queries": len(stored_queries),
+        "query_source": source,
+        "dim": int(vectors.shape[1]),
+        "k": k,
+        "target_recall": args.target_recall,
+        "current": None,
+        "candidates": [],
+    }
+
+    # 현재 운영 컬렉션 (표본만 쓴 경우 정답 집합이 달라지므로 생략)
+    if not subsampled and full_queries is not None:
+        handles = engine.collections_for(args.session_id)
+        current = measure(
+            lambda q: engine.query(args.session_id, [q], n_results=k, include=[], rescore=False)["ids"][0],
+            list(full_queries), exact, k,
+        )
+        current["hnsw"] = engine.hnsw_config(handles[0]) if handles else {}
+        report["current"] = current
+        print(f"[TUNE] current {current['hnsw']}: recall={current['recall']:.4f} "
+              f"p50={current['p50_ms']:.2f}ms p95={current['p95_ms']:.2f}ms")
+
+    import chromadb
+    from chromadb.config import Settings
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="foundbyme-tune-")
+    client = chromadb.PersistentClient(path=workdir, settings=Settings(anonymized_telemetry=False))
+    try:
+        print(f"{'M':>5} {'c_ef':>6} {'s_ef':>6} {'recall':>8} {'p50_ms':>8} {'p95_ms':>8} {'build_s':>8}")
+        for m in parse_list(args.m):
+            for construction_ef in parse_list(args.construction_ef):
+                name = f"tune-m{m}-ef{construction_ef}"
+                start = time.perf_counter()
+                collection = build_collection(client, name, ids, vectors, m, construction_ef, 0)
+                build_s = time.perf_counter() - start
+
+                for search_ef in parse_list(args.search_ef):
+                    collection = set_search_ef(client, collection, ids, vectors, m, construction_ef, search_ef)
+                    row = measure(
+                        lambda q: collection.query(query_embeddings=[q.tolist()], n_results=k, include=[])["ids"][0],
+                        list(stored_queries), exact, k,
+                    )
+                    row.update(m=m, construction_ef=construction_ef, search_ef=search_ef, build_s=round(build_s, 3))
+                    report["candidates"].append(row)
+                    print(f"{m:>5} {construction_ef:>6} {search_ef:>6} {row['recall']:>8.4f} "
+                          f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {build_s:>8.2f}")
+                client.delete_collection(name)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    best = recommend(report["candidates"], args.target_recall)
+    report["recommended"] = best
+    if best is not None:
+        met = "meets" if best["recall"] >= args.target_recall else "best available, below"
+        print(f"\n[TUNE] Recommended ({met} target recall {args.target_recall}): "
+              f"recall={best['recall']:.4f}, p95={best['p95_ms']:.2f}ms")
+        print(f"CHROMA_HNSW_M={best['m']}")
+        print(f"CHROMA_HNSW_CONSTRUCTION_EF={best['construction_ef']}")
+        print(f"CHROMA_HNSW_SEARCH_EF={best['search_ef']}")
+        print("(M / CONSTRUCTION_EF take effect after /reindex?full=true)")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"[TUNE] Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -26,6 +26,9 @@ const StarNode = ({
   isQuery,
   url,
   page,
+  isCluster,
+  count,
+  onExpand,
 }) => {
   const ref = useRef();
   const [hovered, setHover] = useState(false);
@@ -43,22 +46,31 @@ const StarNode = ({
 
   const handleClick = (e) => {
     e.stopPropagation();
-    if (url) {
+    if (isCluster) {
+      // 클러스터는 클릭 시 개별 문서 조각으로 펼침
+      onExpand?.();
+    } else if (url) {
       window.open(url, "_blank");
     }
   };
 
+  // 클러스터는 포함된 조각 수에 따라 크기를 키움
+  const baseScale = isCluster
+    ? Math.min(1 + Math.log10(count || 1), 4)
+    : isQuery
+    ? 1.5
+    : 1;
+
   return (
     <mesh
       ref={ref}
       position={position}
-      scale={hovered ? 1.8 : isQuery ? 1.5 : 1}
+      scale={hovered ? baseScale * 1.2 : baseScale}
       onPointerOver={(e) => {
         e.stopPropagation();
         setHover(true);
-        document.body.style.cursor = url
-          ? "pointer"
-          : "default";
+        document.body.style.cursor =
+          url || isCluster ? "pointer" : "default";
       }}
       onPointerOut={() => {
         setHover(false);
@@ -82,11 +94,16 @@ const StarNode = ({
             <div className="font-bold mb-2 text-lg">
               {label}
             </div>
-            {!isQuery && page && (
+            {!isQuery && !isCluster && page && (
               <div className="text-slate-300 mb-1">
                 Page: {page}
               </div>
             )}
+            {isCluster && (
+              <div className="text-slate-300 mb-1">
+                Chunks: {count} (Click to expand)
+              </div>
+            )}
             {url && (
               <div className="text-xs text-slate-400 mt-2">
                 (Click to open)
@@ -139,6 +156,29 @@ const GalaxyView = () => {
     fetchData();
   }, [currentChatId, currentResult]); // 의존성 배열 업데이트
 
+  // 클러스터(문서가 많을 때 묶어서 보여주는 점)를 개별 조각으로 펼치기
+  const expandCluster = async (cluster) => {
+    try {
+      const response = await fetch(
+        `/api/galaxy?session_id=${currentChatId}&cluster=${cluster}`
+      );
+      if (response.ok) {
+        const members = await response.json();
+        setDataPoints((prev) => [
+          ...prev.filter(
+            (point) => point.cluster !== cluster
+          ),
+          ...members,
+        ]);
+      }
+    } catch (error) {
+      console.error(
+        "Failed to expand galaxy cluster:",
+        error
+      );
+    }
+  };
+
   return (
     <div className="w-full h-screen bg-black relative">
       <button
@@ -216,6 +256,11 @@ const GalaxyView = () => {
               isQuery={point.isQuery}
               url={point.url}
               page={point.page}
+              isCluster={point.isCluster}
+              count={point.count}
+              onExpand={() =>
+                expandCluster(point.cluster)
+              }
             />
           ))}
 
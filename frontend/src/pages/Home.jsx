@@ -8,6 +8,7 @@ import {
   UploadCloud,
   Sparkles,
   FileText,
+  XCircle,
 } from "lucide-react";
 import { useChatStore } from "../stores/useChatStore";
 import { useNavigate } from "react-router-dom";
@@ -23,6 +24,8 @@ const Home = () => {
     fetchDocuments,
     createNewChat,
     chats, // chats 추가
+    indexJob,
+    cancelIndexJob,
   } = useChatStore();
   const navigate = useNavigate();
 
@@ -51,6 +54,9 @@ const Home = () => {
     }
   };
 
+  // 인덱싱 진행률 표시용 (현재 단계의 done / total)
+  const jobProgress = indexJob?.progress?.[indexJob.stage];
+
   const handleSearch = async (e) => {
     e.preventDefault();
     if (!query.trim()) return;
@@ -106,6 +112,36 @@ const Home = () => {
               PDF, PPTX, DOCX 등 다양한 강의자료
               지원
             </p>
+
+            {/* 인덱싱 작업 진행 상황 + 취소 */}
+            {indexJob && (
+              <div className="flex items-center justify-center gap-3 mt-3 text-sm text-slate-400">
+                <span>
+                  {indexJob.status === "queued"
+                    ? "대기 중..."
+                    : `${indexJob.stage ?? "준비"} ${
+                        jobProgress
+                          ? `${jobProgress.done}${
+                              jobProgress.total != null
+                                ? ` / ${jobProgress.total}`
+                                : ""
+                            }`
+                          : ""
+                      }`}
+                </span>
+                <button
+                  type="button"
+                  onClick={cancelIndexJob}
+                  disabled={indexJob.cancel_requested}
+                  className="flex items-center gap-1 text-slate-400 hover:text-red-400 transition-colors disabled:opacity-50 disabled:cursor-not-allowed"
+                >
+                  <XCircle size={16} />
+                  {indexJob.cancel_requested
+                    ? "취소 중..."
+                    : "취소"}
+                </button>
+              </div>
+            )}
           </div>
 
           {/* 검색창 */}
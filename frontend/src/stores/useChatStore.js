@@ -11,6 +11,8 @@ export const useChatStore = create(
     currentChatId: null,
     // 현재 채팅방의 문서 목록
     documents: [],
+    // 진행 중인 인덱싱 작업 (/api/jobs/{id} 응답)
+    indexJob: null,
 
     // 새로운 채팅 생성 액션
     createNewChat: () => {
@@ -77,6 +79,37 @@ export const useChatStore = create(
       }
     },
 
+    // 백그라운드 작업이 끝날 때까지 상태 확인 (진행률은 indexJob에 저장)
+    waitForJob: async (jobId, intervalMs = 1000) => {
+      while (true) {
+        const response = await fetch(
+          `/api/jobs/${jobId}?_t=${Date.now()}`
+        );
+        if (!response.ok) {
+          set({ indexJob: null });
+          return null;
+        }
+        const job = await response.json();
+        set({ indexJob: job });
+        if (!["queued", "running"].includes(job.status)) {
+          set({ indexJob: null });
+          return job;
+        }
+        await new Promise((resolve) =>
+          setTimeout(resolve, intervalMs)
+        );
+      }
+    },
+
+    // 인덱싱 작업 취소
+    cancelIndexJob: async () => {
+      const job = get().indexJob;
+      if (!job) return;
+      await fetch(`/api/jobs/${job.id}/cancel`, {
+        method: "POST",
+      });
+    },
+
     // 파일을 쏘아올리는 동작 (API 연결)
     launchFiles: async (files) => {
       // 현재 채팅방 ID 확인 (없으면 생성하거나 에러 처리)
@@ -114,10 +147,12 @@ export const useChatStore = create(
           alert(
             `${files.length}개의 별(파일)을 성공적으로 쏘아 올렸습니다!`
           );
-          // 업로드 후 인덱싱 요청 (세션 ID 포함)
-          await fetch(
-            `/api/reindex?session_id=${chatId}`
-          );
+          // 서버가 새로 저장한 파일만 인덱싱 작업으로 등록 → 끝날 때까지 polling
+          // (이미 있는 파일과 내용이 같으면 job이 null)
+          const { job } = await response.json();
+          if (job) {
+            await get().waitForJob(job.id);
+          }
           // 문서 목록 갱신 (await 추가하여 상태 업데이트 보장)
           await get().fetchDocuments(chatId);
         } else {